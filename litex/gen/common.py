@@ -15,3 +15,79 @@ def reverse_bytes(s):
     n = (len(s) + 7)//8
     return Cat(*[s[i*8:min((i + 1)*8, len(s))]
         for i in reversed(range(n))])
+
+# Weighted Round Robin -----------------------------------------------------------------------------
+
+class WeightedRoundRobin(Module):
+    """Weighted Round Robin
+
+    Credit based variant of migen's RoundRobin (SP_CE switch policy). Each requester owns
+    ``weights[i]`` credits per arbitration round and one credit is used each time ``consume`` is
+    asserted while it is granted. When ``ce`` is asserted, the grant is given to the next requester
+    (in round-robin order, current grant last) that still has credits; once no requester has
+    credits left, credits are reloaded and arbitration falls back to plain round-robin.
+    ``exhausted`` indicates that the granted requester has no credits left.
+    """
+    def __init__(self, n, weights=None):
+        if weights is None:
+            weights = [1]*n
+        assert len(weights) == n
+        assert min(weights) >= 1
+        self.weights = weights
+        self.request = Signal(n)
+        self.grant   = Signal(max=max(2, n))
+        self.ce      = Signal()
+        self.consume   = Signal()
+        self.exhausted = Signal()
+
+        # # #
+
+        if n > 1:
+            credits    = [Signal(max=w + 1, reset=w) for w in weights]
+            left       = [Signal(max=w + 1) for w in weights]
+            eligible   = Signal(n)
+            candidates = Signal(n)
+            self.comb += self.exhausted.eq(Array(left)[self.grant] == 0)
+
+            # Credits left once the current consumption is accounted.
+            for i in range(n):
+                self.comb += [
+                    left[i].eq(credits[i]),
+                    If(self.consume & (self.grant == i) & (credits[i] != 0),
+                        left[i].eq(credits[i] - 1)
+                    ),
+                    eligible[i].eq(self.request[i] & (left[i] != 0)),
+                ]
+            self.comb += [
+                If(eligible != 0,
+                    candidates.eq(eligible)
+                ).Else(
+                    candidates.eq(self.request)
+                )
+            ]
+
+            # Round-robin selection on candidates, current grant has the lowest priority.
+            cases = {}
+            for i in range(n):
+                switch = []
+                for j in reversed(range(i + 1, i + n + 1)):
+                    t = j % n
+                    switch = [
+                        If(candidates[t],
+                            self.grant.eq(t)
+                        ).Else(
+                            *switch
+                        )
+                    ]
+                cases[i] = switch
+            self.sync += [
+                [credits[i].eq(left[i]) for i in range(n)],
+                If(self.ce,
+                    Case(self.grant, cases),
+                    If(eligible == 0,
+                        [credits[i].eq(weights[i]) for i in range(n)]
+                    )
+                )
+            ]
+        else:
+            self.comb += self.grant.eq(0)
@@ -11,8 +11,10 @@ from migen import *
 from litex.gen.common import reverse_bytes
 
 from litex.soc.interconnect.csr import *
+from litex.soc.interconnect.csr_eventmanager import *
 from litex.soc.interconnect import stream
 from litex.soc.interconnect import wishbone
+from litex.soc.interconnect import axi
 
 # Helpers ------------------------------------------------------------------------------------------
 
@@ -204,3 +206,635 @@ class WishboneDMAWriter(Module, AutoCSR):
         fsm.act("DONE",
             self._done.status.eq(1)
         )
+
+# Burst DMAs ---------------------------------------------------------------------------------------
+
+class _DMABurst(Module, AutoCSR):
+    """Common parts of the burst DMAs.
+
+    Transfers are described by segments (address, length in words) written to ``desc`` (a stream
+    of segments allows scatter-gather). ``words`` counts the words transferred and ``cycles`` the
+    cycles the DMA has been busy (to measure throughput). Subclasses provide ``idle`` (no pending
+    segment and no outstanding access) and ``bus_idle`` (no outstanding bus access: for readers,
+    the datas of the completed segments may still be in the FIFO).
+    """
+    def __init__(self, address_width, data_width, address_shift):
+        self.desc   = stream.Endpoint([("address", address_width), ("length", 32)])
+        self.words  = Signal(32)
+        self.cycles = Signal(32)
+        self.idle   = Signal()
+        self.bus_idle = Signal()
+        self.address_shift = address_shift
+        self.data_width    = data_width
+
+        # # #
+
+        self.sync += If(~self.idle | self.desc.valid, self.cycles.eq(self.cycles + 1))
+
+    def add_csr(self):
+        self._base   = CSRStorage(64)
+        self._length = CSRStorage(32)
+        self._enable = CSRStorage()
+        self._done   = CSRStatus()
+        self._loop   = CSRStorage()
+        self._words  = CSRStatus(32, description="Transferred words (throughput counter).")
+        self._cycles = CSRStatus(32, description="Busy cycles (throughput counter).")
+
+        # # #
+
+        shift = log2_int(self.data_width//8)
+        self.comb += [
+            self._words.status.eq(self.words),
+            self._cycles.status.eq(self.cycles),
+        ]
+
+        fsm = FSM(reset_state="IDLE")
+        fsm = ResetInserter()(fsm)
+        self.submodules += fsm
+        self.comb += fsm.reset.eq(~self._enable.storage)
+        fsm.act("IDLE",
+            NextState("RUN"),
+        )
+        fsm.act("RUN",
+            self.desc.valid.eq(1),
+            self.desc.last.eq(1),
+            self.desc.address.eq(self._base.storage[self.address_shift:]),
+            self.desc.length.eq(self._length.storage[shift:]),
+            If(self.desc.ready,
+                NextState("WAIT")
+            )
+        )
+        fsm.act("WAIT",
+            If(self.idle,
+                If(self._loop.storage,
+                    NextState("RUN")
+                ).Else(
+                    NextState("DONE")
+                )
+            )
+        )
+        fsm.act("DONE",
+            self._done.status.eq(1)
+        )
+
+# WishboneDMABurstReader ---------------------------------------------------------------------------
+
+class WishboneDMABurstReader(_DMABurst):
+    """Read data from Wishbone MMAP memory with bursts.
+
+    Segments (word address, length in words) written to ``desc`` are read with incrementing
+    bursts of up to ``burst_length`` words (one word per cycle with burst capable slaves) into a
+    response FIFO; a burst is only issued when the FIFO has room for it, so the bus is never
+    stalled by the source. The last word of a segment written with ``desc.last`` is produced with
+    ``source.last``.
+    """
+    def __init__(self, bus, endianness="little", burst_length=16, fifo_depth=None, with_csr=False):
+        assert isinstance(bus, wishbone.Interface)
+        _DMABurst.__init__(self, bus.adr_width, bus.data_width,
+            address_shift = log2_int(bus.data_width//8))
+        self.bus    = bus
+        self.source = source = stream.Endpoint([("data", bus.data_width)])
+        desc = self.desc
+
+        # # #
+
+        if fifo_depth is None:
+            fifo_depth = 2*burst_length
+        assert fifo_depth >= burst_length
+        self.submodules.fifo = fifo = stream.SyncFIFO([("data", bus.data_width)], fifo_depth)
+        self.comb += fifo.source.connect(source)
+        self.sync += If(source.valid & source.ready, self.words.eq(self.words + 1))
+
+        address   = Signal(bus.adr_width)
+        remaining = Signal(32)
+        count     = Signal(max=burst_length + 1)
+        n         = Signal(max=burst_length + 1)
+        self.comb += [
+            If(remaining > burst_length,
+                n.eq(burst_length)
+            ).Else(
+                n.eq(remaining)
+            )
+        ]
+
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act("IDLE",
+            If(desc.valid,
+                NextValue(address,   desc.address),
+                NextValue(remaining, desc.length),
+                NextState("RUN")
+            )
+        )
+        fsm.act("RUN",
+            If(remaining == 0,
+                desc.ready.eq(1),
+                NextState("IDLE")
+            ).Elif((fifo.depth - fifo.level) >= n,
+                NextValue(count, n),
+                NextState("BURST")
+            )
+        )
+        fsm.act("BURST",
+            bus.stb.eq(1),
+            bus.cyc.eq(1),
+            bus.we.eq(0),
+            bus.sel.eq(2**(bus.data_width//8)-1),
+            bus.adr.eq(address),
+            bus.cti.eq(Mux(count == 1, 0b111, 0b010)),
+            bus.bte.eq(0b00),
+            fifo.sink.data.eq(format_bytes(bus.dat_r, endianness)),
+            fifo.sink.last.eq(desc.last & (remaining == 1)),
+            If(bus.ack,
+                fifo.sink.valid.eq(1),
+                NextValue(address,   address   + 1),
+                NextValue(remaining, remaining - 1),
+                NextValue(count,     count     - 1),
+                If(count == 1,
+                    NextState("RUN")
+                )
+            )
+        )
+        self.comb += self.idle.eq(fsm.ongoing("IDLE") & ~fifo.source.valid)
+        self.comb += self.bus_idle.eq(~fsm.ongoing("BURST"))
+
+        if with_csr:
+            self.add_csr()
+
+# WishboneDMABurstWriter ---------------------------------------------------------------------------
+
+class WishboneDMABurstWriter(_DMABurst):
+    """Write data to Wishbone MMAP memory with bursts.
+
+    Datas written to ``sink`` are buffered in a FIFO and written to the segments (word address,
+    length in words) written to ``desc`` with incrementing bursts of up to ``burst_length`` words,
+    issued once the FIFO holds the whole burst.
+    """
+    def __init__(self, bus, endianness="little", burst_length=16, fifo_depth=None, with_csr=False):
+        assert isinstance(bus, wishbone.Interface)
+        _DMABurst.__init__(self, bus.adr_width, bus.data_width,
+            address_shift = log2_int(bus.data_width//8))
+        self.bus  = bus
+        self.sink = sink = stream.Endpoint([("data", bus.data_width)])
+        desc = self.desc
+
+        # # #
+
+        if fifo_depth is None:
+            fifo_depth = 2*burst_length
+        assert fifo_depth >= burst_length
+        self.submodules.fifo = fifo = stream.SyncFIFO([("data", bus.data_width)], fifo_depth)
+        self.comb += sink.connect(fifo.sink)
+
+        address   = Signal(bus.adr_width)
+        remaining = Signal(32)
+        count     = Signal(max=burst_length + 1)
+        n         = Signal(max=burst_length + 1)
+        self.comb += [
+            If(remaining > burst_length,
+                n.eq(burst_length)
+            ).Else(
+                n.eq(remaining)
+            )
+        ]
+
+        self.submodules.fsm = fsm = FSM(reset_state="IDLE")
+        fsm.act("IDLE",
+            If(desc.valid,
+                NextValue(address,   desc.address),
+                NextValue(remaining, desc.length),
+                NextState("RUN")
+            )
+        )
+        fsm.act("RUN",
+            If(remaining == 0,
+                desc.ready.eq(1),
+                NextState("IDLE")
+            ).Elif(fifo.level >= n,
+                NextValue(count, n),
+                NextState("BURST")
+            )
+        )
+        fsm.act("BURST",
+            bus.stb.eq(1),
+            bus.cyc.eq(1),
+            bus.we.eq(1),
+            bus.sel.eq(2**(bus.data_width//8)-1),
+            bus.adr.eq(address),
+            bus.cti.eq(Mux(count == 1, 0b111, 0b010)),
+            bus.bte.eq(0b00),
+            bus.dat_w.eq(format_bytes(fifo.source.data, endianness)),
+            If(bus.ack,
+                fifo.source.ready.eq(1),
+                NextValue(address,   address   + 1),
+                NextValue(remaining, remaining - 1),
+                NextValue(count,     count     - 1),
+                If(count == 1,
+                    NextState("RUN")
+                )
+            )
+        )
+        self.sync += If(bus.cyc & bus.stb & bus.ack, self.words.eq(self.words + 1))
+        self.comb += self.idle.eq(fsm.ongoing("IDLE"))
+        self.comb += self.bus_idle.eq(self.idle)
+
+        if with_csr:
+            self.add_csr()
+
+    def add_csr(self):
+        _DMABurst.add_csr(self)
+        # Datas are written from sink: discard them when disabled.
+        self.comb += If(~self._enable.storage, self.sink.ready.eq(1))
+
+# AXIDMABurstReader --------------------------------------------------------------------------------
+
+class AXIDMABurstReader(_DMABurst):
+    """Read data from AXI MMAP memory with bursts.
+
+    Segments (byte address, length in words) written to ``desc`` are read with INCR bursts of up
+    to ``burst_length`` words (not crossing 4KB boundaries). Up to ``max_outstanding`` bursts are
+    kept in flight, the response FIFO space being reserved when a burst is issued so ``r`` is never
+    stalled.
+    """
+    def __init__(self, bus, endianness="little", burst_length=16, fifo_depth=None,
+        max_outstanding=4, with_csr=False):
+        assert isinstance(bus, axi.AXIInterface)
+        _DMABurst.__init__(self, bus.address_width, bus.data_width, address_shift=0)
+        self.bus    = bus
+        self.source = source = stream.Endpoint([("data", bus.data_width)])
+        desc = self.desc
+
+        # # #
+
+        if fifo_depth is None:
+            fifo_depth = max_outstanding*burst_length
+        assert fifo_depth >= burst_length
+        bytes_per_word = bus.data_width//8
+        shift = log2_int(bytes_per_word)
+
+        self.submodules.fifo = fifo = stream.SyncFIFO([("data", bus.data_width)], fifo_depth)
+        self.comb += fifo.source.connect(source)
+        self.sync += If(source.valid & source.ready, self.words.eq(self.words + 1))
+
+        # Bursts infos (last segment's burst) for source.last.
+        self.submodules.info = info = stream.SyncFIFO([("end", 1)], max_outstanding)
+
+        # AR: issue bursts while response FIFO space can be reserved.
+        address     = Signal(bus.address_width)
+        remaining   = Signal(32)
+        active      = Signal()
+        n           = Signal(max=burst_length + 1)
+        boundary    = Signal(max=4096//bytes_per_word + 1)
+        reserved    = Signal(max=fifo_depth + 1)
+        outstanding = Signal(max=max_outstanding + 1)
+        self.comb += [
+            boundary.eq((4096 - address[:12]) >> shift),
+            If((remaining > burst_length) & (boundary > burst_length),
+                n.eq(burst_length)
+            ).Elif(remaining > boundary,
+                n.eq(boundary)
+            ).Else(
+                n.eq(remaining)
+            )
+        ]
+        ar_handshake = Signal()
+        r_handshake  = Signal()
+        r_last       = Signal()
+        self.comb += [
+            ar_handshake.eq(bus.ar.valid & bus.ar.ready),
+            r_handshake.eq(bus.r.valid & bus.r.ready),
+            r_last.eq(r_handshake & bus.r.last),
+        ]
+        self.comb += [
+            bus.ar.valid.eq(active & (remaining != 0) &
+                ((fifo.depth - fifo.level - reserved) >= n) &
+                (outstanding < max_outstanding) & info.sink.ready),
+            bus.ar.addr.eq(address),
+            bus.ar.burst.eq(axi.BURST_INCR),
+            bus.ar.len.eq(n - 1),
+            bus.ar.size.eq(shift),
+            info.sink.valid.eq(ar_handshake),
+            info.sink.end.eq(desc.last & (remaining == n)),
+            desc.ready.eq(active & (remaining == 0)),
+        ]
+        self.sync += [
+            If(desc.valid & ~active,
+                active.eq(1),
+                address.eq(desc.address),
+                remaining.eq(desc.length)
+            ),
+            If(desc.valid & desc.ready,
+                active.eq(0)
+            ),
+            If(ar_handshake,
+                address.eq(address + (n << shift)),
+                remaining.eq(remaining - n)
+            ),
+            reserved.eq(reserved + Mux(ar_handshake, n, 0) - r_handshake),
+            outstanding.eq(outstanding + ar_handshake - r_last),
+        ]
+
+        # R: write responses to FIFO.
+        self.comb += [
+            bus.r.ready.eq(1),
+            fifo.sink.valid.eq(bus.r.valid),
+            fifo.sink.data.eq(format_bytes(bus.r.data, endianness)),
+            fifo.sink.last.eq(bus.r.last & info.source.end),
+            info.source.ready.eq(r_last),
+        ]
+        self.comb += self.idle.eq(~active & (outstanding == 0) & ~fifo.source.valid)
+        self.comb += self.bus_idle.eq(outstanding == 0)
+
+        if with_csr:
+            self.add_csr()
+
+# AXIDMABurstWriter --------------------------------------------------------------------------------
+
+class AXIDMABurstWriter(_DMABurst):
+    """Write data to AXI MMAP memory with bursts.
+
+    Datas written to ``sink`` are buffered in a FIFO and written to the segments (byte address,
+    length in words) written to ``desc`` with INCR bursts of up to ``burst_length`` words (not
+    crossing 4KB boundaries), issued once the FIFO holds the whole burst. Up to
+    ``max_outstanding`` bursts are kept in flight.
+    """
+    def __init__(self, bus, endianness="little", burst_length=16, fifo_depth=None,
+        max_outstanding=4, with_csr=False):
+        assert isinstance(bus, axi.AXIInterface)
+        _DMABurst.__init__(self, bus.address_width, bus.data_width, address_shift=0)
+        self.bus  = bus
+        self.sink = sink = stream.Endpoint([("data", bus.data_width)])
+        desc = self.desc
+
+        # # #
+
+        if fifo_depth is None:
+            fifo_depth = 2*burst_length
+        assert fifo_depth >= burst_length
+        bytes_per_word = bus.data_width//8
+        shift = log2_int(bytes_per_word)
+
+        self.submodules.fifo = fifo = stream.SyncFIFO([("data", bus.data_width)], fifo_depth)
+        self.comb += sink.connect(fifo.sink)
+
+        # Bursts lengths, from AW to W.
+        self.submodules.lengths = lengths = stream.SyncFIFO([("length", 9)], max_outstanding)
+
+        # AW: issue bursts once datas are available.
+        address     = Signal(bus.address_width)
+        remaining   = Signal(32)
+        active      = Signal()
+        n           = Signal(max=burst_length + 1)
+        boundary    = Signal(max=4096//bytes_per_word + 1)
+        committed   = Signal(max=fifo_depth + 1) # FIFO words of issued bursts not yet sent.
+        outstanding = Signal(max=max_outstanding + 1)
+        self.comb += [
+            boundary.eq((4096 - address[:12]) >> shift),
+            If((remaining > burst_length) & (boundary > burst_length),
+                n.eq(burst_length)
+            ).Elif(remaining > boundary,
+                n.eq(boundary)
+            ).Else(
+                n.eq(remaining)
+            )
+        ]
+        aw_handshake = Signal()
+        w_handshake  = Signal()
+        b_handshake  = Signal()
+        self.comb += [
+            aw_handshake.eq(bus.aw.valid & bus.aw.ready),
+            w_handshake.eq(bus.w.valid & bus.w.ready),
+            b_handshake.eq(bus.b.valid & bus.b.ready),
+        ]
+        self.comb += [
+            bus.aw.valid.eq(active & (remaining != 0) &
+                ((fifo.level - committed) >= n) &
+                (outstanding < max_outstanding) & lengths.sink.ready),
+            bus.aw.addr.eq(address),
+            bus.aw.burst.eq(axi.BURST_INCR),
+            bus.aw.len.eq(n - 1),
+            bus.aw.size.eq(shift),
+            lengths.sink.valid.eq(aw_handshake),
+            lengths.sink.length.eq(n),
+            desc.ready.eq(active & (remaining == 0)),
+        ]
+        self.sync += [
+            If(desc.valid & ~active,
+                active.eq(1),
+                address.eq(desc.address),
+                remaining.eq(desc.length)
+            ),
+            If(desc.valid & desc.ready,
+                active.eq(0)
+            ),
+            If(aw_handshake,
+                address.eq(address + (n << shift)),
+                remaining.eq(remaining - n)
+            ),
+            committed.eq(committed + Mux(aw_handshake, n, 0) - w_handshake),
+            outstanding.eq(outstanding + aw_handshake - b_handshake),
+        ]
+
+        # W: send bursts datas.
+        count = Signal(9)
+        self.comb += [
+            bus.w.valid.eq(lengths.source.valid & fifo.source.valid),
+            bus.w.data.eq(format_bytes(fifo.source.data, endianness)),
+            bus.w.strb.eq(2**bytes_per_word - 1),
+            bus.w.last.eq(count == (lengths.source.length - 1)),
+            fifo.source.ready.eq(w_handshake),
+            lengths.source.ready.eq(w_handshake & bus.w.last),
+        ]
+        self.sync += If(w_handshake,
+            count.eq(count + 1),
+            If(bus.w.last,
+                count.eq(0)
+            )
+        )
+        self.sync += If(w_handshake, self.words.eq(self.words + 1))
+
+        # B: responses.
+        self.comb += bus.b.ready.eq(1)
+        self.comb += self.idle.eq(~active & (outstanding == 0))
+        self.comb += self.bus_idle.eq(self.idle)
+
+        if with_csr:
+            self.add_csr()
+
+    def add_csr(self):
+        _DMABurst.add_csr(self)
+        # Datas are written from sink: discard them when disabled.
+        self.comb += If(~self._enable.storage, self.sink.ready.eq(1))
+
+# DMA Descriptor Ring ------------------------------------------------------------------------------
+
+DESC_FLAG_OWN  = 0b0001 # Descriptor owned by the DMA (set by software, cleared on completion).
+DESC_FLAG_IRQ  = 0b0010 # Count descriptor's completion for the interrupt.
+DESC_FLAG_LAST = 0b0100 # Last segment of a packet/frame (source.last on readers).
+DESC_FLAG_DONE = 1 << 31 # Set on completion write-back.
+
+class WishboneDMADescriptorRing(Module, AutoCSR):
+    """Descriptor based scatter-gather control of a burst DMA.
+
+    Descriptors are fetched from main RAM through ``bus`` and programmed on the ``desc`` stream of
+    ``dma`` (a Wishbone/AXI burst DMA). Each descriptor is 4 32-bit words:
+
+    - ``+0x0``: address (bytes).
+    - ``+0x4``: length (bytes).
+    - ``+0x8``: flags (``DESC_FLAG_xxx``).
+    - ``+0xc``: next descriptor's address (0: end of chain; pointing to the first descriptor
+      builds a ring).
+
+    The DMA processes descriptors from ``_base`` while their OWN flag is set; on completion the
+    flags word is written back with OWN cleared and DONE set, so software can re-arm descriptors
+    while the DMA is running. When a descriptor is not owned, the DMA waits for a ``_kick``.
+
+    The ``done`` event is raised every ``_coalesce`` completed descriptors with the IRQ flag, or
+    ``_timeout`` cycles (0: disabled) after the last completion, or when the chain ends, to reduce
+    the interrupts rate on streaming workloads.
+    """
+    def __init__(self, bus, dma):
+        assert isinstance(bus, wishbone.Interface)
+        assert bus.data_width == 32
+        self.bus = bus
+        self.dma = dma
+
+        self._base      = CSRStorage(32, description="First descriptor's address.")
+        self._enable    = CSRStorage(description="Enable descriptors processing (from ``_base``).")
+        self._kick      = CSRStorage(description="Re-fetch current descriptor (after setting its OWN flag).")
+        self._coalesce  = CSRStorage(16, reset=1, description="Completed descriptors per interrupt.")
+        self._timeout   = CSRStorage(32, description="Interrupt timeout after last completion (cycles).")
+        self._current   = CSRStatus(32, description="Current descriptor's address.")
+        self._completed = CSRStatus(32, description="Completed descriptors.")
+        self._running   = CSRStatus(description="Descriptors processing ongoing.")
+
+        self.submodules.ev = EventManager()
+        self.ev.done = EventSourcePulse(description="Descriptors completed.")
+        self.ev.finalize()
+
+        # # #
+
+        # Descriptor.
+        current   = Signal(32)
+        address   = Signal(32)
+        length    = Signal(32)
+        flags     = Signal(32)
+        next_desc = Signal(32)
+        self.comb += self._current.status.eq(current)
+
+        shift = log2_int(dma.data_width//8)
+        self.comb += [
+            dma.desc.address.eq(address[dma.address_shift:]),
+            dma.desc.length.eq(length[shift:]),
+            dma.desc.last.eq((flags & DESC_FLAG_LAST) != 0),
+        ]
+
+        # Completion: once all the bus accesses of the segment are done (readers: all datas read,
+        # writers: all datas written).
+        dma_done = Signal()
+        self.comb += dma_done.eq(dma.bus_idle)
+
+        # Interrupts coalescing.
+        completed = Signal(32)
+        pending   = Signal(16)
+        timer     = Signal(32)
+        complete  = Signal()
+        flush     = Signal()
+        self.comb += self._completed.status.eq(completed)
+        self.sync += [
+            If(complete,
+                completed.eq(completed + 1),
+                timer.eq(0),
+                If((flags & DESC_FLAG_IRQ) != 0,
+                    pending.eq(pending + 1)
+                )
+            ).Elif(pending != 0,
+                timer.eq(timer + 1)
+            ),
+            # A completion on the trigger cycle is kept pending for the next interrupt.
+            If(self.ev.done.trigger,
+                pending.eq(complete & ((flags & DESC_FLAG_IRQ) != 0)),
+                timer.eq(0)
+            )
+        ]
+        self.comb += If(pending != 0,
+            If(pending >= self._coalesce.storage, self.ev.done.trigger.eq(1)),
+            If((self._timeout.storage != 0) & (timer >= self._timeout.storage), self.ev.done.trigger.eq(1)),
+            If(flush, self.ev.done.trigger.eq(1))
+        )
+
+        # FSM.
+        count = Signal(2)
+        fsm = FSM(reset_state="IDLE")
+        fsm = ResetInserter()(fsm)
+        self.submodules.fsm = fsm
+        self.comb += fsm.reset.eq(~self._enable.storage)
+        self.comb += self._running.status.eq(~fsm.ongoing("IDLE") & ~fsm.ongoing("STOPPED"))
+        fsm.act("IDLE",
+            NextValue(current, self._base.storage),
+            NextState("FETCH")
+        )
+        fsm.act("FETCH",
+            bus.stb.eq(1),
+            bus.cyc.eq(1),
+            bus.we.eq(0),
+            bus.sel.eq(0b1111),
+            bus.adr.eq(current[2:] + count),
+            bus.cti.eq(Mux(count == 3, 0b111, 0b010)),
+            bus.bte.eq(0b00),
+            If(bus.ack,
+                Case(count, {
+                    0: NextValue(address, bus.dat_r),
+                    1: NextValue(length,  bus.dat_r),
+                    2: NextValue(flags,   bus.dat_r),
+                    3: NextValue(next_desc, bus.dat_r),
+                }),
+                NextValue(count, count + 1),
+                If(count == 3,
+                    NextState("CHECK")
+                )
+            )
+        )
+        fsm.act("CHECK",
+            If((flags & DESC_FLAG_OWN) != 0,
+                NextState("RUN")
+            ).Else(
+                flush.eq(1),
+                NextState("WAIT-KICK")
+            )
+        )
+        fsm.act("RUN",
+            dma.desc.valid.eq(1),
+            If(dma.desc.ready,
+                NextState("WAIT-DMA")
+            )
+        )
+        fsm.act("WAIT-DMA",
+            If(dma_done,
+                NextState("WRITE-BACK")
+            )
+        )
+        fsm.act("WRITE-BACK",
+            bus.stb.eq(1),
+            bus.cyc.eq(1),
+            bus.we.eq(1),
+            bus.sel.eq(0b1111),
+            bus.adr.eq(current[2:] + 2),
+            bus.dat_w.eq((flags & ~DESC_FLAG_OWN) | DESC_FLAG_DONE),
+            If(bus.ack,
+                complete.eq(1),
+                NextValue(current, next_desc),
+                If(next_desc == 0,
+                    NextState("STOPPED")
+                ).Else(
+                    NextState("FETCH")
+                )
+            )
+        )
+        fsm.act("WAIT-KICK",
+            If(self._kick.re,
+                NextState("FETCH")
+            )
+        )
+        fsm.act("STOPPED",
+            flush.eq(1)
+        )
@@ -255,13 +255,20 @@ CMD_WRITE_BURST_FIXED = 0x03
 CMD_READ_BURST_FIXED  = 0x04
 
 class Stream2Wishbone(Module):
-    def __init__(self, phy=None, clk_freq=None, data_width=32, address_width=32):
+    def __init__(self, phy=None, clk_freq=None, data_width=32, address_width=32, rx_fifo_depth=0):
         self.sink   = sink   = stream.Endpoint([("data", 8)]) if phy is None else phy.source
         self.source = source = stream.Endpoint([("data", 8)]) if phy is None else phy.sink
         self.wishbone = wishbone.Interface()
 
         # # #
 
+        # Optional RX FIFO: buffers the commands received while a read response is sent, allowing
+        # the host to pipeline commands (up to rx_fifo_depth bytes in flight).
+        if rx_fifo_depth:
+            self.submodules.rx_fifo = rx_fifo = stream.SyncFIFO([("data", 8)], rx_fifo_depth)
+            self.comb += sink.connect(rx_fifo.sink)
+            sink = rx_fifo.source
+
         cmd         = Signal(8,                        reset_less=True)
         incr        = Signal()
         length      = Signal(8,                        reset_less=True)
@@ -378,17 +385,17 @@ class Stream2Wishbone(Module):
 
 
 class UARTBone(Stream2Wishbone):
-    def __init__(self, pads, clk_freq, baudrate=115200, cd="sys"):
+    def __init__(self, pads, clk_freq, baudrate=115200, cd="sys", rx_fifo_depth=0):
         if cd == "sys":
             self.submodules.phy = RS232PHY(pads, clk_freq, baudrate)
-            Stream2Wishbone.__init__(self, self.phy, clk_freq=clk_freq)
+            Stream2Wishbone.__init__(self, self.phy, clk_freq=clk_freq, rx_fifo_depth=rx_fifo_depth)
         else:
             self.submodules.phy = ClockDomainsRenamer(cd)(RS232PHY(pads, clk_freq, baudrate))
             self.submodules.tx_cdc = stream.ClockDomainCrossing([("data", 8)], cd_from="sys", cd_to=cd)
             self.submodules.rx_cdc = stream.ClockDomainCrossing([("data", 8)], cd_from=cd,    cd_to="sys")
             self.comb += self.phy.source.connect(self.rx_cdc.sink)
             self.comb += self.tx_cdc.source.connect(self.phy.sink)
-            Stream2Wishbone.__init__(self, clk_freq=clk_freq)
+            Stream2Wishbone.__init__(self, clk_freq=clk_freq, rx_fifo_depth=rx_fifo_depth)
             self.comb += self.rx_cdc.source.connect(self.sink)
             self.comb += self.source.connect(self.tx_cdc.sink)
 
@@ -10,6 +10,8 @@ import logging
 import time
 import datetime
 from math import log2, ceil
+from functools import reduce
+from operator import or_
 
 from migen import *
 
@@ -109,9 +111,10 @@ class SoCBusHandler(Module):
     supported_standard      = ["wishbone", "axi-lite"]
     supported_data_width    = [32, 64]
     supported_address_width = [32]
+    supported_interconnect  = ["shared", "crossbar", "auto"]
 
     # Creation -------------------------------------------------------------------------------------
-    def __init__(self, name="SoCBusHandler", standard="wishbone", data_width=32, address_width=32, timeout=1e6, reserved_regions={}):
+    def __init__(self, name="SoCBusHandler", standard="wishbone", data_width=32, address_width=32, timeout=1e6, interconnect="shared", reserved_regions={}):
         self.logger = logging.getLogger(name)
         self.logger.info("Creating Bus Handler...")
 
@@ -139,11 +142,21 @@ class SoCBusHandler(Module):
                 colorer(", ".join(str(x) for x in self.supported_address_width))))
             raise
 
+        # Check Interconnect
+        if interconnect not in self.supported_interconnect:
+            self.logger.error("Unsupported {} {}, supporteds: {:s}".format(
+                colorer("Interconnect", color="red"),
+                colorer(interconnect),
+                colorer(", ".join(self.supported_interconnect))))
+            raise
+
         # Create Bus
         self.standard      = standard
         self.data_width    = data_width
         self.address_width = address_width
+        self.interconnect  = interconnect
         self.masters       = {}
+        self.weights       = {}
         self.slaves        = {}
         self.regions       = {}
         self.io_regions    = {}
@@ -338,7 +351,10 @@ class SoCBusHandler(Module):
                 tobits    = colorer(bridged_interface.data_width)))
         return bridged_interface
 
-    def add_master(self, name=None, master=None):
+    def add_master(self, name=None, master=None, weight=1):
+        # weight: relative share of the bus accesses when masters compete (see wishbone.Arbiter).
+        # Accesses are counted per classic cycle/burst, but the grant only changes when a master
+        # drops cyc: masters holding cyc between accesses are not limited by the weights.
         if name is None:
             name = "master{:d}".format(len(self.masters))
         if name in self.masters.keys():
@@ -349,6 +365,7 @@ class SoCBusHandler(Module):
             raise
         master = self.add_adapter(name, master, "m2s")
         self.masters[name] = master
+        self.weights[name] = weight
         self.logger.info("{} {} as Bus Master.".format(
             colorer(name,    color="underline"),
             colorer("added", color="green")))
@@ -385,6 +402,33 @@ class SoCBusHandler(Module):
             colorer(name, color="underline"),
             colorer("added", color="green")))
 
+    # Interconnect ---------------------------------------------------------------------------------
+    def get_interconnect(self):
+        # If 1 bus_master, 1 bus_slave and no address translation, use PointToPoint.
+        if ((len(self.masters) == 1)  and
+            (len(self.slaves)  == 1)  and
+            (next(iter(self.regions.values())).origin == 0)):
+            return "p2p"
+        # With several masters and slaves, a Crossbar lets masters access different slaves concurrently.
+        if self.interconnect == "auto":
+            if (len(self.masters) > 1) and (len(self.slaves) > 1):
+                return "crossbar"
+            return "shared"
+        return self.interconnect
+
+    def get_weights(self):
+        # Only return weights when set, plain round-robin arbitration is used otherwise.
+        weights = [self.weights[name] for name in self.masters.keys()]
+        if all(weight == 1 for weight in weights):
+            return None
+        return weights
+
+    def get_parallelism(self, interconnect):
+        # Estimated maximum number of concurrent master <-> slave accesses.
+        if interconnect == "crossbar":
+            return min(len(self.masters), len(self.slaves))
+        return 1
+
     # Str ------------------------------------------------------------------------------------------
     def __str__(self):
         r = "{}-bit {} Bus, {}GiB Address Space.\n".format(
@@ -399,7 +443,8 @@ class SoCBusHandler(Module):
            r += colorer(name, color="underline") + " "*(20-len(name)) + ": " + str(region) + "\n"
         r += "Bus Masters: ({})\n".format(len(self.masters.keys())) if len(self.masters.keys()) else ""
         for name in self.masters.keys():
-           r += "- {}\n".format(colorer(name, color="underline"))
+           r += "- {}".format(colorer(name, color="underline"))
+           r += " (weight: {})\n".format(self.weights[name]) if self.weights[name] != 1 else "\n"
         r += "Bus Slaves: ({})\n".format(len(self.slaves.keys())) if len(self.slaves.keys()) else ""
         for name in self.slaves.keys():
            r += "- {}\n".format(colorer(name, color="underline"))
@@ -478,9 +523,9 @@ class SoCLocHandler(Module):
 # SoCCSRHandler ------------------------------------------------------------------------------------
 
 class SoCCSRHandler(SoCLocHandler):
-    supported_data_width    = [8, 32]
+    supported_data_width    = [8, 32, 64]
     supported_address_width = [14+i for i in range(4)]
-    supported_alignment     = [32]
+    supported_alignment     = [32, 64]
     supported_paging        = [0x800*2**i for i in range(4)]
     supported_ordering      = ["big", "little"]
 
@@ -688,12 +733,15 @@ class SoC(Module):
         bus_data_width       = 32,
         bus_address_width    = 32,
         bus_timeout          = 1e6,
+        bus_interconnect     = "shared",
         bus_reserved_regions = {},
 
         csr_data_width       = 32,
         csr_address_width    = 14,
         csr_paging           = 0x800,
         csr_ordering         = "big",
+        csr_pipelined        = False,
+        csr_interconnect_depth = 0,
         csr_reserved_csrs    = {},
 
         irq_n_irqs           = 32,
@@ -714,10 +762,12 @@ class SoC(Module):
         self.logger.info("System clock: {:3.2f}MHz.".format(sys_clk_freq/1e6))
 
         # SoC attributes ---------------------------------------------------------------------------
-        self.platform     = platform
-        self.sys_clk_freq = sys_clk_freq
-        self.constants    = {}
-        self.csr_regions  = {}
+        self.platform      = platform
+        self.sys_clk_freq  = sys_clk_freq
+        self.constants     = {}
+        self.csr_regions   = {}
+        self.csr_pipelined = csr_pipelined
+        self.csr_interconnect_depth = csr_interconnect_depth
 
         # SoC Bus Handler --------------------------------------------------------------------------
         self.submodules.bus = SoCBusHandler(
@@ -725,6 +775,7 @@ class SoC(Module):
             data_width       = bus_data_width,
             address_width    = bus_address_width,
             timeout          = bus_timeout,
+            interconnect     = bus_interconnect,
             reserved_regions = bus_reserved_regions,
            )
 
@@ -732,7 +783,7 @@ class SoC(Module):
         self.submodules.csr = SoCCSRHandler(
             data_width    = csr_data_width,
             address_width = csr_address_width,
-            alignment     = 32,
+            alignment     = max(csr_data_width, 32),
             paging        = csr_paging,
             ordering      = csr_ordering,
             reserved_csrs = csr_reserved_csrs,
@@ -806,17 +857,40 @@ class SoC(Module):
     def add_rom(self, name, origin, size, contents=[], mode="r"):
         self.add_ram(name, origin, size, contents, mode=mode)
 
-    def add_csr_bridge(self, origin, register=False):
-        csr_bridge_cls = {
-            "wishbone": wishbone.Wishbone2CSR,
-            "axi-lite": axi.AXILite2CSR,
-        }[self.bus.standard]
-        self.submodules.csr_bridge = csr_bridge_cls(
-            bus_csr       = csr_bus.Interface(
+    def add_csr_bridge(self, origin, register=False, pipelined=False, latency=1):
+        if self.csr.alignment > self.bus.data_width:
+            self.logger.error("CSR Alignment ({}) {} Bus Data Width ({}).".format(
+                colorer(self.csr.alignment),
+                colorer("should be <=", color="red"),
+                colorer(self.bus.data_width)))
+            raise
+        bus_csr = csr_bus.Interface(
             address_width = self.csr.address_width,
-            data_width    = self.csr.data_width),
-            register      = register)
-        csr_size   = 2**(self.csr.address_width + 2)
+            data_width    = self.csr.data_width)
+        # CSR words are served on alignment-wide bus words (full-width registers in one access).
+        bus_wishbone = wishbone.Interface(data_width=self.csr.alignment)
+        if pipelined:
+            if self.bus.standard != "wishbone":
+                self.logger.error("Pipelined CSR bridge {} with {} Bus.".format(
+                    colorer("not supported", color="red"),
+                    colorer(self.bus.standard)))
+                raise
+            self.submodules.csr_bridge = wishbone.Wishbone2CSRPipelined(bus_wishbone, bus_csr, latency=latency)
+        elif latency > 1:
+            if self.bus.standard != "wishbone":
+                self.logger.error("CSR read latency of {} cycles {} with {} Bus.".format(
+                    colorer(latency),
+                    colorer("not supported", color="red"),
+                    colorer(self.bus.standard)))
+                raise
+            self.submodules.csr_bridge = wishbone.Wishbone2CSR(bus_wishbone, bus_csr, register=register, latency=latency)
+        else:
+            csr_bridge_cls, bus = {
+                "wishbone": (wishbone.Wishbone2CSR, bus_wishbone),
+                "axi-lite": (axi.AXILite2CSR,       axi.AXILiteInterface(data_width=self.csr.alignment)),
+            }[self.bus.standard]
+            self.submodules.csr_bridge = csr_bridge_cls(bus, bus_csr, register=register)
+        csr_size   = 2**(self.csr.address_width + log2_int(self.csr.alignment//8))
         csr_region = SoCRegion(origin=origin, size=csr_size, cached=False)
         bus = getattr(self.csr_bridge, self.bus.standard.replace('-', '_'))
         self.bus.add_slave("csr", bus, csr_region)
@@ -869,6 +943,7 @@ class SoC(Module):
                     standard         = "wishbone",
                     data_width       = self.bus.data_width,
                     address_width    = self.bus.address_width,
+                    interconnect     = self.bus.interconnect,
                 )
                 dma_bus = wishbone.Interface(data_width=self.bus.data_width)
                 self.dma_bus.add_slave("dma", slave=dma_bus, region=SoCRegion(origin=0x00000000, size=0x100000000)) # FIXME: covers lower 4GB only
@@ -905,42 +980,58 @@ class SoC(Module):
         self.logger.info(self.irq)
         self.logger.info(colorer("-"*80, color="bright"))
 
-        interconnect_p2p_cls = {
-            "wishbone": wishbone.InterconnectPointToPoint,
-            "axi-lite": axi.AXILiteInterconnectPointToPoint,
-        }[self.bus.standard]
-        interconnect_shared_cls = {
-            "wishbone": wishbone.InterconnectShared,
-            "axi-lite": axi.AXILiteInterconnectShared,
-        }[self.bus.standard]
+        interconnect_cls = {
+            "wishbone": {
+                "p2p":      wishbone.InterconnectPointToPoint,
+                "shared":   wishbone.InterconnectShared,
+                "crossbar": wishbone.Crossbar,
+            },
+            "axi-lite": {
+                "p2p":      axi.AXILiteInterconnectPointToPoint,
+                "shared":   axi.AXILiteInterconnectShared,
+                "crossbar": axi.AXILiteCrossbar,
+            },
+        }
 
         # SoC CSR bridge ---------------------------------------------------------------------------
         # Always use registered CSR bridge ... otherwise zed_vvm fails timing
-        self.add_csr_bridge(self.mem_map["csr"], register=True)  # hasattr(self, "sdram"))
+        # (unless the zero-wait-state pipelined bridge is explicitly requested).
+        csr_latency = 1
+        if self.csr_interconnect_depth:
+            csr_latency = csr_bus.InterconnectTree.get_latency(self.csr_interconnect_depth)
+        self.add_csr_bridge(self.mem_map["csr"],
+            register  = True,
+            pipelined = self.csr_pipelined,
+            latency   = csr_latency)  # hasattr(self, "sdram"))
 
         # SoC Bus Interconnect ---------------------------------------------------------------------
         if len(self.bus.masters) and len(self.bus.slaves):
+            interconnect = self.bus.get_interconnect()
             # If 1 bus_master, 1 bus_slave and no address translation, use InterconnectPointToPoint.
-            if ((len(self.bus.masters) == 1)  and
-                (len(self.bus.slaves)  == 1)  and
-                (next(iter(self.bus.regions.values())).origin == 0)):
-                self.submodules.bus_interconnect = interconnect_p2p_cls(
+            if interconnect == "p2p":
+                self.submodules.bus_interconnect = interconnect_cls[self.bus.standard]["p2p"](
                     master = next(iter(self.bus.masters.values())),
                     slave  = next(iter(self.bus.slaves.values())))
-            # Otherwise, use InterconnectShared.
+            # Otherwise, use InterconnectShared or Crossbar.
             else:
-                self.submodules.bus_interconnect = interconnect_shared_cls(
+                self.submodules.bus_interconnect = interconnect_cls[self.bus.standard][interconnect](
                     masters        = self.bus.masters.values(),
                     slaves         = [(self.bus.regions[n].decoder(self.bus), s) for n, s in self.bus.slaves.items()],
                     register       = True,
-                    timeout_cycles = self.bus.timeout)
+                    timeout_cycles = self.bus.timeout,
+                    weights        = self.bus.get_weights())
                 if hasattr(self, "ctrl") and self.bus.timeout is not None:
                     if hasattr(self.ctrl, "bus_error"):
-                        self.comb += self.ctrl.bus_error.eq(self.bus_interconnect.timeout.error)
-            self.bus.logger.info("Interconnect: {} ({} <-> {}).".format(
+                        if hasattr(self.bus_interconnect, "timeouts"):
+                            timeouts = self.bus_interconnect.timeouts
+                        else:
+                            timeouts = [self.bus_interconnect.timeout]
+                        self.comb += self.ctrl.bus_error.eq(reduce(or_, [t.error for t in timeouts]))
+            self.bus.logger.info("Interconnect: {} ({} <-> {}), up to {} concurrent access(es).".format(
                 colorer(self.bus_interconnect.__class__.__name__),
                 colorer(len(self.bus.masters)),
-                colorer(len(self.bus.slaves))))
+                colorer(len(self.bus.slaves)),
+                colorer(self.bus.get_parallelism(interconnect))))
         self.add_constant("CONFIG_BUS_STANDARD",      self.bus.standard.upper())
         self.add_constant("CONFIG_BUS_DATA_WIDTH",    self.bus.data_width)
         self.add_constant("CONFIG_BUS_ADDRESS_WIDTH", self.bus.address_width)
@@ -948,23 +1039,24 @@ class SoC(Module):
         # SoC DMA Bus Interconnect (Cache Coherence) -----------------------------------------------
         if hasattr(self, "dma_bus"):
             if len(self.dma_bus.masters) and len(self.dma_bus.slaves):
+                interconnect = self.dma_bus.get_interconnect()
                 # If 1 bus_master, 1 bus_slave and no address translation, use InterconnectPointToPoint.
-                if ((len(self.dma_bus.masters) == 1)  and
-                    (len(self.dma_bus.slaves)  == 1)  and
-                    (next(iter(self.dma_bus.regions.values())).origin == 0)):
+                if interconnect == "p2p":
                     self.submodules.dma_bus_interconnect = wishbone.InterconnectPointToPoint(
                         master = next(iter(self.dma_bus.masters.values())),
                         slave  = next(iter(self.dma_bus.slaves.values())))
-                # Otherwise, use InterconnectShared.
+                # Otherwise, use InterconnectShared or Crossbar.
                 else:
-                    self.submodules.dma_bus_interconnect = wishbone.InterconnectShared(
+                    self.submodules.dma_bus_interconnect = interconnect_cls["wishbone"][interconnect](
                         masters        = self.dma_bus.masters.values(),
                         slaves         = [(self.dma_bus.regions[n].decoder(self.dma_bus), s) for n, s in self.dma_bus.slaves.items()],
-                        register       = True)
-                self.bus.logger.info("DMA Interconnect: {} ({} <-> {}).".format(
+                        register       = True,
+                        weights        = self.dma_bus.get_weights())
+                self.bus.logger.info("DMA Interconnect: {} ({} <-> {}), up to {} concurrent access(es).".format(
                     colorer(self.dma_bus_interconnect.__class__.__name__),
                     colorer(len(self.dma_bus.masters)),
-                    colorer(len(self.dma_bus.slaves))))
+                    colorer(len(self.dma_bus.slaves)),
+                    colorer(self.dma_bus.get_parallelism(interconnect))))
             self.add_constant("CONFIG_CPU_HAS_DMA_BUS")
 
         # SoC CSR Interconnect ---------------------------------------------------------------------
@@ -975,11 +1067,30 @@ class SoC(Module):
             alignment          = self.csr.alignment,
             paging             = self.csr.paging,
             ordering           = self.csr.ordering,
-            soc_bus_data_width = self.bus.data_width)
+            soc_bus_data_width = self.bus.data_width,
+            decode             = not self.csr_interconnect_depth)
         if len(self.csr.masters):
-            self.submodules.csr_interconnect = csr_bus.InterconnectShared(
-                masters = list(self.csr.masters.values()),
-                slaves  = self.csr_bankarray.get_buses())
+            if self.csr_interconnect_depth:
+                # Arbitrate CSR masters and decode/register accesses through a tree of CSR banks.
+                csr_bus_tree = csr_bus.Interface(
+                    address_width = self.csr.address_width,
+                    data_width    = self.csr.data_width)
+                self.submodules.csr_interconnect = csr_bus.InterconnectShared(
+                    masters = list(self.csr.masters.values()),
+                    slaves  = [csr_bus_tree])
+                self.submodules.csr_interconnect_tree = csr_bus.InterconnectTree(
+                    master             = csr_bus_tree,
+                    slaves             = self.csr_bankarray.get_slaves(),
+                    depth              = self.csr_interconnect_depth,
+                    paging             = self.csr.paging,
+                    soc_bus_data_width = self.bus.data_width)
+                self.csr.logger.info("CSR Interconnect: Tree of depth {}, {} cycles read latency.".format(
+                    colorer(self.csr_interconnect_depth),
+                    colorer(self.csr_interconnect_tree.latency)))
+            else:
+                self.submodules.csr_interconnect = csr_bus.InterconnectShared(
+                    masters = list(self.csr.masters.values()),
+                    slaves  = self.csr_bankarray.get_buses())
 
         # Add CSRs regions
         for name, csrs, mapaddr, rmap in self.csr_bankarray.banks:
@@ -1125,13 +1236,14 @@ class LiteXSoC(SoC):
             self.add_constant("UART_POLLING")
 
     # Add UARTbone ---------------------------------------------------------------------------------
-    def add_uartbone(self, name="serial", clk_freq=None, baudrate=115200, cd="sys"):
+    def add_uartbone(self, name="serial", clk_freq=None, baudrate=115200, cd="sys", rx_fifo_depth=0):
         from litex.soc.cores import uart
         self.submodules.uartbone = uart.UARTBone(
-            pads     = self.platform.request(name),
-            clk_freq = clk_freq if clk_freq is not None else self.sys_clk_freq,
-            baudrate = baudrate,
-            cd       = cd)
+            pads          = self.platform.request(name),
+            clk_freq      = clk_freq if clk_freq is not None else self.sys_clk_freq,
+            baudrate      = baudrate,
+            cd            = cd,
+            rx_fifo_depth = rx_fifo_depth)
         self.bus.add_master(name="uartbone", master=self.uartbone.wishbone)
 
     # Add SDRAM ------------------------------------------------------------------------------------
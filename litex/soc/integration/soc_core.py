@@ -65,6 +65,7 @@ class SoCCore(LiteXSoC):
         bus_data_width           = 32,
         bus_address_width        = 32,
         bus_timeout              = 1e6,
+        bus_interconnect         = "shared",
         # CPU parameters
         cpu_type                 = "vexriscv",
         cpu_reset_address        = None,
@@ -85,6 +86,8 @@ class SoCCore(LiteXSoC):
         csr_address_width        = 14,
         csr_paging               = 0x800,
         csr_ordering             = "big",
+        csr_pipelined            = False,
+        csr_interconnect_depth   = 0,
         # Interrupt parameters
         irq_n_irqs               = 32,
         # Identifier parameters
@@ -109,12 +112,15 @@ class SoCCore(LiteXSoC):
             bus_data_width       = bus_data_width,
             bus_address_width    = bus_address_width,
             bus_timeout          = bus_timeout,
+            bus_interconnect     = bus_interconnect,
             bus_reserved_regions = {},
 
             csr_data_width       = csr_data_width,
             csr_address_width    = csr_address_width,
             csr_paging           = csr_paging,
             csr_ordering         = csr_ordering,
+            csr_pipelined        = csr_pipelined,
+            csr_interconnect_depth = csr_interconnect_depth,
             csr_reserved_csrs    = self.csr_map,
 
             irq_n_irqs           = irq_n_irqs,
@@ -264,6 +270,9 @@ def soc_core_args(parser):
                         help="Bus address width (default=32)")
     parser.add_argument("--bus-timeout", default=1e6, type=float,
                         help="Bus timeout in cycles (default=1e6)")
+    parser.add_argument("--bus-interconnect", default="shared",
+                        help="select bus interconnect: {}, (default=shared)".format(
+                            ", ".join(SoCBusHandler.supported_interconnect)))
 
     # CPU parameters
     parser.add_argument("--cpu-type", default=None,
@@ -285,13 +294,17 @@ def soc_core_args(parser):
                         help="size/enable the integrated main RAM")
     # CSR parameters
     parser.add_argument("--csr-data-width", default=None, type=auto_int,
-                        help="CSR bus data-width (8 or 32, default=32)")
+                        help="CSR bus data-width (8, 32 or 64, default=32)")
     parser.add_argument("--csr-address-width", default=14, type=auto_int,
                         help="CSR bus address-width")
     parser.add_argument("--csr-paging", default=0x800, type=auto_int,
                         help="CSR bus paging")
     parser.add_argument("--csr-ordering", default="big",
                         help="CSR registers ordering (default=big)")
+    parser.add_argument("--csr-pipelined", action="store_true",
+                        help="Use zero-wait-state pipelined CSR bridge (Wishbone only)")
+    parser.add_argument("--csr-interconnect-depth", default=0, type=auto_int,
+                        help="CSR tree interconnect registered levels (0=flat, Wishbone only)")
 
     # Identifier parameters
     parser.add_argument("--ident", default=None, type=str,
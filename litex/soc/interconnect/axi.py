@@ -13,6 +13,7 @@ from migen.genlib.misc import split, displacer, chooser, WaitTimer
 
 from litex.soc.interconnect import stream
 from litex.build.generic_platform import *
+from litex.gen.common import WeightedRoundRobin
 
 from litex.soc.interconnect import csr_bus
 
@@ -1149,10 +1150,21 @@ class AXILiteArbiter(Module):
     Arbitrate between master interfaces and connect one to the target. New master will not be
     selected until all requests have been responded to. Arbitration for write and read channels is
     done separately.
+
+    When ``weights`` is provided (one integer per master), WeightedRoundRobin selectors are used and
+    each master gets up to ``weights[i]`` accepted requests per round while others are requesting.
     """
-    def __init__(self, masters, target):
-        self.submodules.rr_write = roundrobin.RoundRobin(len(masters), roundrobin.SP_CE)
-        self.submodules.rr_read = roundrobin.RoundRobin(len(masters), roundrobin.SP_CE)
+    def __init__(self, masters, target, weights=None):
+        if weights is None:
+            self.submodules.rr_write = roundrobin.RoundRobin(len(masters), roundrobin.SP_CE)
+            self.submodules.rr_read = roundrobin.RoundRobin(len(masters), roundrobin.SP_CE)
+        else:
+            self.submodules.rr_write = WeightedRoundRobin(len(masters), weights)
+            self.submodules.rr_read = WeightedRoundRobin(len(masters), weights)
+            self.comb += [
+                self.rr_write.consume.eq(target.aw.valid & target.aw.ready),
+                self.rr_read.consume.eq(target.ar.valid & target.ar.ready),
+            ]
 
         def get_sig(interface, channel, name):
             return getattr(getattr(interface, channel), name)
@@ -1282,10 +1294,10 @@ class AXILiteDecoder(Module):
 
 class AXILiteInterconnectShared(Module):
     """AXI Lite shared interconnect"""
-    def __init__(self, masters, slaves, register=False, timeout_cycles=1e6):
+    def __init__(self, masters, slaves, register=False, timeout_cycles=1e6, weights=None):
         # TODO: data width
         shared = AXILiteInterface()
-        self.submodules.arbiter = AXILiteArbiter(masters, shared)
+        self.submodules.arbiter = AXILiteArbiter(masters, shared, weights)
         self.submodules.decoder = AXILiteDecoder(shared, slaves)
         if timeout_cycles is not None:
             self.submodules.timeout = AXILiteTimeout(shared, timeout_cycles)
@@ -1295,7 +1307,8 @@ class AXILiteCrossbar(Module):
 
     MxN crossbar for M masters and N slaves.
     """
-    def __init__(self, masters, slaves, register=False, timeout_cycles=1e6):
+    def __init__(self, masters, slaves, register=False, timeout_cycles=1e6, weights=None):
+        masters = list(masters)
         matches, busses = zip(*slaves)
         access_m_s = [[AXILiteInterface() for j in slaves] for i in masters]  # a[master][slave]
         access_s_m = list(zip(*access_m_s))  # a[slave][master]
@@ -1304,5 +1317,10 @@ class AXILiteCrossbar(Module):
             slaves = list(zip(matches, slaves))
             self.submodules += AXILiteDecoder(master, slaves, register)
         # Arbitrate each access column onto its slave.
-        for masters, bus in zip(access_s_m, busses):
-            self.submodules += AXILiteArbiter(masters, bus)
+        for column, bus in zip(access_s_m, busses):
+            self.submodules += AXILiteArbiter(column, bus, weights)
+        # Protect each master against unmapped accesses/unresponsive slaves.
+        self.timeouts = []
+        if timeout_cycles is not None:
+            self.timeouts = [AXILiteTimeout(master, timeout_cycles) for master in masters]
+            self.submodules += self.timeouts
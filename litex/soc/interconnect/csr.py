@@ -266,7 +266,9 @@ class CSRStatus(_CompoundCSR):
     Status registers larger than the bus word width are automatically broken down into several
     ``CSR`` registers to span several addresses.
 
-    *Be careful, though:* the atomicity of reads is not guaranteed.
+    *Be careful, though:* the atomicity of reads is not guaranteed unless ``atomic_read`` is
+    enabled or the CSR bus is wide enough to serve the register in a single access (ex: 64-bit
+    counters with a 64-bit CSR bus).
 
     Parameters
     ----------
@@ -277,6 +279,12 @@ class CSRStatus(_CompoundCSR):
     reset : string
         Value of the register after reset.
 
+    atomic_read : bool
+        Provide a mechanism for atomic CPU reads. When enabled, reading the first CSR address
+        returns the live value and captures the whole register in a shadow buffer from which the
+        following CSR addresses are read. (CSR bridges present address 0 when idle, so this should
+        not be used on the first CSR of the CSR bank mapped at location 0).
+
     name : string
         Provide (or override the name) of the ``CSRStatus`` register.
 
@@ -286,7 +294,7 @@ class CSRStatus(_CompoundCSR):
         The value of the CSRStatus register.
     """
 
-    def __init__(self, size=1, reset=0, fields=[], name=None, description=None):
+    def __init__(self, size=1, reset=0, fields=[], atomic_read=False, name=None, description=None):
         if fields != []:
             self.fields = CSRFieldAggregate(fields, CSRAccess.ReadOnly)
             size  = self.fields.get_size()
@@ -294,6 +302,7 @@ class CSRStatus(_CompoundCSR):
         _CompoundCSR.__init__(self, size, name)
         self.description = description
         self.status      = Signal(self.size, reset=reset)
+        self.atomic_read = atomic_read
         self.we          = Signal()
         self.re          = Signal()
         for field in fields:
@@ -301,10 +310,17 @@ class CSRStatus(_CompoundCSR):
 
     def do_finalize(self, busword, ordering):
         nwords = (self.size + busword - 1)//busword
+        status = self.status
+        if nwords > 1 and self.atomic_read:
+            shadow = Signal(self.size, name=self.name + "_shadow")
         for i in reversed(range(nwords)) if ordering == "big" else range(nwords):
             nbits = min(self.size - i*busword, busword)
             sc    = CSR(nbits, self.name + str(i) if nwords > 1 else self.name)
-            self.comb += sc.w.eq(self.status[i*busword:i*busword+nbits])
+            self.comb += sc.w.eq(status[i*busword:i*busword+nbits])
+            # read: first CSR returns the live value and captures it, others read the capture.
+            if nwords > 1 and self.atomic_read and not self.simple_csrs:
+                self.sync += If(sc.we, shadow.eq(self.status))
+                status = shadow
             self.simple_csrs.append(sc)
         self.comb += self.we.eq(sc.we)
         self.comb += self.re.eq(sc.re)
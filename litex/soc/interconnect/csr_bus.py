@@ -14,6 +14,7 @@ The CSR-2 bus is a low-bandwidth, resource-sensitive bus designed for accessing
 the configuration and status registers of cores from software.
 """
 
+from math import ceil
 from functools import reduce
 from operator import or_
 
@@ -84,13 +85,80 @@ class InterconnectShared(Module):
             self.comb += masters[i].dat_r.eq(intermediate.dat_r)
         self.comb += intermediate.connect(*slaves)
 
+
+class InterconnectTree(Module):
+    """CSR tree interconnect
+
+    Connects a master to CSR banks/memories (``slaves``: CSRBank/SRAM modules created with
+    ``decode=False``) through a tree of ``depth`` registered levels instead of broadcasting the bus
+    to all slaves.
+
+    The one-hot slave select is decoded once at the root from the page address and propagated
+    down the tree along with the access, so slaves don't need their own address comparator and
+    each node only drives ``ceil(n_slaves**(1/(depth + 1)))`` children. Non selected sub-trees
+    keep their previous address and get no write, and read datas are ORed back up the tree. Each
+    level adds a register stage on both the request and read paths: ``latency`` is the
+    resulting read latency the CSR bridge has to wait for (see ``get_latency``).
+    """
+    def __init__(self, master, slaves, depth=1, paging=0x800, soc_bus_data_width=32):
+        self.depth   = depth
+        self.latency = self.get_latency(depth)
+        self.fanout  = fanout = max(2, ceil(len(slaves)**(1/(depth + 1))))
+        aligned_paging = paging//(soc_bus_data_width//8)
+
+        # # #
+
+        # One-hot slave select, decoded once.
+        sel = Signal(len(slaves))
+        page = master.adr[log2_int(aligned_paging):]
+        self.comb += [sel[i].eq(page == slave.address) for i, slave in enumerate(slaves)]
+
+        def build(level, bus, sel, slaves):
+            # Leaf: connect slaves to bus.
+            if level == 0:
+                self.comb += [slave.sel.eq(sel[i]) for i, slave in enumerate(slaves)]
+                self.comb += bus.connect(*[slave.bus for slave in slaves])
+                return
+            # Node: split slaves in groups and register access/read datas for each of them.
+            n = ceil(len(slaves)/fanout)
+            groups = [list(range(len(slaves)))[i:i + n] for i in range(0, len(slaves), n)]
+            dat_rs = []
+            for group in groups:
+                group_bus = Interface.like(bus)
+                group_sel = Signal(len(group))
+                selected  = Signal()
+                self.comb += selected.eq(reduce(or_, [sel[i] for i in group]))
+                self.sync += [
+                    group_sel.eq(Cat(*[sel[i] for i in group])),
+                    group_bus.we.eq(bus.we & selected),
+                    If(selected,
+                        group_bus.adr.eq(bus.adr),
+                        group_bus.dat_w.eq(bus.dat_w),
+                    )
+                ]
+                # Non selected slaves return 0, read datas can be directly ORed.
+                dat_r = Signal(len(bus.dat_r))
+                self.sync += dat_r.eq(group_bus.dat_r)
+                dat_rs.append(dat_r)
+                build(level - 1, group_bus, group_sel, [slaves[i] for i in group])
+            self.comb += bus.dat_r.eq(reduce(or_, dat_rs))
+
+        build(depth, master, sel, slaves)
+
+    @staticmethod
+    def get_latency(depth):
+        # CSRBank read latency + one register stage on request and read paths per level.
+        return 1 + 2*depth
+
 # CSR SRAM -----------------------------------------------------------------------------------------
 
 class SRAM(Module):
-    def __init__(self, mem_or_size, address, read_only=None, init=None, bus=None, paging=0x800, soc_bus_data_width=32):
+    def __init__(self, mem_or_size, address, read_only=None, init=None, bus=None, paging=0x800, soc_bus_data_width=32, decode=True):
         if bus is None:
             bus = Interface()
-        self.bus = bus
+        self.bus     = bus
+        self.address = address
+        self.sel     = Signal()
         aligned_paging = paging//(soc_bus_data_width//8)
         data_width = len(self.bus.dat_w)
         if isinstance(mem_or_size, Memory):
@@ -117,10 +185,12 @@ class SRAM(Module):
         port = mem.get_port(write_capable=not read_only)
         self.specials += mem, port
 
-        sel = Signal()
+        sel = self.sel
         sel_r = Signal()
         self.sync += sel_r.eq(sel)
-        self.comb += sel.eq(self.bus.adr[log2_int(aligned_paging):] == address)
+        # When decode is disabled, sel is driven by the interconnect (ex: InterconnectTree).
+        if decode:
+            self.comb += sel.eq(self.bus.adr[log2_int(aligned_paging):] == address)
 
         if word_bits:
             word_index    = Signal(word_bits, reset_less=True)
@@ -166,10 +236,12 @@ class SRAM(Module):
 # CSR Bank -----------------------------------------------------------------------------------------
 
 class CSRBank(csr.GenericBank):
-    def __init__(self, description, address=0, bus=None, paging=0x800, ordering="big", soc_bus_data_width=32):
+    def __init__(self, description, address=0, bus=None, paging=0x800, ordering="big", soc_bus_data_width=32, decode=True):
         if bus is None:
             bus = Interface()
-        self.bus = bus
+        self.bus     = bus
+        self.address = address
+        self.sel     = Signal()
         aligned_paging = paging//(soc_bus_data_width//8)
 
         # # #
@@ -180,8 +252,10 @@ class CSRBank(csr.GenericBank):
             ordering    = ordering,
         )
 
-        sel = Signal()
-        self.comb += sel.eq(self.bus.adr[log2_int(aligned_paging):] == address)
+        sel = self.sel
+        # When decode is disabled, sel is driven by the interconnect (ex: InterconnectTree).
+        if decode:
+            self.comb += sel.eq(self.bus.adr[log2_int(aligned_paging):] == address)
 
         for i, c in enumerate(self.simple_csrs):
             self.comb += [
@@ -208,12 +282,13 @@ class CSRBank(csr.GenericBank):
 # address_map is called exactly once for each object at each call to
 # scan(), so it can have side effects.
 class CSRBankArray(Module):
-    def __init__(self, source, address_map, *ifargs, paging=0x800, ordering="big", soc_bus_data_width=32, **ifkwargs):
+    def __init__(self, source, address_map, *ifargs, paging=0x800, ordering="big", soc_bus_data_width=32, decode=True, **ifkwargs):
         self.source             = source
         self.address_map        = address_map
         self.paging             = paging
         self.ordering           = ordering
         self.soc_bus_data_width = soc_bus_data_width
+        self.decode             = decode
         self.scan(ifargs, ifkwargs)
 
     def scan(self, ifargs, ifkwargs):
@@ -239,7 +314,8 @@ class CSRBankArray(Module):
                     mmap = SRAM(memory, mapaddr,
                         read_only = read_only,
                         bus       = sram_bus,
-                        paging    = self.paging)
+                        paging    = self.paging,
+                        decode    = self.decode)
                     self.submodules += mmap
                     csrs += mmap.get_csrs()
                     self.srams.append((name, memory, mapaddr, mmap))
@@ -255,7 +331,8 @@ class CSRBankArray(Module):
                     bus                = bank_bus,
                     paging             = self.paging,
                     ordering           = self.ordering,
-                    soc_bus_data_width = self.soc_bus_data_width)
+                    soc_bus_data_width = self.soc_bus_data_width,
+                    decode             = self.decode)
                 self.submodules += rmap
                 self.banks.append((name, csrs, mapaddr, rmap))
 
@@ -265,5 +342,8 @@ class CSRBankArray(Module):
     def get_mmaps(self):
         return [mmap for name, memory, mapaddr, mmap in self.srams]
 
+    def get_slaves(self):
+        return self.get_rmaps() + self.get_mmaps()
+
     def get_buses(self):
-        return [i.bus for i in self.get_rmaps() + self.get_mmaps()]
+        return [i.bus for i in self.get_slaves()]
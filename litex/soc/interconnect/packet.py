@@ -5,6 +5,9 @@
 # Copyright (c) 2019 Vamsi K Vytla <vkvytla@lbl.gov>
 # SPDX-License-Identifier: BSD-2-Clause
 
+from functools import reduce
+from operator import or_
+
 from migen import *
 from migen.genlib.roundrobin import *
 from migen.genlib.record import *
@@ -13,6 +16,7 @@ from migen.genlib.fsm import FSM, NextState
 from litex.gen import *
 
 from litex.soc.interconnect import stream
+from litex.soc.interconnect.csr import *
 
 # Status -------------------------------------------------------------------------------------------
 
@@ -58,6 +62,75 @@ class Arbiter(Module):
                 cases[i] = [master.connect(slave)]
             self.comb += Case(self.grant, cases)
 
+# Scheduler ----------------------------------------------------------------------------------------
+
+class Scheduler(Module, AutoCSR):
+    """Packet Scheduler
+
+    Arbitrates masters to slave, switching only at packet boundaries:
+
+    - ``priorities``: strict priority classes (higher value served first), only masters of the
+      highest requesting class are arbitrated.
+    - ``weights``: weighted round-robin inside a class, a master can send ``weights[i]`` packets
+      per arbitration round.
+
+    Beats sent by each master are counted in ``tokens`` (exposed as CSRs with ``with_csr``) to
+    monitor per-source bandwidth.
+    """
+    def __init__(self, masters, slave, weights=None, priorities=None, with_csr=False):
+        n = len(masters)
+        if priorities is None:
+            priorities = [0]*n
+        assert len(priorities) == n
+        self.grant  = Signal(max=max(2, n))
+        self.tokens = [Signal(32) for i in range(n)]
+
+        # # #
+
+        # Requests, masked by higher priority classes.
+        request = Signal(n)
+        for i, master in enumerate(masters):
+            higher = [masters[j].valid for j in range(n) if priorities[j] > priorities[i]]
+            self.comb += request[i].eq(master.valid & ~reduce(or_, higher, 0))
+
+        # Weighted round-robin, switching at packet boundaries.
+        self.submodules.wrr = wrr = WeightedRoundRobin(n, weights)
+        ongoing   = Signal()
+        granted   = Signal() # Granted master can start/continue a packet.
+        handshake = Signal()
+        self.comb += [
+            wrr.request.eq(request),
+            self.grant.eq(wrr.grant),
+            handshake.eq(slave.valid & slave.ready),
+            wrr.consume.eq(handshake & slave.last),
+            wrr.ce.eq(wrr.consume | ~granted),
+        ]
+        self.sync += [
+            If(handshake,
+                ongoing.eq(~slave.last)
+            )
+        ]
+
+        # Datapath.
+        cases = {}
+        for i, master in enumerate(masters):
+            cases[i] = [
+                granted.eq(ongoing | request[i]),
+                If(granted,
+                    master.connect(slave)
+                )
+            ]
+        self.comb += Case(self.grant, cases)
+
+        # Tokens.
+        for i, master in enumerate(masters):
+            self.sync += If(master.valid & master.ready, self.tokens[i].eq(self.tokens[i] + 1))
+            if with_csr:
+                tokens = CSRStatus(32, name="tokens{}".format(i),
+                    description="Beats sent by master {}.".format(i))
+                setattr(self, "_tokens{}".format(i), tokens)
+                self.comb += tokens.status.eq(self.tokens[i])
+
 # Dispatcher ---------------------------------------------------------------------------------------
 
 class Dispatcher(Module):
@@ -246,6 +319,9 @@ class Packetizer(Module):
             source.valid.eq(sink.valid | sink_d.last),
             source.last.eq(sink_d.last),
             If(fsm_from_idle,
+                # sink_d has been loaded during header send and is not part of the data.
+                source.valid.eq(sink.valid),
+                source.last.eq(0),
                 source.data[:max(header_leftover*8, 1)].eq(sr[min(header_offset_multiplier*data_width, len(sr)-1):])
             ).Else(
                 source.data[:max(header_leftover*8, 1)].eq(sink_d.data[min((bytes_per_clk-header_leftover)*8, data_width-1):])
@@ -239,6 +239,98 @@ class AsyncFIFO(_FIFOWrapper):
             layout     = layout,
             depth      = depth)
 
+# PacketFIFO ---------------------------------------------------------------------------------------
+
+class PacketFIFO(Module, AutoCSR):
+    """Packet FIFO
+
+    Packet-aware FIFO: datas are stored in a word FIFO (``depth``) and packets metadatas (error)
+    in a separate FIFO (``packets``) written on last word.
+
+    - store-and-forward mode (default): a packet is only presented on source once completely
+      received, so downstream consumers never stall mid-packet. With ``drop_on_error`` (requires an
+      ``error`` field), packets with error set on any of their words are discarded atomically:
+      they are drained from the FIFO without being presented on source. ``depth`` must be >= the
+      maximum packet length.
+    - cut-through mode: words are presented on source as soon as received (errors are forwarded).
+
+    ``level`` (words) and ``packets`` (complete packets) are also exposed as CSRs with ``with_csr``
+    (along with the number of ``dropped`` packets).
+    """
+    def __init__(self, layout, depth, packets=4, mode="store-and-forward", drop_on_error=False,
+        buffered=False, with_csr=False):
+        assert depth >= 2
+        assert mode in ["store-and-forward", "cut-through"]
+        self.sink   = sink   = Endpoint(layout)
+        self.source = source = Endpoint(layout)
+        self.level   = Signal(max=depth   + 1 + buffered) # Buffered FIFOs hold an extra entry.
+        self.packets = Signal(max=packets + 1 + buffered)
+        self.dropped = Signal(32)
+
+        # # #
+
+        has_error = hasattr(sink, "error")
+        assert not drop_on_error or (has_error and mode == "store-and-forward")
+
+        self.submodules.data_fifo = data_fifo = SyncFIFO(layout, depth, buffered)
+        self.submodules.meta_fifo = meta_fifo = SyncFIFO([("error", 1)], packets, buffered)
+        self.comb += self.level.eq(data_fifo.level)
+
+        # Write: data + metadata on last word.
+        error = Signal()
+        if has_error:
+            self.sync += If(sink.valid & sink.ready, error.eq(~sink.last & (error | (sink.error != 0))))
+        self.comb += [
+            sink.connect(data_fifo.sink, omit={"valid", "ready"}),
+            data_fifo.sink.valid.eq(sink.valid & (~sink.last | meta_fifo.sink.ready)),
+            meta_fifo.sink.valid.eq(sink.valid & sink.last & data_fifo.sink.ready),
+            sink.ready.eq(data_fifo.sink.ready & (~sink.last | meta_fifo.sink.ready)),
+        ]
+        if has_error:
+            self.comb += meta_fifo.sink.error.eq(error | (sink.error != 0))
+
+        # Read.
+        drop = Signal()
+        if mode == "store-and-forward":
+            if drop_on_error:
+                self.comb += drop.eq(meta_fifo.source.error)
+            self.comb += [
+                data_fifo.source.connect(source, omit={"valid", "ready"}),
+                source.valid.eq(data_fifo.source.valid & meta_fifo.source.valid & ~drop),
+                data_fifo.source.ready.eq(meta_fifo.source.valid & (source.ready | drop)),
+                meta_fifo.source.ready.eq(data_fifo.source.valid & data_fifo.source.ready & data_fifo.source.last),
+            ]
+        else:
+            self.comb += [
+                data_fifo.source.connect(source),
+                meta_fifo.source.ready.eq(source.valid & source.ready & source.last),
+            ]
+        self.sync += If(meta_fifo.source.valid & meta_fifo.source.ready & drop,
+            self.dropped.eq(self.dropped + 1)
+        )
+
+        # Complete packets count.
+        packet_in  = meta_fifo.sink.valid & meta_fifo.sink.ready
+        packet_out = meta_fifo.source.valid & meta_fifo.source.ready
+        self.sync += [
+            If(packet_in & ~packet_out,
+                self.packets.eq(self.packets + 1)
+            ).Elif(~packet_in & packet_out,
+                self.packets.eq(self.packets - 1)
+            )
+        ]
+
+        # CSRs.
+        if with_csr:
+            self._level   = CSRStatus(len(self.level),   description="FIFO level (words).")
+            self._packets = CSRStatus(len(self.packets), description="Complete packets in FIFO.")
+            self._dropped = CSRStatus(32,                description="Dropped packets count.")
+            self.comb += [
+                self._level.status.eq(self.level),
+                self._packets.status.eq(self.packets),
+                self._dropped.status.eq(self.dropped),
+            ]
+
 # ClockDomainCrossing ------------------------------------------------------------------------------
 
 class ClockDomainCrossing(Module):
@@ -295,10 +387,15 @@ class Demultiplexer(Module):
 
 # Converter ----------------------------------------------------------------------------------------
 
+def _get_last_be_layout(last_be_width):
+    return [("last_be", last_be_width)] if last_be_width else []
+
+
 class _UpConverter(Module):
-    def __init__(self, nbits_from, nbits_to, ratio, reverse):
-        self.sink   = sink   = Endpoint([("data", nbits_from)])
-        self.source = source = Endpoint([("data", nbits_to), ("valid_token_count", bits_for(ratio))])
+    def __init__(self, nbits_from, nbits_to, ratio, reverse, last_be_width=0):
+        self.sink   = sink   = Endpoint([("data", nbits_from)] + _get_last_be_layout(last_be_width))
+        self.source = source = Endpoint([("data", nbits_to), ("valid_token_count", bits_for(ratio))] +
+            _get_last_be_layout(last_be_width*ratio))
         self.latency = 1
 
         # # #
@@ -349,11 +446,20 @@ class _UpConverter(Module):
         # Valid token count
         self.sync += If(load_part, source.valid_token_count.eq(demux + 1))
 
+        # Last BE: last_be of the last part, moved to its position (others are 0).
+        if last_be_width:
+            cases = {}
+            for i in range(ratio):
+                n = ratio-i-1 if reverse else i
+                cases[i] = source.last_be.eq(Mux(sink.last, sink.last_be << n*last_be_width, 0))
+            self.sync += If(load_part, Case(demux, cases))
+
 
 class _DownConverter(Module):
-    def __init__(self, nbits_from, nbits_to, ratio, reverse):
-        self.sink   = sink   = Endpoint([("data", nbits_from)])
-        self.source = source = Endpoint([("data", nbits_to), ("valid_token_count", 1)])
+    def __init__(self, nbits_from, nbits_to, ratio, reverse, last_be_width=0):
+        self.sink   = sink   = Endpoint([("data", nbits_from)] + _get_last_be_layout(last_be_width))
+        self.source = source = Endpoint([("data", nbits_to), ("valid_token_count", 1)] +
+            _get_last_be_layout(last_be_width//ratio))
         self.latency = 0
 
         # # #
@@ -370,6 +476,23 @@ class _DownConverter(Module):
             source.last.eq(sink.last & last),
             sink.ready.eq(last & source.ready)
         ]
+
+        # Last BE: end the packet on the part containing the last byte (partial last word).
+        if last_be_width:
+            if last_be_width % ratio:
+                raise ValueError("last_be width must be a multiple of ratio")
+            last_be_width_to = last_be_width//ratio
+            cases = {}
+            for i in range(ratio):
+                n = ratio-i-1 if reverse else i
+                last_be = sink.last_be[n*last_be_width_to:(n+1)*last_be_width_to]
+                cases[i] = [
+                    source.last_be.eq(Mux(sink.last, last_be, 0)),
+                    If(sink.last & (last_be != 0),
+                        last.eq(1)
+                    )
+                ]
+            self.comb += Case(mux, cases)
         self.sync += \
             If(source.valid & source.ready,
                 If(last,
@@ -391,9 +514,10 @@ class _DownConverter(Module):
 
 
 class _IdentityConverter(Module):
-    def __init__(self, nbits_from, nbits_to, ratio, reverse):
-        self.sink   = sink   = Endpoint([("data", nbits_from)])
-        self.source = source = Endpoint([("data", nbits_to), ("valid_token_count", 1)])
+    def __init__(self, nbits_from, nbits_to, ratio, reverse, last_be_width=0):
+        self.sink   = sink   = Endpoint([("data", nbits_from)] + _get_last_be_layout(last_be_width))
+        self.source = source = Endpoint([("data", nbits_to), ("valid_token_count", 1)] +
+            _get_last_be_layout(last_be_width))
         self.latency = 0
 
         # # #
@@ -422,14 +546,29 @@ def _get_converter_ratio(nbits_from, nbits_to):
 
 
 class Converter(Module):
+    """Data width Converter
+
+    With ``with_last_be``, sink and source get a ``last_be`` field (one bit per byte, set on the
+    last valid byte of the last word of the packet): partial last words are compacted, down
+    conversion ends the packet on the word containing the last byte (no trailing garbage words)
+    and up conversion reports the position of the last byte in the output word.
+    """
     def __init__(self, nbits_from, nbits_to,
         reverse                  = False,
-        report_valid_token_count = False):
+        report_valid_token_count = False,
+        with_last_be             = False,
+        last_be_width            = None):
         self.cls, self.ratio = _get_converter_ratio(nbits_from, nbits_to)
 
         # # #
 
-        converter = self.cls(nbits_from, nbits_to, self.ratio, reverse)
+        if with_last_be and last_be_width is None:
+            if (nbits_from % 8) or (nbits_to % 8):
+                raise ValueError("last_be requires data widths multiple of 8")
+            last_be_width = nbits_from//8
+        last_be_width = last_be_width if with_last_be else 0
+
+        converter = self.cls(nbits_from, nbits_to, self.ratio, reverse, last_be_width)
         self.submodules += converter
         self.latency = converter.latency
 
@@ -437,7 +576,9 @@ class Converter(Module):
         if report_valid_token_count:
             self.source = converter.source
         else:
-            self.source = Endpoint([("data", nbits_to)])
+            source_layout = [(name, len(getattr(converter.source, name)))
+                for name in ["data", "last_be"] if hasattr(converter.source, name)]
+            self.source = Endpoint(source_layout)
             self.comb += converter.source.connect(self.source, omit=set(["valid_token_count"]))
 
 
@@ -451,8 +592,15 @@ class StrideConverter(Module):
         nbits_from = len(sink.payload.raw_bits())
         nbits_to   = len(source.payload.raw_bits())
 
-        converter = Converter(nbits_from, nbits_to, reverse)
+        # last_be in payloads: let the converter handle partial last words.
+        with_last_be = hasattr(sink, "last_be") and hasattr(source, "last_be")
+
+        converter = Converter(nbits_from, nbits_to, reverse,
+            with_last_be  = with_last_be,
+            last_be_width = len(sink.last_be) if with_last_be else None)
         self.submodules += converter
+        if with_last_be:
+            self.comb += converter.sink.last_be.eq(sink.last_be)
 
         # Cast sink to converter.sink (user fields --> raw bits)
         self.comb += [
@@ -488,8 +636,12 @@ class StrideConverter(Module):
                 for name, width in sink.description.payload_layout:
                     src = converter.source.data[i*nbits_from+j:i*nbits_from+j+width]
                     dst = getattr(source, name)[i*width:(i+1)*width]
-                    self.comb += dst.eq(src)
+                    # last_be of parts not loaded in a partial last word is not valid.
+                    if not (with_last_be and name == "last_be"):
+                        self.comb += dst.eq(src)
                     j += width
+            if with_last_be:
+                self.comb += source.last_be.eq(converter.source.last_be)
         else:
             self.comb += source.payload.raw_bits().eq(converter.source.data)
 
@@ -568,6 +720,125 @@ class Gearbox(Module):
         else:
             self.comb += source.data.eq(o_data[::-1])
 
+class RAMGearbox(Module):
+    """Circular buffer based Gearbox
+
+    Same behaviour as Gearbox but datas are stored in a circular buffer of input words instead of
+    a lcm(i_dw, o_dw) bits shift register, so ratios like 66:64 or 10:32 don't require large
+    registers: input words are written to ``K`` banks of ``depth`` words (distributed RAM) and
+    output words are selected from a window of ``K`` consecutive input words at one of the
+    i_dw/gcd(i_dw, o_dw) possible bit offsets.
+
+    Power-of-two ratios are bypassed to a Converter (no buffer).
+
+    Storage is ``buffer_bits`` (K*depth*i_dw) bits vs lcm(i_dw, o_dw) for Gearbox (ex for 66:64:
+    528 bits in RAM vs 2112 bits in registers).
+    """
+    def __init__(self, i_dw, o_dw, msb_first=True, depth=4):
+        assert depth >= 2 and (depth & (depth - 1)) == 0
+        self.sink   = sink   = Endpoint([("data", i_dw)])
+        self.source = source = Endpoint([("data", o_dw)])
+
+        # # #
+
+        # Power-of-two ratios bypass.
+        ratio = max(i_dw, o_dw)//min(i_dw, o_dw)
+        if (max(i_dw, o_dw) % min(i_dw, o_dw) == 0) and ((ratio & (ratio - 1)) == 0):
+            self.buffer_bits = 0
+            self.submodules.converter = converter = Converter(i_dw, o_dw, reverse=msb_first)
+            self.comb += [
+                sink.connect(converter.sink, omit={"first", "last"}),
+                converter.source.connect(source, omit={"first", "last"}),
+            ]
+            return
+
+        # Parameters.
+        g = math.gcd(i_dw, o_dw)
+        K = math.ceil((i_dw - g + o_dw)/i_dw) # Input words covered by an output word.
+        capacity = K*depth*i_dw
+        self.buffer_bits = capacity
+
+        # Input/Output datas, buffered LSB first.
+        i_data = Signal(i_dw)
+        o_data = Signal(o_dw)
+        self.comb += i_data.eq(sink.data[::-1] if msb_first else sink.data)
+        self.comb += source.data.eq(o_data[::-1] if msb_first else o_data)
+
+        # Control path.
+        level   = Signal(max=capacity + 1)
+        i_inc   = Signal()
+        o_inc   = Signal()
+        self.comb += [
+            sink.ready.eq(level <= (capacity - i_dw)),
+            source.valid.eq(level >= o_dw),
+            i_inc.eq(sink.valid & sink.ready),
+            o_inc.eq(source.valid & source.ready),
+        ]
+        self.sync += [
+            If(i_inc & ~o_inc, level.eq(level + i_dw)),
+            If(~i_inc & o_inc, level.eq(level - o_dw)),
+            If(i_inc & o_inc, level.eq(level + i_dw - o_dw)),
+        ]
+
+        # Circular buffer: K banks of depth words.
+        wr_bank = Signal(max=max(K, 2))
+        wr_addr = Signal(max=max(depth, 2))
+        rd_bank = Signal(max=max(K, 2))
+        rd_addr = Signal(max=max(depth, 2))
+        rd_bit  = Signal(max=i_dw)
+        banks   = []
+        for b in range(K):
+            mem = Memory(i_dw, depth)
+            wr_port = mem.get_port(write_capable=True)
+            rd_port = mem.get_port(async_read=True)
+            self.specials += mem, wr_port, rd_port
+            self.comb += [
+                wr_port.adr.eq(wr_addr),
+                wr_port.dat_w.eq(i_data),
+                wr_port.we.eq(i_inc & (wr_bank == b)),
+                # Words of the window before rd_bank are on the next address.
+                If(b < rd_bank,
+                    rd_port.adr.eq(rd_addr + 1)
+                ).Else(
+                    rd_port.adr.eq(rd_addr)
+                )
+            ]
+            banks.append(rd_port.dat_r)
+        self.sync += If(i_inc,
+            If(wr_bank == (K - 1),
+                wr_bank.eq(0),
+                wr_addr.eq(wr_addr + 1)
+            ).Else(
+                wr_bank.eq(wr_bank + 1)
+            )
+        )
+
+        # Output window/selection.
+        window = Signal(K*i_dw)
+        self.comb += Case(rd_bank, {r: window.eq(Cat(*[banks[(r + j)%K] for j in range(K)]))
+            for r in range(K)})
+        rd_adv  = Signal(max=K + 1)
+        rd_next = Signal(max=i_dw)
+        o_cases = {}
+        for offset in range(0, i_dw, g):
+            o_cases[offset] = [
+                o_data.eq(window[offset:offset + o_dw]),
+                rd_adv.eq((offset + o_dw)//i_dw),
+                rd_next.eq((offset + o_dw)%i_dw),
+            ]
+        self.comb += Case(rd_bit, o_cases)
+        rd_bank_next = Signal(max=2*K + 1)
+        self.comb += rd_bank_next.eq(rd_bank + rd_adv)
+        self.sync += If(o_inc,
+            rd_bit.eq(rd_next),
+            If(rd_bank_next >= K,
+                rd_bank.eq(rd_bank_next - K),
+                rd_addr.eq(rd_addr + 1)
+            ).Else(
+                rd_bank.eq(rd_bank_next)
+            )
+        )
+
 # Shifter ------------------------------------------------------------------------------------------
 
 class Shifter(PipelinedActor):
@@ -714,6 +985,23 @@ class PipeReady(Module):
             )
         ]
 
+class SkidBuffer(Module):
+    """Pipe valid/payload and ready to cut timing paths without throughput loss (1 cycle latency)"""
+    def __init__(self, layout):
+        self.sink   = Endpoint(layout)
+        self.source = Endpoint(layout)
+        self.latency = 1
+
+        # # #
+
+        self.submodules.pipe_ready = pipe_ready = PipeReady(layout)
+        self.submodules.pipe_valid = pipe_valid = PipeValid(layout)
+        self.comb += [
+            self.sink.connect(pipe_ready.sink),
+            pipe_ready.source.connect(pipe_valid.sink),
+            pipe_valid.source.connect(self.source),
+        ]
+
 # Buffer -------------------------------------------------------------------------------------------
 
 class Buffer(PipeValid): pass # FIXME: Replace Buffer with PipeValid in codebase?
@@ -837,9 +1125,16 @@ class Pack(Module):
 # Pipeline -----------------------------------------------------------------------------------------
 
 class Pipeline(Module):
-    def __init__(self, *modules):
+    """Connect modules/endpoints in a pipeline
+
+    SkidBuffers can be inserted between stages for timing closure: every ``skid_every`` stages
+    and/or after modules annotated with ``timing_critical = True``. The number of inserted
+    SkidBuffers (= added latency in cycles) is reported in ``added_latency``.
+    """
+    def __init__(self, *modules, skid_every=None):
         n = len(modules)
         m = modules[0]
+        self.skid_buffers  = []
         # expose sink of first module
         # if available
         if hasattr(m, "sink"):
@@ -855,8 +1150,18 @@ class Pipeline(Module):
             else:
                 sink = m_n.sink
             if m is not m_n:
+                skid = getattr(m, "timing_critical", False) and not isinstance(m, Endpoint)
+                if skid_every is not None:
+                    skid |= (i % skid_every) == 0
+                if skid:
+                    skid_buffer = SkidBuffer(source.description)
+                    self.submodules += skid_buffer
+                    self.skid_buffers.append(skid_buffer)
+                    self.comb += source.connect(skid_buffer.sink)
+                    source = skid_buffer.source
                 self.comb += source.connect(sink)
             m = m_n
+        self.added_latency = len(self.skid_buffers)
         # expose source of last module
         # if available
         if hasattr(m, "source"):
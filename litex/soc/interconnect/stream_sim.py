@@ -4,9 +4,13 @@
 # Copyright (c) 2015-2018 Florent Kermarrec <florent@enjoy-digital.fr>
 # SPDX-License-Identifier: BSD-2-Clause
 
+import csv
+import json
 import random
 import math
+from array import array
 from copy import deepcopy
+from collections import deque, Counter
 
 from migen import *
 
@@ -77,6 +81,34 @@ def check(p1, p2):
         return shift, length, errors
 
 
+def comp_fast(p1, p2):
+    """Bulk equivalent of comp: compare the common part of p1/p2."""
+    length = min(len(p1), len(p2))
+    p1, p2 = p1[:length], p2[:length]
+    if hasattr(p1, "__array__") or hasattr(p2, "__array__"):
+        import numpy as np
+        return bool(np.array_equal(p1, p2))
+    if type(p1) == type(p2) and p1 == p2:
+        return True
+    return all(x == y for x, y in zip(p1, p2))
+
+
+def check_fast(p1, p2):
+    """Bulk equivalent of check: no copy of the packets, returns (shift, length, errors)."""
+    if isinstance(p1, int):
+        return 0, 1, int(p1 != p2)
+    if len(p1) >= len(p2):
+        ref, res = p1, p2
+    else:
+        ref, res = p2, p1
+    shift = 0
+    while (ref[0] != res[shift]) and (len(res) - shift > 1):
+        shift += 1
+    length = min(len(ref), len(res) - shift)
+    errors = sum(x != y for x, y in zip(ref[:length], res[shift:shift + length]))
+    return shift, length, errors
+
+
 def randn(max_n):
     return random.randint(0, max_n-1)
 
@@ -166,6 +198,216 @@ class PacketLogger(Module):
             yield
 
 
+class StreamCounters:
+    """Throughput counters of the buffered streamer/logger."""
+    def __init__(self):
+        self.n_words     = 0
+        self.n_packets   = 0
+        self.cycles      = 0
+        self.first_cycle = None
+        self.last_cycle  = None
+
+    def count_word(self):
+        if self.first_cycle is None:
+            self.first_cycle = self.cycles
+        self.last_cycle = self.cycles
+        self.n_words += 1
+
+    def throughput(self):
+        """Words per cycle between first and last transferred words."""
+        if self.first_cycle is None:
+            return 0.0
+        return self.n_words/(self.last_cycle - self.first_cycle + 1)
+
+
+class BufferedPacket:
+    def __init__(self, datas):
+        self.datas = datas
+        self.index = 0
+        self.done  = (len(datas) == 0)
+
+
+class BufferedPacketStreamer(Module, StreamCounters):
+    """Packet streamer for high-volume testbenches
+
+    Packets are queued in a deque without copy: datas can be any sequence of ints (list, bytes,
+    array, memoryview, NumPy array...) and must not be modified until sent (packet.done). Words
+    are streamed at one per cycle, packets back to back.
+    """
+    def __init__(self, description, last_be=None):
+        StreamCounters.__init__(self)
+        self.source  = stream.Endpoint(description)
+        self.last_be = last_be
+
+        # # #
+
+        self.packets = deque()
+
+    def send(self, datas):
+        packet = BufferedPacket(datas)
+        if not packet.done:
+            self.packets.append(packet)
+        return packet
+
+    def send_blocking(self, datas):
+        packet = self.send(datas)
+        while not packet.done:
+            yield
+
+    @passive
+    def generator(self):
+        packet = None
+        while True:
+            if packet is not None and (yield self.source.ready):
+                self.count_word()
+                packet.index += 1
+                if packet.index == len(packet.datas):
+                    packet.done = True
+                    self.n_packets += 1
+                    packet = None
+            if packet is None and len(self.packets):
+                packet = self.packets.popleft()
+            if packet is not None:
+                last = (packet.index == len(packet.datas) - 1)
+                yield self.source.valid.eq(1)
+                yield self.source.data.eq(int(packet.datas[packet.index]))
+                yield self.source.last.eq(last)
+                if self.last_be is not None:
+                    yield self.source.last_be.eq(self.last_be if last else 0)
+            else:
+                yield self.source.valid.eq(0)
+            self.cycles += 1
+            yield
+
+
+class BufferedPacketLogger(Module, StreamCounters):
+    """Packet logger for high-volume testbenches
+
+    Received packets are stored as compact arrays (or lists for data widths > 64-bit) in the
+    ``packets`` deque.
+    """
+    def __init__(self, description):
+        StreamCounters.__init__(self)
+        self.sink = stream.Endpoint(description)
+
+        # # #
+
+        self.packets = deque()
+        data_width   = len(self.sink.data)
+        self.new_packet = list
+        for typecode in ["B", "H", "I", "L", "Q"]:
+            if data_width <= 8*array(typecode).itemsize:
+                self.new_packet = lambda typecode=typecode: array(typecode)
+                break
+
+    def receive(self):
+        while not len(self.packets):
+            yield
+        return self.packets.popleft()
+
+    @passive
+    def generator(self):
+        packet = self.new_packet()
+        yield self.sink.ready.eq(1)
+        while True:
+            if (yield self.sink.valid):
+                self.count_word()
+                packet.append((yield self.sink.data))
+                if (yield self.sink.last):
+                    self.packets.append(packet)
+                    self.n_packets += 1
+                    packet = self.new_packet()
+            self.cycles += 1
+            yield
+
+
+class StreamProbe:
+    """Simulation probe of a stream.Endpoint
+
+    Records valid/ready/last on each cycle (its generator has to be passed to run_simulation) and
+    reports utilization (transfers/cycles), backpressure (valid & ~ready cycles/valid cycles),
+    bubbles (~valid cycles inside packets) and packet start/end cycles. Packet latencies between
+    two probes are given by ``get_latencies``. Results can be exported to CSV (per cycle) or JSON
+    (statistics).
+    """
+    VALID = 0b001
+    READY = 0b010
+    LAST  = 0b100
+
+    def __init__(self, endpoint, name="probe"):
+        self.endpoint = endpoint
+        self.name     = name
+        self.samples  = array("B")
+        self.starts   = [] # Cycles of first transfer of packets.
+        self.ends     = [] # Cycles of last transfer of packets.
+        self.bubbles  = 0
+
+    @passive
+    def generator(self):
+        in_packet = False
+        while True:
+            valid = (yield self.endpoint.valid)
+            ready = (yield self.endpoint.ready)
+            last  = (yield self.endpoint.last)
+            cycle = len(self.samples)
+            self.samples.append(self.VALID*valid | self.READY*ready | self.LAST*last)
+            if valid and ready:
+                if not in_packet:
+                    self.starts.append(cycle)
+                    in_packet = True
+                if last:
+                    self.ends.append(cycle)
+                    in_packet = False
+            elif in_packet and not valid:
+                self.bubbles += 1
+            yield
+
+    def count(self, mask):
+        return sum((sample & mask) == mask for sample in self.samples)
+
+    def get_stats(self):
+        cycles    = len(self.samples)
+        valids    = self.count(self.VALID)
+        transfers = self.count(self.VALID | self.READY)
+        return {
+            "name"         : self.name,
+            "cycles"       : cycles,
+            "transfers"    : transfers,
+            "packets"      : len(self.ends),
+            "utilization"  : transfers/cycles if cycles else 0.0,
+            "backpressure" : (valids - transfers)/valids if valids else 0.0,
+            "bubbles"      : self.bubbles,
+        }
+
+    def get_latencies(self, probe, edge="start"):
+        """Latencies (in cycles) of the packets between this probe and a downstream probe."""
+        src, dst = {
+            "start": (self.starts, probe.starts),
+            "end":   (self.ends,   probe.ends),
+        }[edge]
+        return [d - s for s, d in zip(src, dst)]
+
+    def get_latency_histogram(self, probe, edge="start"):
+        return dict(sorted(Counter(self.get_latencies(probe, edge)).items()))
+
+    def to_csv(self, filename):
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["cycle", "valid", "ready", "last"])
+            for cycle, sample in enumerate(self.samples):
+                writer.writerow([cycle,
+                    int(bool(sample & self.VALID)),
+                    int(bool(sample & self.READY)),
+                    int(bool(sample & self.LAST))])
+
+    def to_json(self, filename, probes=[]):
+        """Export statistics, with latency histograms to the downstream probes."""
+        stats = self.get_stats()
+        stats["latencies"] = {probe.name: self.get_latency_histogram(probe) for probe in probes}
+        with open(filename, "w") as f:
+            json.dump(stats, f, indent=4)
+
+
 class Randomizer(Module):
     def __init__(self, description, level=0):
         self.level = level
@@ -17,6 +17,7 @@ from migen.genlib.record import *
 from migen.genlib.misc import split, displacer, chooser, WaitTimer
 
 from litex.build.generic_platform import *
+from litex.gen.common import WeightedRoundRobin
 
 from litex.soc.interconnect import csr, csr_bus
 
@@ -130,8 +131,21 @@ class InterconnectPointToPoint(Module):
 
 
 class Arbiter(Module):
-    def __init__(self, masters, target):
-        self.submodules.rr = roundrobin.RoundRobin(len(masters))
+    """Arbiter
+
+    Round-robin arbitration of masters onto target. When ``weights`` is provided (one integer per
+    master), a WeightedRoundRobin is used: each master gets up to ``weights[i]`` accesses (classic
+    cycles or bursts, counted on ack/err) per round while other masters are requesting. As without
+    weights, the grant only changes when the granted master drops cyc, so locked sequences (e.g.
+    read-modify-write with cyc held) are never interrupted: masters keeping cyc asserted between
+    accesses are not preempted and do not get their share limited. A master dropping cyc with
+    credits left keeps the grant for one more cycle to re-request it.
+    """
+    def __init__(self, masters, target, weights=None):
+        if weights is None:
+            self.submodules.rr = roundrobin.RoundRobin(len(masters))
+        else:
+            self.submodules.rr = WeightedRoundRobin(len(masters), weights)
 
         # mux master->slave signals
         for name, size, direction in _layout:
@@ -154,6 +168,18 @@ class Arbiter(Module):
         reqs = [m.cyc for m in masters]
         self.comb += self.rr.request.eq(Cat(*reqs))
 
+        # count accesses at the end of classic cycles/bursts, re-arbitrate on withdraw only
+        # (delayed by one cycle when the granted master has credits left)
+        if weights is not None:
+            burst    = (target.cti == 0b001) | (target.cti == 0b010)
+            withdraw = ~Array(reqs)[self.rr.grant]
+            parked   = Signal()
+            self.sync += parked.eq(withdraw & ~self.rr.ce)
+            self.comb += [
+                self.rr.consume.eq(target.cyc & target.stb & (target.ack | target.err) & ~burst),
+                self.rr.ce.eq(withdraw & (self.rr.exhausted | parked)),
+            ]
+
 
 class Decoder(Module):
     # slaves is a list of pairs:
@@ -197,25 +223,37 @@ class Decoder(Module):
 
 
 class InterconnectShared(Module):
-    def __init__(self, masters, slaves, register=False, timeout_cycles=1e6):
-        shared = Interface()
-        self.submodules.arbiter = Arbiter(masters, shared)
+    def __init__(self, masters, slaves, register=False, timeout_cycles=1e6, weights=None):
+        shared = Interface(data_width=len(next(iter(masters)).dat_w))
+        self.submodules.arbiter = Arbiter(masters, shared, weights)
         self.submodules.decoder = Decoder(shared, slaves, register)
         if timeout_cycles is not None:
             self.submodules.timeout = Timeout(shared, timeout_cycles)
 
 
 class Crossbar(Module):
-    def __init__(self, masters, slaves, register=False):
+    """Crossbar
+
+    MxN crossbar for M masters and N slaves: each master has its own decoder and each slave its
+    own arbiter, so masters accessing different slaves are served concurrently.
+    """
+    def __init__(self, masters, slaves, register=False, timeout_cycles=1e6, weights=None):
+        masters = list(masters)
+        data_width = len(masters[0].dat_w)
         matches, busses = zip(*slaves)
-        access = [[Interface() for j in slaves] for i in masters]
+        access = [[Interface(data_width=data_width) for j in slaves] for i in masters]
         # decode each master into its access row
         for row, master in zip(access, masters):
             row = list(zip(matches, row))
             self.submodules += Decoder(master, row, register)
         # arbitrate each access column onto its slave
         for column, bus in zip(zip(*access), busses):
-            self.submodules += Arbiter(column, bus)
+            self.submodules += Arbiter(column, bus, weights)
+        # protect each master against unmapped accesses/unresponsive slaves
+        self.timeouts = []
+        if timeout_cycles is not None:
+            self.timeouts = [Timeout(master, timeout_cycles) for master in masters]
+            self.submodules += self.timeouts
 
 # Wishbone Data Width Converter --------------------------------------------------------------------
 
@@ -353,23 +391,32 @@ class SRAM(Module):
         if not read_only:
             self.comb += [port.we[i].eq(self.bus.cyc & self.bus.stb & self.bus.we & self.bus.sel[i])
                 for i in range(bus_data_width//8)]
+        # incrementing bursts: next address is presented to the memory while acking a read, so
+        # consecutive beats are acked on each cycle.
+        ack   = Signal()
+        burst = Signal()
+        self.comb += burst.eq((self.bus.cti == 0b010) & (self.bus.bte == 0b00))
         # address and data
         self.comb += [
             port.adr.eq(self.bus.adr[:len(port.adr)]),
+            If(self.bus.ack & burst & ~self.bus.we,
+                port.adr.eq(self.bus.adr[:len(port.adr)] + 1)
+            ),
             self.bus.dat_r.eq(port.dat_r)
         ]
         if not read_only:
             self.comb += port.dat_w.eq(self.bus.dat_w),
-        # generate ack
+        # generate ack (qualified with stb: no ack on burst wait states)
         self.sync += [
-            self.bus.ack.eq(0),
-            If(self.bus.cyc & self.bus.stb & ~self.bus.ack, self.bus.ack.eq(1))
+            ack.eq(0),
+            If(self.bus.cyc & self.bus.stb & (~ack | burst), ack.eq(1))
         ]
+        self.comb += self.bus.ack.eq(ack & self.bus.stb)
 
 # Wishbone To CSR ----------------------------------------------------------------------------------
 
 class Wishbone2CSR(Module):
-    def __init__(self, bus_wishbone=None, bus_csr=None, register=True):
+    def __init__(self, bus_wishbone=None, bus_csr=None, register=True, latency=1):
         self.csr = bus_csr
         if self.csr is None:
             # If no CSR bus provided, create it with default parameters.
@@ -381,6 +428,12 @@ class Wishbone2CSR(Module):
 
         # # #
 
+        # Wait for CSR read datas when CSR interconnect adds latency (ex: csr_bus.InterconnectTree).
+        wait = Signal(max=max(latency, 2))
+        wait_next = NextState("ACK")
+        if latency > 1:
+            wait_next = [NextValue(wait, latency - 2), NextState("WAIT")]
+
         if register:
             fsm = FSM(reset_state="IDLE")
             self.submodules += fsm
@@ -395,7 +448,7 @@ class Wishbone2CSR(Module):
             fsm.act("WRITE-READ",
                 NextValue(self.csr.adr, 0),
                 NextValue(self.csr.we, 0),
-                NextState("ACK")
+                wait_next
             )
             fsm.act("ACK",
                 self.wishbone.ack.eq(1),
@@ -410,7 +463,7 @@ class Wishbone2CSR(Module):
                 If(self.wishbone.cyc & self.wishbone.stb,
                     self.csr.adr.eq(self.wishbone.adr),
                     self.csr.we.eq(self.wishbone.we & (self.wishbone.sel != 0)),
-                    NextState("ACK")
+                    wait_next
                 )
             )
             fsm.act("ACK",
@@ -418,6 +471,90 @@ class Wishbone2CSR(Module):
                 self.wishbone.dat_r.eq(self.csr.dat_r),
                 NextState("WRITE-READ")
             )
+        if latency > 1:
+            fsm.act("WAIT",
+                NextValue(wait, wait - 1),
+                If(wait == 0,
+                    NextState("ACK")
+                )
+            )
+
+
+class Wishbone2CSRPipelined(Module):
+    """Wishbone2CSRPipelined
+
+    Zero-wait-state Wishbone to CSR bridge: writes are acked in the cycle they are presented and
+    reads one cycle later (CSRBank read latency), without intermediate FSM states.
+
+    Incrementing bursts (cti=0b010, bte=0b00) are supported: the next address is presented to the
+    CSR bus while the current beat is acked, sustaining one beat per cycle (ex: to read a whole
+    multi-word CSR in a single burst). No speculative CSR read is ever done, so CSRs with read
+    side-effects are safe.
+
+    When the CSR interconnect adds read latency (ex: csr_bus.InterconnectTree), ``latency`` must be
+    set accordingly: reads are then acked ``latency`` cycles after the address is presented.
+    """
+    def __init__(self, bus_wishbone=None, bus_csr=None, latency=1):
+        self.csr = bus_csr
+        if self.csr is None:
+            # If no CSR bus provided, create it with default parameters.
+            self.csr = csr_bus.Interface()
+        self.wishbone = bus_wishbone
+        if self.wishbone is None:
+            # If no Wishbone bus provided, create it with default parameters.
+            self.wishbone = Interface()
+
+        # # #
+
+        access   = Signal()
+        burst    = Signal()
+        rd_valid = Signal() # CSR read data available for current beat.
+        rd_wait  = Signal() # CSR read issued for current beat, waiting for data.
+        rd_count = Signal(max=max(latency, 2))
+        self.comb += [
+            access.eq(self.wishbone.cyc & self.wishbone.stb),
+            burst.eq((self.wishbone.cti == 0b010) & (self.wishbone.bte == 0b00)),
+            self.csr.dat_w.eq(self.wishbone.dat_w),
+            self.wishbone.dat_r.eq(self.csr.dat_r),
+            If(access,
+                # Write: posted to the CSR bus and acked in the same cycle.
+                If(self.wishbone.we,
+                    self.csr.adr.eq(self.wishbone.adr),
+                    self.csr.we.eq(self.wishbone.sel != 0),
+                    self.wishbone.ack.eq(1)
+                # Read data available: ack and present next burst address.
+                ).Elif(rd_valid,
+                    self.wishbone.ack.eq(1),
+                    If(burst,
+                        self.csr.adr.eq(self.wishbone.adr + 1)
+                    )
+                # Read: present address to the CSR bus.
+                ).Elif(~rd_wait,
+                    self.csr.adr.eq(self.wishbone.adr)
+                )
+            )
+        ]
+        if latency == 1:
+            self.sync += rd_valid.eq(access & ~self.wishbone.we & (~rd_valid | burst))
+        else:
+            self.sync += [
+                rd_valid.eq(0),
+                If(access & ~self.wishbone.we,
+                    # Read issued (new access or next burst beat): wait for CSR read datas.
+                    If((~rd_valid & ~rd_wait) | (rd_valid & burst),
+                        rd_wait.eq(1),
+                        rd_count.eq(latency - 2)
+                    ).Elif(rd_wait,
+                        rd_count.eq(rd_count - 1),
+                        If(rd_count == 0,
+                            rd_wait.eq(0),
+                            rd_valid.eq(1)
+                        )
+                    )
+                ).Else(
+                    rd_wait.eq(0)
+                )
+            ]
 
 # Wishbone Cache -----------------------------------------------------------------------------------
 
@@ -25,17 +25,24 @@
 #endif
 
 /* CSR subregisters (a.k.a. "simple CSRs") are embedded inside uint32_t
- * aligned locations: */
+ * aligned locations (uint64_t with 64-bit CSR alignment, where registers up
+ * to 64-bit are accessed in a single bus access): */
+#if defined(CONFIG_CSR_ALIGNMENT) && (CONFIG_CSR_ALIGNMENT == 64)
+typedef uint64_t csr_word_t;
+#else
+typedef uint32_t csr_word_t;
+#endif
 #define MMPTR(a) (*((volatile uint32_t *)(a)))
+#define CSR_MMPTR(a) (*((volatile csr_word_t *)(a)))
 
-static inline void csr_write_simple(unsigned long v, unsigned long a)
+static inline void csr_write_simple(csr_word_t v, unsigned long a)
 {
-	MMPTR(a) = v;
+	CSR_MMPTR(a) = v;
 }
 
-static inline unsigned long csr_read_simple(unsigned long a)
+static inline csr_word_t csr_read_simple(unsigned long a)
 {
-	return MMPTR(a);
+	return CSR_MMPTR(a);
 }
 
 #endif /* ! __ASSEMBLER__ */
@@ -44,7 +51,11 @@ static inline unsigned long csr_read_simple(unsigned long a)
 
 /* CSR data width (subreg. width) in bytes, for direct comparson to sizeof() */
 #define CSR_DW_BYTES     (CONFIG_CSR_DATA_WIDTH/8)
+#if defined(CONFIG_CSR_ALIGNMENT) && (CONFIG_CSR_ALIGNMENT == 64)
+#define CSR_OFFSET_BYTES 8
+#else
 #define CSR_OFFSET_BYTES 4
+#endif
 
 #ifndef __ASSEMBLER__
 
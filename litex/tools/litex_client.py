@@ -8,128 +8,480 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 import os
-import argparse
+import sys
+import time
+import array
+import struct
+import atexit
 import socket
+import argparse
+import threading
 
 from litex.tools.remote.etherbone import EtherbonePacket, EtherboneRecord
 from litex.tools.remote.etherbone import EtherboneReads, EtherboneWrites
 from litex.tools.remote.etherbone import EtherboneIPC
 from litex.tools.remote.csr_builder import CSRBuilder
 
+# Remote Connection --------------------------------------------------------------------------------
+
+class RemoteConnection:
+    """TCP connection to a litex_server, shared by the RemoteClients of a process (see pool)."""
+    def __init__(self, host, port, timeout=5.0, tcp_nodelay=True):
+        self.host        = host
+        self.port        = port
+        self.timeout     = timeout
+        self.tcp_nodelay = tcp_nodelay
+        self.socket      = None
+        self.users       = 0
+        self.reconnects  = 0
+        # Serializes the accesses of the clients: responses are always fully received before
+        # the lock is released, so clients never see each other's responses.
+        self.lock        = threading.RLock()
+
+    def connect(self):
+        if self.socket is not None:
+            return
+        self.socket = socket.create_connection((self.host, self.port), self.timeout)
+        self.socket.settimeout(self.timeout)
+        if self.tcp_nodelay:
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def disconnect(self):
+        if self.socket is None:
+            return
+        self.socket.close()
+        self.socket = None
+
+
+class RemoteConnectionPool:
+    """Per process pool of connections (one per host/port), kept open until close_all."""
+    def __init__(self):
+        self.connections = {}
+        self.lock        = threading.Lock()
+
+    def acquire(self, host, port, **kwargs):
+        with self.lock:
+            connection = self.connections.get((host, port), None)
+            if connection is None:
+                connection = RemoteConnection(host, port, **kwargs)
+                self.connections[(host, port)] = connection
+            connection.users += 1
+            return connection
+
+    def release(self, connection):
+        with self.lock:
+            connection.users -= 1
+
+    def close_all(self):
+        with self.lock:
+            for connection in self.connections.values():
+                with connection.lock:
+                    connection.disconnect()
+            self.connections.clear()
+
+pool = RemoteConnectionPool()
+atexit.register(pool.close_all)
+
 # Remote Client ------------------------------------------------------------------------------------
 
 class RemoteClient(EtherboneIPC, CSRBuilder):
-    def __init__(self, host="localhost", port=1234, base_address=0, csr_csv=None, csr_data_width=None, debug=False):
+    """
+    Etherbone client of litex_server.
+
+    With pooled=True, the clients of a process with the same host/port share a single persistent
+    connection (kept open when the clients are closed, until pool.close_all/exit). On connection
+    errors (disconnect, timeout, response mismatch), the connection is re-established (up to
+    retries times, every retry_delay seconds) and the reads are replayed: reads are considered
+    idempotent (avoid reading registers with side effects, ex FIFOs, through unreliable links).
+    Writes are never replayed (they may have been partially applied): the error is raised and
+    the connection re-established on the next access.
+
+    With write_combining=True, writes are buffered and coalesced: adjacent writes are merged in
+    incrementing bursts (all the writes are kept), up to 255 words per record. With write_fifo=True,
+    repeated writes to an address are also merged in fixed bursts (Etherbone write FIFO records):
+    only enable it with a litex_server supporting them (servers ignoring the wff flag write the
+    datas to consecutive addresses, overwriting the neighbouring registers). The buffered writes
+    are sent (back to back) before any read (reads always see the previous writes), on
+    flush/close, when max_pending words are buffered and flush_window seconds after the first
+    buffered write.
+
+    Can be used as a context manager (open/close).
+    """
+    def __init__(self, host="localhost", port=1234, base_address=0, csr_csv=None, csr_data_width=None, csr_shadow=False, window=8,
+        pooled=False, timeout=5.0, tcp_nodelay=True, retries=3, retry_delay=0.5,
+        write_combining=False, write_fifo=False, flush_window=1e-3, max_pending=4096, debug=False):
         # If csr_csv set to None and local csr.csv file exists, use it.
         if csr_csv is None and os.path.exists("csr.csv"):
             csr_csv = "csr.csv"
         # If valid csr_csv file found, build the CSRs.
         if csr_csv is not None:
-            CSRBuilder.__init__(self, self, csr_csv, csr_data_width)
+            CSRBuilder.__init__(self, self, csr_csv, csr_data_width, csr_shadow)
         # Else if csr_data_width set to None, force to csr_data_width 32-bit.
         elif csr_data_width is None:
             csr_data_width = 32
         self.host         = host
         self.port         = port
         self.base_address = base_address
+        self.window       = window # Maximum number of in-flight read records.
+        self.pooled       = pooled
+        self.timeout      = timeout
+        self.tcp_nodelay  = tcp_nodelay
+        self.retries      = retries
+        self.retry_delay  = retry_delay
         self.debug        = debug
+        self._tag         = 0
+        self._echo_tags   = None # Server echoes the reads tags (None: unknown yet).
+        self._pending     = 0
+        self.connection   = None
+
+        # Write combining.
+        self.write_combining = write_combining
+        self.write_fifo      = write_fifo
+        self.flush_window    = flush_window
+        self.max_pending     = max_pending
+        self._writes         = [] # Buffered [addr, datas, fixed] writes.
+        self._writes_lock    = threading.RLock()
+        self._writes_timer   = None
+        self._writes_error   = None
 
     def open(self):
-        if hasattr(self, "socket"):
+        if self.connection is not None:
             return
-        self.socket = socket.create_connection((self.host, self.port), 5.0)
-        self.socket.settimeout(5.0)
+        kwargs = dict(timeout=self.timeout, tcp_nodelay=self.tcp_nodelay)
+        if self.pooled:
+            connection = pool.acquire(self.host, self.port, **kwargs)
+        else:
+            connection = RemoteConnection(self.host, self.port, **kwargs)
+        try:
+            with connection.lock:
+                connection.connect()
+        except OSError:
+            if self.pooled:
+                pool.release(connection)
+            raise
+        self.connection = connection
 
     def close(self):
-        if not hasattr(self, "socket"):
+        if self.connection is None:
             return
-        self.socket.close()
-        del self.socket
+        try:
+            self.flush()
+        finally:
+            self._close()
 
-    def read(self, addr, length=None, burst="incr"):
-        """
-        addr = start address in [bytes], should be 32 bit aligned
-        length = number of 32 bit words to read. Maximum is 255.
-        """
-        length_int = 1 if length is None else length
-        # prepare packet
+    def _close(self):
+        if self.pooled:
+            pool.release(self.connection)
+        else:
+            self.connection.disconnect()
+        self.connection = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def socket(self):
+        return self.connection.socket
+
+    def _access(self, func, *args, replay=True):
+        """Run an access on the connection, reconnect on errors (and replay it if replay)."""
+        if self.connection is None:
+            raise IOError("RemoteClient not opened")
+        # Accesses are ordered after the buffered writes (and fail if they failed to be sent).
+        with self._writes_lock:
+            if self._writes or (self._writes_error is not None):
+                self.flush()
+        attempt = 0
+        while True:
+            with self.connection.lock:
+                try:
+                    self.connection.connect()
+                    return func(*args)
+                except OSError as e:
+                    # Requests/responses possibly in flight: drop the connection.
+                    self.connection.disconnect()
+                    if (not replay) or (attempt >= self.retries):
+                        raise
+                    if self.debug:
+                        print("connection error ({}), reconnecting...".format(e))
+            attempt += 1
+            self.connection.reconnects += 1
+            time.sleep(self.retry_delay)
+
+    def _send_reads(self, addrs, tag=0):
         record = EtherboneRecord()
-        incr = (burst == "incr")
-        record.reads = EtherboneReads(addrs=[self.base_address + addr + 4*incr*j for j in range(length_int)])
+        record.reads = EtherboneReads(base_ret_addr=tag, addrs=addrs)
         record.rcount = len(record.reads)
 
-        # send packet
         packet = EtherbonePacket()
         packet.records = [record]
         packet.encode()
-        self.send_packet(self.socket, packet[:])
+        self.send_packet(self.socket, packet)
 
-        # receive response
-        packet = EtherbonePacket(self.receive_packet(self.socket))
+    def _receive_reads(self, tag=0):
+        datas = self.receive_packet(self.socket)
+        if not datas:
+            raise ConnectionResetError("Etherbone connection closed by server")
+        packet = EtherbonePacket(datas)
         packet.decode()
-        datas = packet.records.pop().writes.get_datas()
+        writes = packet.records.pop().writes
+        # Read responses are written to the base return address of the reads: use it to check
+        # responses match the in-flight requests. Servers not echoing it (litex_server before the
+        # reads pipelining) always answer 0: no checks (and no pipelining) with them.
+        if writes.base_addr != tag:
+            if (writes.base_addr != 0) or (self._echo_tags is True):
+                raise IOError("Etherbone response mismatch (expected tag {}, got {})".format(tag, writes.base_addr))
+            self._echo_tags = False
+        elif tag != 0:
+            self._echo_tags = True
+        return writes.datas
+
+    def _encode_writes(self, addr, datas, fixed=False):
+        record = EtherboneRecord()
+        record.writes = EtherboneWrites(base_addr=self.base_address + addr, datas=datas)
+        record.wcount = len(record.writes)
+        record.wff    = int(fixed)
+
+        packet = EtherbonePacket()
+        packet.records = [record]
+        packet.encode()
+        return packet
+
+    def _send_writes(self, addr, datas):
+        self.send_packet(self.socket, self._encode_writes(addr, datas))
+
+    # Write combining ------------------------------------------------------------------------------
+
+    def _combine_writes(self, addr, datas):
+        with self._writes_lock:
+            for i, data in enumerate(datas):
+                _addr = addr + 4*i
+                last  = self._writes[-1] if self._writes else None
+                if (last is not None) and (len(last[1]) < 255):
+                    last_addr, last_datas, last_fixed = last
+                    # Adjacent write: incrementing burst.
+                    if (not last_fixed) and (_addr == last_addr + 4*len(last_datas)):
+                        last_datas.append(data)
+                        continue
+                    # Repeated write: fixed burst.
+                    if self.write_fifo and (_addr == last_addr) and (last_fixed or len(last_datas) == 1):
+                        last[2] = True
+                        last_datas.append(data)
+                        continue
+                self._writes.append([_addr, [data], False])
+            self._pending += len(datas)
+            if self._pending >= self.max_pending:
+                self.flush()
+            elif (self._writes_timer is None) and (self.flush_window is not None):
+                self._writes_timer = threading.Timer(self.flush_window, self._flush_timer)
+                self._writes_timer.daemon = True
+                self._writes_timer.start()
+
+    def _flush_timer(self):
+        try:
+            self.flush()
+        except OSError as e:
+            # Raised on the next access.
+            self._writes_error = e
+
+    def flush(self):
+        """Send the buffered (combined) writes."""
+        with self._writes_lock:
+            if self._writes_timer is not None:
+                self._writes_timer.cancel()
+                self._writes_timer = None
+            if self._writes_error is not None:
+                error, self._writes_error = self._writes_error, None
+                raise error
+            if not self._writes:
+                return
+            writes, self._writes, self._pending = self._writes, [], 0
+            packets = b"".join(self._encode_writes(addr, datas, fixed) for addr, datas, fixed in writes)
+            self._access(lambda: self.send_packet(self.socket, packets), replay=False)
+
+    def read(self, addr, length=None, burst="incr"):
+        """
+        addr = start address in [bytes], should be 32 bit aligned
+        length = number of 32 bit words to read. Maximum is 255.
+        """
+        length_int = 1 if length is None else length
+        incr = (burst == "incr")
+        datas = self._access(self._read, [self.base_address + addr + 4*incr*j for j in range(length_int)])
         if self.debug:
             for i, data in enumerate(datas):
-                print("read {:08x} @ {:08x}".format(data, self.base_address + addr + 4*i))
+                print("read {:08x} @ {:08x}".format(data, self.base_address + addr + 4*incr*i))
         return datas[0] if length is None else datas
 
-    def big_read(self, addr, length, chunk_size=255):
+    def _read(self, addrs):
+        self._send_reads(addrs)
+        return self._receive_reads().tolist()
+
+    def _pipelined_reads(self, chunks):
+        """
+        Send reads chunks (lists of addresses) keeping up to self.window Etherbone records in
+        flight (a single one with servers not echoing the tags), yield responses datas (arrays)
+        in order.
+        """
+        pending = []
+        for chunk in chunks:
+            window = 1 if self._echo_tags is False else self.window
+            while len(pending) >= window:
+                yield self._receive_reads(pending.pop(0))
+            tag = 0 if self._echo_tags is False else self._tag
+            self._tag = (self._tag + 1) & 0xffffffff
+            self._send_reads([self.base_address + addr for addr in chunk], tag)
+            pending.append(tag)
+        for tag in pending:
+            yield self._receive_reads(tag)
+
+    def _format_datas(self, datas, numpy):
+        if numpy:
+            import numpy as np
+            return np.concatenate([np.frombuffer(d, dtype=np.uint32) for d in datas] or
+                [np.zeros(0, dtype=np.uint32)])
+        return [data for d in datas for data in d]
+
+    def read_many(self, addrs, chunk_size=255, numpy=False):
+        """
+        read a list of arbitrary addresses
+        addrs = addresses in [bytes], should be 32 bit aligned
+        chunk_size = how many reads in one Etherbone record; records are pipelined (up to window
+        records in flight) so the reads cost a single roundtrip per window.
+        numpy = return a NumPy uint32 array instead of a list
+        """
+        chunks = [addrs[i:i + chunk_size] for i in range(0, len(addrs), chunk_size)]
+        datas  = self._format_datas(self._access(lambda: list(self._pipelined_reads(chunks))), numpy)
+        if self.debug:
+            for addr, data in zip(addrs, datas):
+                print("read {:08x} @ {:08x}".format(data, self.base_address + addr))
+        return datas
+
+    def big_read(self, addr, length, chunk_size=255, numpy=False):
         """
         read data of arbitrary length in chunks
         addr = start address in [bytes], should be 32 bit aligned
         length = number of 32 bit words to read
         chunk_size = how many words to read in one Etherbone transaction
+        numpy = return a NumPy uint32 array instead of a list
         """
-        dats = []
-        while length > 0:
-            temp = self.read(addr, min(chunk_size, length))
-            dats.append(temp)
-            addr += len(temp) * 4
-            length -= len(temp)
-        # return hstack(dats)
-        return [i for dat in dats for i in dat]
+        chunks = [[addr + 4*j for j in range(i, min(i + chunk_size, length))]
+            for i in range(0, length, chunk_size)]
+        return self._format_datas(self._access(lambda: list(self._pipelined_reads(chunks))), numpy)
 
     def write(self, addr, datas):
         datas = datas if isinstance(datas, list) else [datas]
-        record = EtherboneRecord()
-        record.writes = EtherboneWrites(base_addr=self.base_address + addr, datas=[d for d in datas])
-        record.wcount = len(record.writes)
-
-        packet = EtherbonePacket()
-        packet.records = [record]
-        packet.encode()
-        self.send_packet(self.socket, packet)
+        if self.write_combining:
+            self._combine_writes(addr, datas)
+        else:
+            self._access(self._send_writes, addr, datas, replay=False)
 
         if self.debug:
             for i, data in enumerate(datas):
                 print("write {:08x} @ {:08x}".format(data, self.base_address + addr + 4*i))
 
-# Utils --------------------------------------------------------------------------------------------
+    def write_many(self, writes, chunk_size=255):
+        """
+        write a list of (addr, datas) tuples
+        addr = start address in [bytes], should be 32 bit aligned
+        datas = word or list/array of words (split in chunks of chunk_size words)
+        Writes have no response: they are all sent back to back.
+        """
+        writes = [(addr, datas if hasattr(datas, "__len__") else [datas]) for addr, datas in writes]
+        def _write_many():
+            for addr, datas in writes:
+                for i in range(0, len(datas), chunk_size):
+                    self._send_writes(addr + 4*i, datas[i:i + chunk_size])
+        if self.write_combining:
+            for addr, datas in writes:
+                self._combine_writes(addr, list(datas))
+        else:
+            self._access(_write_many, replay=False)
+        for addr, datas in writes:
+            if self.debug:
+                for i, data in enumerate(datas):
+                    print("write {:08x} @ {:08x}".format(data, self.base_address + addr + 4*i))
 
-def dump_identifier(port):
-    wb = RemoteClient(port=port)
-    wb.open()
+# Remote Stream ------------------------------------------------------------------------------------
 
-    fpga_identifier = ""
+class RemoteStream(EtherboneIPC):
+    """
+    Subscriber of a litex_server capture stream (see RemoteServer.add_stream).
 
-    for i in range(256):
-        c = chr(wb.read(wb.bases.identifier_mem + 4*i) & 0xff)
-        fpga_identifier += c
-        if c == "\0":
-            break
+    read() returns the next chunk of the stream as (offset, datas), offset being the index of the
+    first word in the stream: gaps between chunks are dropped words (device overrun or chunks
+    dropped by the server for a slow subscriber).
 
-    print(fpga_identifier)
+    Can be used as a context manager (open/close).
+    """
+    def __init__(self, name, host="localhost", port=1235, timeout=5.0):
+        self.name    = name
+        self.host    = host
+        self.port    = port
+        self.timeout = timeout
+        self.socket  = None
 
-    wb.close()
+    def open(self):
+        if self.socket is not None:
+            return
+        self.socket = socket.create_connection((self.host, self.port), self.timeout)
+        self.socket.settimeout(self.timeout)
+        self.socket.sendall("{}\n".format(self.name).encode())
 
-def dump_registers(port):
-    wb = RemoteClient(port=port)
-    wb.open()
+    def close(self):
+        if self.socket is None:
+            return
+        self.socket.close()
+        self.socket = None
 
-    for name, register in wb.regs.__dict__.items():
-        print("0x{:08x} : 0x{:08x} {}".format(register.addr, register.read(), name))
+    def __enter__(self):
+        self.open()
+        return self
 
-    wb.close()
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, numpy=False):
+        """
+        read the next chunk, return (offset, datas)
+        numpy = return datas as a NumPy uint32 array instead of a list
+        """
+        header = bytearray(12)
+        if not self._receive_into(self.socket, header):
+            raise ConnectionResetError("Stream {} closed by server".format(self.name))
+        offset, length = struct.unpack(">QI", header)
+        payload = bytearray(4*length)
+        if not self._receive_into(self.socket, payload):
+            raise ConnectionResetError("Stream {} closed by server".format(self.name))
+        if numpy:
+            import numpy as np
+            return offset, np.frombuffer(payload, dtype="<u4").astype(np.uint32, copy=False)
+        datas = array.array("I", payload)
+        if sys.byteorder == "big":
+            datas.byteswap()
+        return offset, datas.tolist()
+
+# Utils --------------------------------------------------------------------------------------------
+
+def dump_identifier(port):
+    with RemoteClient(port=port) as wb:
+        fpga_identifier = ""
+
+        for i in range(256):
+            c = chr(wb.read(wb.bases.identifier_mem + 4*i) & 0xff)
+            fpga_identifier += c
+            if c == "\0":
+                break
+
+        print(fpga_identifier)
+
+def dump_registers(port):
+    with RemoteClient(port=port) as wb:
+        for name, register in wb.regs.__dict__.items():
+            print("0x{:08x} : 0x{:08x} {}".format(register.addr, register.read(), name))
 
 # Run ----------------------------------------------------------------------------------------------
 
@@ -11,12 +11,18 @@
 import argparse
 
 import sys
-import socket
+import json
 import time
+import socket
+import struct
+import array
+import asyncio
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from litex.tools.remote.etherbone import EtherbonePacket, EtherboneRecord, EtherboneWrites
 from litex.tools.remote.etherbone import EtherboneIPC
+from litex.tools.remote.etherbone import etherbone_packet_header_length, etherbone_record_header_length
 
 def _read_merger(addrs, max_length=256, bursts=["incr", "fixed"]):
     """Sequential reads merger
@@ -64,12 +70,125 @@ def _read_merger(addrs, max_length=256, bursts=["incr", "fixed"]):
             burst_type   = "incr"
     yield (burst_base, burst_length, burst_type)
 
+# Remote Server ------------------------------------------------------------------------------------
+
+def _current_task():
+    # asyncio.current_task is only available on Python >= 3.7.
+    if hasattr(asyncio, "current_task"):
+        return asyncio.current_task()
+    return asyncio.Task.current_task()
+
+
+class _CaptureStream:
+    """Server side state of a capture stream: device ring buffer, subscribers and statistics.
+
+    The device writes words to a ring buffer of size words (power of 2) at base and increments a
+    free-running (32-bit) write pointer register wptr; the server polls wptr and reads the new
+    words. When rptr is set, the server writes its read pointer there (allows the device to stop
+    or drop on overrun: device side backpressure).
+    """
+    def __init__(self, name, base, size, wptr, rptr=None, poll_interval=1e-3, max_buffer=1<<20):
+        assert size & (size - 1) == 0
+        self.name          = name
+        self.base          = base
+        self.size          = size
+        self.wptr          = wptr
+        self.rptr          = rptr
+        self.poll_interval = poll_interval
+        self.max_buffer    = max_buffer # Per subscriber buffered bytes (beyond: chunks dropped).
+        self.position      = None       # Read pointer (None: start at the current write pointer).
+        self.count         = 0          # Words produced by the device since the first poll.
+        self.subscribers   = []
+        self.stats         = {
+            "polls"        : 0,
+            "words"        : 0,
+            "chunks"       : 0,
+            "device_drops" : 0,
+            "client_drops" : 0,
+        }
+
+
+class _StreamSubscriber:
+    def __init__(self, name, writer):
+        self.name   = name
+        self.writer = writer
+        self.drops  = 0
+
+
+class _RemoteClient:
+    """Server side state of a connected client: pending requests queue and statistics."""
+    def __init__(self, name, queue_depth):
+        self.name   = name
+        self.queue  = asyncio.Queue(queue_depth)
+        self.closed = False
+        self.stats  = {
+            "requests"    : 0,
+            "reads"       : 0,
+            "writes"      : 0,
+            "latency_avg" : 0.0,
+            "latency_max" : 0.0,
+        }
+
+    def update_stats(self, record, latency):
+        stats = self.stats
+        stats["requests"] += 1
+        stats["reads"]    += record.rcount
+        stats["writes"]   += record.wcount
+        stats["latency_avg"] += (latency - stats["latency_avg"])/stats["requests"]
+        stats["latency_max"]  = max(stats["latency_max"], latency)
+
+
 class RemoteServer(EtherboneIPC):
-    def __init__(self, comm, bind_ip, bind_port=1234):
-        self.comm = comm
-        self.bind_ip = bind_ip
-        self.bind_port = bind_port
-        self.lock = False
+    """Etherbone TCP server sharing a comm between multiple clients.
+
+    Clients are served by an asyncio event loop (running in a background thread): each client has
+    its own requests queue and a scheduler serves the queues in round-robin (one record per
+    client per round). The reads of a round are merged (across clients) with _read_merger before
+    being issued to the comm, which is accessed from a single executor thread.
+
+    Statistics (per client requests/reads/writes/latency, comm accesses, throughput) are returned
+    by get_stats() and served as JSON on status_port (when set).
+
+    Capture streams (see add_stream) are served on stream_port: a client subscribes by sending the
+    stream name followed by a newline and then receives the captured data as a continuous binary
+    stream of chunks: offset (64-bit, index of the first word in the stream) and length (32-bit,
+    in words) big-endian header followed by the words (32-bit, little-endian). Gaps in the offsets
+    are dropped words.
+    """
+    def __init__(self, comm, bind_ip, bind_port=1234, status_port=None, stream_port=None, queue_depth=16):
+        self.comm        = comm
+        self.bind_ip     = bind_ip
+        self.bind_port   = bind_port
+        self.status_port = status_port
+        self.stream_port = stream_port
+        self.queue_depth = queue_depth
+        self.clients     = []
+        self.streams     = {}
+        self.stats       = {
+            "rounds"      : 0,
+            "comm_reads"  : 0,
+            "comm_writes" : 0,
+            "read_words"  : 0,
+            "write_words" : 0,
+        }
+        self._rr = 0
+
+        # Comm's read capabilities.
+        self.max_length = {
+            "CommUART":  255,
+            "CommUDP":   255,
+            "CommPCIe":  256,
+            "CommSim":   255,
+        }.get(self.comm.__class__.__name__, 1)
+        self.bursts = {
+            "CommUART": ["incr", "fixed"]
+        }.get(self.comm.__class__.__name__, ["incr"])
+        # Comms with block accesses (CommPCIe) copy long merged bursts (memory regions) directly
+        # from/to their mapping (memcpy); shorter bursts (ex adjacent CSRs) use word accesses.
+        self.block_accesses   = hasattr(self.comm, "read_block")
+        self.block_min_length = 64
+        # Comms with pipelined reads (CommUART/CommUDP/CommSim) get all the merged bursts of a round at once.
+        self.pipelined_reads = hasattr(self.comm, "read_bursts")
 
     def open(self):
         if hasattr(self, "socket"):
@@ -81,80 +200,349 @@ class RemoteServer(EtherboneIPC):
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.socket.bind((self.bind_ip, self.bind_port))
         print("tcp port: {:d}".format(self.bind_port))
-        self.socket.listen(1)
+        self.socket.listen()
         self.comm.open()
 
     def close(self):
+        if hasattr(self, "serve_thread"):
+            self._started.wait()
+            self.loop.call_soon_threadsafe(self._stop.set)
+            self.serve_thread.join()
+            del self.serve_thread
         self.comm.close()
         if not hasattr(self, "socket"):
             return
         self.socket.close()
         del self.socket
 
-    def _serve_thread(self):
+    # Statistics -----------------------------------------------------------------------------------
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        elapsed = time.perf_counter() - self._start_time if hasattr(self, "_start_time") else 0
+        stats["uptime"]     = elapsed
+        stats["throughput"] = (stats["read_words"] + stats["write_words"])*4/elapsed if elapsed else 0
+        stats["clients"]    = {client.name: dict(client.stats) for client in list(self.clients)}
+        stats["streams"]    = {name: dict(stream.stats, subscribers=len(stream.subscribers))
+            for name, stream in self.streams.items()}
+        return stats
+
+    async def _serve_status(self, reader, writer):
+        # Minimal HTTP/1.0 endpoint: any request returns the statistics.
+        try:
+            await reader.readline()
+        except ConnectionError:
+            pass
+        body = json.dumps(self.get_stats(), indent=2).encode()
+        writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n")
+        writer.write("Content-Length: {}\r\n\r\n".format(len(body)).encode())
+        writer.write(body)
+        await writer.drain()
+        writer.close()
+
+    # Clients --------------------------------------------------------------------------------------
+
+    async def _receive_record(self, reader):
+        header_length = etherbone_packet_header_length + etherbone_record_header_length
+        header = await reader.readexactly(header_length)
+        wcount, rcount = struct.unpack_from(">BB", header, header_length-2)
+        payload = await reader.readexactly(4*(wcount + rcount + 1))
+        packet = EtherbonePacket(header + payload)
+        packet.decode()
+        return packet.records.pop()
+
+    async def _send_responses(self, writer, responses):
+        try:
+            while True:
+                response = await responses.get()
+                if response is None:
+                    break
+                base_ret_addr, future = response
+                reads = await future
+                # Responses are written to the base return address of the reads (allows clients
+                # to match responses of pipelined requests).
+                record = EtherboneRecord()
+                record.writes = EtherboneWrites(base_addr=base_ret_addr, datas=reads)
+                record.wcount = len(record.writes)
+
+                packet = EtherbonePacket()
+                packet.records = [record]
+                packet.encode()
+                writer.write(packet)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        except Exception as e:
+            print("Comm error: {}".format(e))
+        finally:
+            writer.close()
+
+    async def _serve_client(self, reader, writer):
+        addr   = writer.get_extra_info("peername")
+        name   = "{}:{}".format(addr[0], addr[1])
+        client = _RemoteClient(name, self.queue_depth)
+        print("Connected with " + name)
+        task = _current_task()
+        self._client_tasks.add(task)
+        self.clients.append(client)
+        responses = asyncio.Queue()
+        sender    = asyncio.ensure_future(self._send_responses(writer, responses))
+        try:
+            while not sender.done():
+                try:
+                    record = await self._receive_record(reader)
+                except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+                    break
+                future = None
+                if record.reads is not None:
+                    future = self.loop.create_future()
+                    await responses.put((record.reads.base_ret_addr, future))
+                await client.queue.put((record, future, time.perf_counter()))
+                self._wakeup.set()
+        finally:
+            print("Disconnect")
+            # Pending requests (writes) are still executed, the scheduler removes the client once
+            # its queue is empty.
+            client.closed = True
+            self._wakeup.set()
+            if self._stop.is_set():
+                sender.cancel()
+            else:
+                responses.put_nowait(None)
+            try:
+                await sender
+            except asyncio.CancelledError:
+                pass
+            self._client_tasks.discard(task)
+
+    # Streams --------------------------------------------------------------------------------------
+
+    def add_stream(self, name, base, size, wptr, rptr=None, poll_interval=1e-3, max_buffer=1<<20):
+        """
+        add a capture stream (to be called before start)
+        base = ring buffer address in [bytes], size = ring buffer size in words (power of 2)
+        wptr = write pointer register address, rptr = optional read pointer register address
+        poll_interval = write pointer polling interval (when no new data) in [s]
+        max_buffer = bytes buffered per subscriber before dropping chunks (slow subscribers)
+        """
+        self.streams[name] = _CaptureStream(name, base, size, wptr, rptr, poll_interval, max_buffer)
+
+    def _read_stream(self, stream):
+        """Read the new words of a stream (in executor thread), return (count, datas) or None."""
+        stream.stats["polls"] += 1
+        wptr = self.comm.read(stream.wptr)
+        if stream.position is None:
+            stream.position = wptr
+        new = (wptr - stream.position) & 0xffffffff
+        if new == 0:
+            return None
+        if new > stream.size:
+            # Overrun: the oldest words have been overwritten by the device.
+            stream.stats["device_drops"] += new - stream.size
+            stream.count   += new - stream.size
+            stream.position = (wptr - stream.size) & 0xffffffff
+            new = stream.size
+        # Ring buffer reads (up to 2 segments) in bursts of max_length words.
+        bursts = []
+        offset = stream.position % stream.size
+        for start, length in [(offset, min(new, stream.size - offset)), (0, new - (stream.size - offset))]:
+            for i in range(0, max(length, 0), self.max_length):
+                bursts.append((stream.base + 4*(start + i), min(self.max_length, length - i), "incr"))
+        datas = self._read_bursts(bursts)
+        stream.position = (stream.position + new) & 0xffffffff
+        if stream.rptr is not None:
+            self.comm.write(stream.rptr, [stream.position])
+        count = stream.count
+        stream.count += new
+        return count, datas
+
+    def _push_stream(self, stream, count, datas):
+        payload = array.array("I", datas)
+        if sys.byteorder == "big":
+            payload.byteswap()
+        header  = struct.pack(">QI", count, len(datas))
+        payload = payload.tobytes() # Shared by all the subscribers.
+        stream.stats["words"]  += len(datas)
+        stream.stats["chunks"] += 1
+        for subscriber in list(stream.subscribers):
+            transport = subscriber.writer.transport
+            if transport.get_write_buffer_size() + len(payload) > stream.max_buffer:
+                # Slow subscriber: drop the chunk.
+                subscriber.drops += len(datas)
+                stream.stats["client_drops"] += len(datas)
+                continue
+            subscriber.writer.write(header)
+            subscriber.writer.write(payload)
+
+    async def _poll_stream(self, stream):
         while True:
-            client_socket, addr = self.socket.accept()
-            print("Connected with " + addr[0] + ":" + str(addr[1]))
+            if not stream.subscribers:
+                # Restart at the current write pointer on the next subscription.
+                stream.position = None
+            else:
+                try:
+                    chunk = await self.loop.run_in_executor(self.executor, self._read_stream, stream)
+                except Exception as e:
+                    print("Stream {} error: {}".format(stream.name, e))
+                    chunk = None
+                if chunk is not None:
+                    self._push_stream(stream, *chunk)
+                    continue
+            await asyncio.sleep(stream.poll_interval)
+
+    async def _serve_stream(self, reader, writer):
+        task = _current_task()
+        self._client_tasks.add(task)
+        try:
+            name   = (await reader.readline()).decode().strip()
+            stream = self.streams.get(name, None)
+            if stream is None:
+                print("Unknown stream: {}".format(name))
+                return
+            addr       = writer.get_extra_info("peername")
+            subscriber = _StreamSubscriber("{}:{}".format(addr[0], addr[1]), writer)
+            print("Stream {} subscribed by {}".format(name, subscriber.name))
+            stream.subscribers.append(subscriber)
             try:
-                while True:
-                    try:
-                        packet = self.receive_packet(client_socket)
-                        if packet == 0:
-                            break
-                    except:
-                        break
-                    packet = EtherbonePacket(packet)
-                    packet.decode()
-
-                    record = packet.records.pop()
-
-                    # wait for lock
-                    while self.lock:
-                        time.sleep(0.01)
-
-                    # set lock
-                    self.lock = True
-
-                    # handle writes:
-                    if record.writes != None:
-                        self.comm.write(record.writes.base_addr, record.writes.get_datas())
-
-                    # handle reads
-                    if record.reads != None:
-                        max_length = {
-                            "CommUART": 256,
-                            "CommUDP":    4,
-                        }.get(self.comm.__class__.__name__, 1)
-                        bursts = {
-                            "CommUART": ["incr", "fixed"]
-                        }.get(self.comm.__class__.__name__, ["incr"])
-                        reads = []
-                        for addr, length, burst in _read_merger(record.reads.get_addrs(),
-                            max_length  = max_length,
-                            bursts      = bursts):
-                            reads += self.comm.read(addr, length, burst)
-
-                        record = EtherboneRecord()
-                        record.writes = EtherboneWrites(datas=reads)
-                        record.wcount = len(record.writes)
-
-                        packet = EtherbonePacket()
-                        packet.records = [record]
-                        packet.encode()
-                        self.send_packet(client_socket, packet)
-
-                    # release lock
-                    self.lock = False
-
+                # Wait for the subscriber to disconnect.
+                while await reader.read(4096):
+                    pass
             finally:
-                print("Disconnect")
-                client_socket.close()
+                stream.subscribers.remove(subscriber)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+            self._client_tasks.discard(task)
+
+    # Scheduling -----------------------------------------------------------------------------------
+
+    def _read_bursts(self, bursts):
+        """Read (addr, length, burst) bursts from the comm, return the datas of all bursts."""
+        self.stats["comm_reads"] += len(bursts)
+        if self.pipelined_reads:
+            return list(self.comm.read_bursts(bursts))
+        datas = []
+        for addr, length, burst in bursts:
+            if self.block_accesses and (burst == "incr") and (length >= self.block_min_length):
+                datas += self.comm.read_block(addr, length)
+            else:
+                datas += self.comm.read(addr, length, burst)
+        return datas
+
+    def _execute(self, requests):
+        """Execute a round of requests on the comm (in executor thread), return reads datas."""
+        results = [None]*len(requests)
+        pending = []
+        def flush():
+            if not pending:
+                return
+            # Order records (from different clients) by address to merge adjacent reads.
+            pending.sort(key=lambda p: p[1].reads.addrs[0])
+            addrs = [addr for i, record in pending for addr in record.reads.get_addrs()]
+            bursts = list(_read_merger(addrs,
+                max_length  = self.max_length,
+                bursts      = self.bursts))
+            datas = self._read_bursts(bursts)
+            self.stats["read_words"] += len(addrs)
+            offset = 0
+            for i, record in pending:
+                results[i] = datas[offset:offset + record.rcount]
+                offset += record.rcount
+            pending.clear()
+
+        for i, (client, (record, future, timestamp)) in enumerate(requests):
+            # Writes are executed after the previous reads of the round.
+            if record.writes is not None:
+                flush()
+                if record.wff:
+                    # Write FIFO: all the datas written to base_addr (fixed burst).
+                    if "fixed" in self.bursts:
+                        self.comm.write(record.writes.base_addr, record.writes.get_datas(), burst="fixed")
+                    else:
+                        for data in record.writes.get_datas():
+                            self.comm.write(record.writes.base_addr, [data])
+                elif self.block_accesses and (record.wcount >= self.block_min_length):
+                    self.comm.write_block(record.writes.base_addr, record.writes.datas)
+                else:
+                    self.comm.write(record.writes.base_addr, record.writes.get_datas())
+                self.stats["comm_writes"] += 1
+                self.stats["write_words"] += record.wcount
+            if record.reads is not None:
+                pending.append((i, record))
+        flush()
+        return results
+
+    async def _schedule(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                # Round-robin: one record per client with pending requests.
+                clients  = list(self.clients)
+                n        = len(clients)
+                requests = []
+                for k in range(n):
+                    client = clients[(self._rr + k)%n]
+                    if not client.queue.empty():
+                        requests.append((client, client.queue.get_nowait()))
+                self.clients = [c for c in self.clients if not (c.closed and c.queue.empty())]
+                if not requests:
+                    break
+                self._rr += 1
+                self.stats["rounds"] += 1
+                try:
+                    results = await self.loop.run_in_executor(self.executor, self._execute, requests)
+                except Exception as e:
+                    for client, (record, future, timestamp) in requests:
+                        if future is not None:
+                            future.set_exception(e)
+                    continue
+                now = time.perf_counter()
+                for (client, (record, future, timestamp)), result in zip(requests, results):
+                    client.update_stats(record, now - timestamp)
+                    if future is not None:
+                        future.set_result(result)
+
+    async def _serve(self):
+        self._stop   = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._client_tasks = set()
+        self._start_time = time.perf_counter()
+        servers = [await asyncio.start_server(self._serve_client, sock=self.socket)]
+        if self.status_port is not None:
+            servers.append(await asyncio.start_server(self._serve_status, self.bind_ip, self.status_port))
+            print("status port: {:d}".format(self.status_port))
+        if self.stream_port is not None:
+            servers.append(await asyncio.start_server(self._serve_stream, self.bind_ip, self.stream_port))
+            print("stream port: {:d}".format(self.stream_port))
+        self._started.set()
+        tasks = [asyncio.ensure_future(self._schedule())]
+        tasks += [asyncio.ensure_future(self._poll_stream(stream)) for stream in self.streams.values()]
+        await self._stop.wait()
+        for server in servers:
+            server.close()
+        for task in list(self._client_tasks) + tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, *self._client_tasks, return_exceptions=True)
 
-    def start(self, nthreads):
-        for i in range(nthreads):
-            self.serve_thread = threading.Thread(target=self._serve_thread)
-            self.serve_thread.setDaemon(True)
-            self.serve_thread.start()
+    def _serve_thread(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._serve())
+        finally:
+            self._started.set() # Don't block start/close when the servers failed to start.
+            self.executor.shutdown(wait=True)
+            self.loop.close()
+
+    def start(self, nthreads=1):
+        # nthreads is kept for compatibility: clients are served concurrently by the event loop.
+        self.loop     = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=1) # Comm accesses are serialized.
+        self._started = threading.Event()
+        self.serve_thread = threading.Thread(target=self._serve_thread, daemon=True)
+        self.serve_thread.start()
+        self._started.wait()
 
 
 def main():
@@ -167,6 +555,12 @@ def main():
                         help="Host bind port")
     parser.add_argument("--debug", action="store_true",
                         help="Enable debug")
+    parser.add_argument("--status-port", default=None,
+                        help="Serve statistics (JSON) on this port")
+    parser.add_argument("--stream-port", default=None,
+                        help="Serve capture streams on this port")
+    parser.add_argument("--stream", default=[], action="append",
+                        help="Add capture stream: name:base:size:wptr[:rptr] (ring buffer base address, size in words, write/read pointer registers)")
 
     # UART arguments
     parser.add_argument("--uart", action="store_true",
@@ -175,6 +569,8 @@ def main():
                         help="Set UART port")
     parser.add_argument("--uart-baudrate", default=115200,
                         help="Set UART baudrate")
+    parser.add_argument("--uart-fifo-depth", default=0,
+                        help="UARTBone RX FIFO depth (bytes), allows pipelined reads")
 
     # UDP arguments
     parser.add_argument("--udp", action="store_true",
@@ -183,6 +579,10 @@ def main():
                         help="Set UDP remote IP address")
     parser.add_argument("--udp-port", default=1234,
                         help="Set UDP remote port")
+    parser.add_argument("--udp-mtu", default=1500,
+                        help="Set UDP MTU (Etherbone records are packed in datagrams up to MTU)")
+    parser.add_argument("--udp-buffer-depth", default=4,
+                        help="Set Etherbone core reads buffer depth (words per reads record)")
 
     # PCIe arguments
     parser.add_argument("--pcie", action="store_true",
@@ -220,13 +620,16 @@ def main():
         uart_port = args.uart_port
         uart_baudrate = int(float(args.uart_baudrate))
         print("[CommUART] port: {} / baudrate: {} / ".format(uart_port, uart_baudrate), end="")
-        comm = CommUART(uart_port, uart_baudrate, debug=args.debug)
+        comm = CommUART(uart_port, uart_baudrate, rx_fifo_depth=int(args.uart_fifo_depth), debug=args.debug)
     elif args.udp:
         from litex.tools.remote.comm_udp import CommUDP
         udp_ip = args.udp_ip
         udp_port = int(args.udp_port)
         print("[CommUDP] ip: {} / port: {} / ".format(udp_ip, udp_port), end="")
-        comm = CommUDP(udp_ip, udp_port, debug=args.debug)
+        comm = CommUDP(udp_ip, udp_port,
+            mtu          = int(args.udp_mtu),
+            buffer_depth = int(args.udp_buffer_depth),
+            debug        = args.debug)
     elif args.pcie:
         from litex.tools.remote.comm_pcie import CommPCIe
         pcie_bar = args.pcie_bar
@@ -268,7 +671,12 @@ def main():
         parser.print_help()
         exit()
 
-    server = RemoteServer(comm, args.bind_ip, int(args.bind_port))
+    status_port = None if args.status_port is None else int(args.status_port)
+    stream_port = None if args.stream_port is None else int(args.stream_port)
+    server = RemoteServer(comm, args.bind_ip, int(args.bind_port), status_port=status_port, stream_port=stream_port)
+    for stream in args.stream:
+        name, *params = stream.split(":")
+        server.add_stream(name, *[int(p, 0) for p in params])
     server.open()
     server.start(4)
     try:
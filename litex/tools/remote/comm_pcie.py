@@ -7,6 +7,7 @@
 import os
 import ctypes
 import mmap
+from array import array
 
 class CommPCIe:
     def __init__(self, bar, debug=False):
@@ -22,9 +23,9 @@ class CommPCIe:
     def close(self):
         if not hasattr(self, "file"):
             return
-        self.file.close()
-        del self.file
         self.mmap.close()
+        os.close(self.file)
+        del self.file
 
     def read(self, addr, length=None, burst="incr"):
         assert burst == "incr"
@@ -46,3 +47,39 @@ class CommPCIe:
             ctypes.c_uint32.from_buffer(self.mmap, addr + 4*i).value = value
             if self.debug:
                 print("write {:08x} @ {:08x}".format(value, addr + 4*i))
+
+    def _block_views(self, addr, buf, nbytes):
+        if (addr | nbytes) % 4:
+            raise ValueError("Block access must be aligned on 32-bit")
+        bar = memoryview(self.mmap)[addr:addr + nbytes]
+        mem = memoryview(buf).cast("B")[:nbytes]
+        return bar, mem
+
+    # Block accesses: the BAR mmap is copied directly with a single memcpy (no per word Python
+    # objects). The bus access size is the one chosen by memcpy (possibly wider than 32-bit and
+    # not ordered): use on memory regions (buffers, RAMs) only, never on registers.
+
+    def read_block(self, addr, length, out=None):
+        """
+        read length 32 bit words from addr with a single copy (memcpy) from the BAR mmap
+        out = writable buffer (NumPy array, array, bytearray, ...) of at least 4*length bytes
+        to read to (an array("I") is allocated when None); returned.
+        """
+        if out is None:
+            out = array("I", bytes(4*length))
+        bar, mem = self._block_views(addr, out, 4*length)
+        with bar, mem:
+            mem[:] = bar
+        return out
+
+    def write_block(self, addr, data):
+        """
+        write data to addr with a single copy (memcpy) to the BAR mmap
+        data = buffer (NumPy array, array, bytes, ...) of 32 bit words or list of words
+        """
+        if isinstance(data, list):
+            data = array("I", data)
+        nbytes = memoryview(data).nbytes
+        bar, mem = self._block_views(addr, data, nbytes)
+        with bar, mem:
+            bar[:] = mem
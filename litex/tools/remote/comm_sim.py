@@ -0,0 +1,139 @@
+#
+# This file is part of LiteX.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import queue
+import threading
+
+from litex.gen.sim import Simulator
+
+
+class CommSim:
+    """Comm driving the Wishbone bus of a design simulated with litex.gen.sim.
+
+    Allows exercising the remote stack (litex_server, RemoteClient, CSRBuilder) without hardware:
+    the simulation runs in a thread and executes the requests of read/write/read_bursts as classic
+    Wishbone cycles on bus (a master wishbone.Interface of dut). latency models the link: number
+    of cycles waited before each request is executed (a roundtrip), making the gains of requests
+    merging/pipelining/batching visible on the simulated cycles (cycles/requests statistics).
+    """
+    def __init__(self, dut, bus, clocks={"sys": 10}, latency=0, timeout=1024, vcd_name=None, debug=False):
+        self.dut      = dut
+        self.bus      = bus
+        self.clocks   = clocks
+        self.latency  = latency
+        self.timeout  = timeout
+        self.vcd_name = vcd_name
+        self.debug    = debug
+        self.cycles   = 0
+        self.requests = 0
+
+    def open(self):
+        if hasattr(self, "thread"):
+            return
+        self._requests = queue.Queue()
+        self.thread    = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        if not hasattr(self, "thread"):
+            return
+        self._requests.put(None)
+        self.thread.join()
+        del self.thread
+
+    # Simulation -----------------------------------------------------------------------------------
+
+    def _run(self):
+        with Simulator(self.dut, self._master(), self.clocks, vcd_name=self.vcd_name) as sim:
+            sim.run()
+
+    def _tick(self):
+        self.cycles += 1
+        yield
+
+    def _access(self, adr, dat=None):
+        bus = self.bus
+        yield bus.adr.eq(adr)
+        yield bus.we.eq(dat is not None)
+        if dat is not None:
+            yield bus.dat_w.eq(dat)
+            yield bus.sel.eq(2**len(bus.sel) - 1)
+        yield bus.cyc.eq(1)
+        yield bus.stb.eq(1)
+        yield from self._tick()
+        try:
+            for i in range(self.timeout):
+                if (yield bus.err):
+                    raise IOError("CommSim: bus error @ {:08x}".format(adr << 2))
+                if (yield bus.ack):
+                    break
+                yield from self._tick()
+            else:
+                raise IOError("CommSim: bus timeout @ {:08x}".format(adr << 2))
+            dat_r = (yield bus.dat_r)
+        finally:
+            # End the cycle (also on errors: the next request must not see a stale ack).
+            yield bus.cyc.eq(0)
+            yield bus.stb.eq(0)
+            yield from self._tick()
+        return dat_r
+
+    def _master(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            accesses, response = request
+            self.requests += 1
+            for i in range(self.latency):
+                yield from self._tick()
+            try:
+                datas = []
+                for addr, data in accesses:
+                    value = yield from self._access(addr >> 2, data)
+                    if data is None:
+                        datas.append(value)
+                response.put(datas)
+            except Exception as e:
+                response.put(e)
+
+    def _execute(self, accesses):
+        if not hasattr(self, "thread"):
+            raise IOError("CommSim not opened")
+        response = queue.Queue()
+        self._requests.put((accesses, response))
+        result = response.get()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    # Accesses -------------------------------------------------------------------------------------
+
+    def read_bursts(self, bursts):
+        """
+        read a list of (addr, length, burst) bursts in a single request, return the datas of all
+        bursts
+        """
+        accesses = []
+        for addr, length, burst in bursts:
+            incr = (burst == "incr")
+            accesses += [(addr + 4*incr*i, None) for i in range(length)]
+        datas = self._execute(accesses)
+        if self.debug:
+            for (addr, _), data in zip(accesses, datas):
+                print("read {:08x} @ {:08x}".format(data, addr))
+        return datas
+
+    def read(self, addr, length=None, burst="incr"):
+        length_int = 1 if length is None else length
+        datas = self.read_bursts([(addr, length_int, burst)])
+        return datas[0] if length is None else datas
+
+    def write(self, addr, datas):
+        datas = datas if isinstance(datas, list) else [datas]
+        self._execute([(addr + 4*i, data) for i, data in enumerate(datas)])
+        if self.debug:
+            for i, data in enumerate(datas):
+                print("write {:08x} @ {:08x}".format(data, addr + 4*i))
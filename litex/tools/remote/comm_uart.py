@@ -4,31 +4,45 @@
 # Copyright (c) 2015-2019 Florent Kermarrec <florent@enjoy-digital.fr>
 # SPDX-License-Identifier: BSD-2-Clause
 
-import serial
 import struct
 
+from litex.tools.remote.etherbone import words_to_bytes, bytes_to_words
+
 CMD_WRITE_BURST_INCR  = 0x01
 CMD_READ_BURST_INCR   = 0x02
 CMD_WRITE_BURST_FIXED = 0x03
 CMD_READ_BURST_FIXED  = 0x04
 
+# Maximum burst length of a command (Stream2Wishbone's 8-bit length field).
+MAX_BURST_LENGTH = 255
+
 class CommUART:
-    def __init__(self, port, baudrate=115200, debug=False):
+    """UARTBone comm.
+
+    Commands are sent back to back: writes are sent without waiting, reads bursts are pipelined
+    while their commands fit in UARTBone's RX FIFO (rx_fifo_depth, 0 when the UARTBone has no
+    RX FIFO: a read command is then only sent once the previous read response is received).
+
+    port can be a pySerial URL or an already opened serial-like object.
+    """
+    def __init__(self, port, baudrate=115200, max_burst_length=MAX_BURST_LENGTH, rx_fifo_depth=0, debug=False):
+        assert 1 <= max_burst_length <= MAX_BURST_LENGTH
+        self.baudrate         = str(baudrate)
+        self.max_burst_length = max_burst_length
+        self.rx_fifo_depth    = rx_fifo_depth
+        self.debug            = debug
+        if isinstance(port, str):
+            import serial
+            port = serial.serial_for_url(port, baudrate)
         self.port = port
-        self.baudrate = str(baudrate)
-        self.debug = debug
-        self.port = serial.serial_for_url(port, baudrate)
 
     def open(self):
-        if hasattr(self, "port"):
-            return
-        self.port.open()
+        if not self.port.is_open:
+            self.port.open()
+        self._flush()
 
     def close(self):
-        if not hasattr(self, "port"):
-            return
         self.port.close()
-        del self.port
 
     def _read(self, length):
         r = bytes()
@@ -48,41 +62,56 @@ class CommUART:
         if self.port.inWaiting() > 0:
             self.port.read(self.port.inWaiting())
 
+    def _split_bursts(self, addr, length, burst):
+        incr = (burst == "incr")
+        for offset in range(0, length, self.max_burst_length):
+            yield addr + 4*incr*offset, min(length - offset, self.max_burst_length), burst
+
+    def read_bursts(self, bursts):
+        """
+        read a list of (addr, length, burst) bursts, return the datas of all bursts
+        Read commands are pipelined: up to 1 + rx_fifo_depth//6 commands are in flight.
+        """
+        commands = [c for addr, length, burst in bursts for c in self._split_bursts(addr, length, burst)]
+        window   = 1 + self.rx_fifo_depth//6 # 6 bytes per read command.
+        datas    = []
+        def receive(addr, length, burst):
+            values = bytes_to_words(self._read(4*length))
+            if self.debug:
+                for i, value in enumerate(values):
+                    print("read {:08x} @ {:08x}".format(value, addr + 4*(burst == "incr")*i))
+            datas.extend(values)
+        for i, (addr, length, burst) in enumerate(commands):
+            if i >= window:
+                receive(*commands[i - window])
+            cmd = {
+                "incr" : CMD_READ_BURST_INCR,
+                "fixed": CMD_READ_BURST_FIXED,
+            }[burst]
+            self._write(struct.pack(">BBI", cmd, length, addr//4))
+        for command in commands[max(len(commands) - window, 0):]:
+            receive(*command)
+        return datas
+
     def read(self, addr, length=None, burst="incr"):
-        self._flush()
-        data = []
         length_int = 1 if length is None else length
-        cmd = {
-            "incr" : CMD_READ_BURST_INCR,
-            "fixed": CMD_READ_BURST_FIXED,
-        }[burst]
-        self._write([cmd, length_int])
-        self._write(list((addr//4).to_bytes(4, byteorder="big")))
-        for i in range(length_int):
-            value = int.from_bytes(self._read(4), "big")
-            if self.debug:
-                print("read {:08x} @ {:08x}".format(value, addr + 4*i))
-            if length is None:
-                return value
-            data.append(value)
-        return data
+        data = self.read_bursts([(addr, length_int, burst)])
+        return data[0] if length is None else data
 
     def write(self, addr, data, burst="incr"):
-        self._flush()
         data = data if isinstance(data, list) else [data]
-        length = len(data)
-        offset = 0
-        while length:
-            size = min(length, 8)
-            cmd = {
-                "incr" : CMD_WRITE_BURST_INCR,
-                "fixed": CMD_WRITE_BURST_FIXED,
-            }[burst]
-            self._write([cmd, size])
-            self._write(list(((addr//4 + offset).to_bytes(4, byteorder="big"))))
-            for i, value in enumerate(data[offset:offset+size]):
-                self._write(list(value.to_bytes(4, byteorder="big")))
-                if self.debug:
-                    print("write {:08x} @ {:08x}".format(value, addr + offset, 4*i))
-            offset += size
-            length -= size
+        cmd = {
+            "incr" : CMD_WRITE_BURST_INCR,
+            "fixed": CMD_WRITE_BURST_FIXED,
+        }[burst]
+        # Build all the write commands and send them at once.
+        commands = bytearray()
+        offset   = 0
+        for _addr, size, _burst in self._split_bursts(addr, len(data), burst):
+            commands += struct.pack(">BBI", cmd, size, _addr//4)
+            commands += words_to_bytes(data[offset:offset + size])
+            offset   += size
+        self._write(commands)
+        if self.debug:
+            for i, value in enumerate(data):
+                print("write {:08x} @ {:08x}".format(value, addr + 4*(burst == "incr")*i))
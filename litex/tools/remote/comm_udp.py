@@ -9,58 +9,164 @@ import socket
 
 from litex.tools.remote.etherbone import EtherbonePacket, EtherboneRecord
 from litex.tools.remote.etherbone import EtherboneReads, EtherboneWrites
+from litex.tools.remote.etherbone import etherbone_packet_header_length, etherbone_record_header_length
 
 
 class CommUDP:
-    def __init__(self, server="192.168.1.50", port=1234, debug=False):
-        self.server = server
-        self.port = port
-        self.debug = debug
+    """Etherbone over UDP comm.
+
+    Accesses are split in Etherbone records (reads records of up to buffer_depth words: the
+    Etherbone core's reads buffer) packed in datagrams of up to mtu bytes. Up to window read
+    datagrams are kept in flight, responses being matched to the requests by their base return
+    address (a sequence number); datagrams with missing responses are sent again after timeout
+    seconds (up to retries times).
+    """
+    def __init__(self, server="192.168.1.50", port=1234, local_port=None, mtu=1500, buffer_depth=4,
+        window=16, timeout=0.1, retries=3, rcvbuf=None, sndbuf=None, debug=False):
+        self.server       = server
+        self.port         = port
+        self.local_port   = port if local_port is None else local_port
+        self.mtu          = mtu
+        self.buffer_depth = buffer_depth
+        self.window       = window
+        self.timeout      = timeout
+        self.retries      = retries
+        self.rcvbuf       = rcvbuf
+        self.sndbuf       = sndbuf
+        self.debug        = debug
+        self._tag         = 0
+
+        # Payload bytes available for records in a datagram (IPv4/UDP/Etherbone headers).
+        self.max_records_bytes = mtu - 20 - 8 - etherbone_packet_header_length
+        assert self._record_size(buffer_depth) <= self.max_records_bytes
 
     def open(self):
-        if hasattr(self, "tx_socket"):
+        if hasattr(self, "socket"):
             return
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind(("", self.port))
+        if self.rcvbuf is not None:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        if self.sndbuf is not None:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+        self.socket.bind(("", self.local_port))
+        self.socket.settimeout(self.timeout)
 
     def close(self):
-        if not hasattr(self, "tx_socket"):
+        if not hasattr(self, "socket"):
             return
         self.socket.close()
         del self.socket
 
-    def read(self, addr, length=None, burst="incr"):
-        assert burst == "incr"
-        length_int = 1 if length is None else length
-        record = EtherboneRecord()
-        record.reads = EtherboneReads(addrs=[addr+4*j for j in range(length_int)])
-        record.rcount = len(record.reads)
+    # Datagrams ------------------------------------------------------------------------------------
+
+    @staticmethod
+    def _record_size(n):
+        return etherbone_record_header_length + 4*(n + 1)
 
+    def _pack(self, records):
+        """Pack records (list of (record, size)) in datagrams of up to MTU bytes."""
+        datagrams = []
+        current   = []
+        size      = 0
+        for record, record_size in records:
+            if current and (size + record_size > self.max_records_bytes):
+                datagrams.append(current)
+                current = []
+                size    = 0
+            current.append(record)
+            size += record_size
+        if current:
+            datagrams.append(current)
+        return datagrams
+
+    def _encode(self, records):
         packet = EtherbonePacket()
-        packet.records = [record]
+        packet.records = records
         packet.encode()
-        self.socket.sendto(bytes(packet), (self.server, self.port))
+        return packet
+
+    def _send(self, packet):
+        self.socket.sendto(packet, (self.server, self.port))
+
+    # Reads ----------------------------------------------------------------------------------------
+
+    def read_bursts(self, bursts):
+        """
+        read a list of (addr, length, burst) bursts, return the datas of all bursts
+        """
+        # Build reads records tagged with sequence numbers.
+        records = []
+        tags    = []
+        for addr, length, burst in bursts:
+            incr  = (burst == "incr")
+            addrs = [addr + 4*incr*i for i in range(length)]
+            for i in range(0, length, self.buffer_depth):
+                record = EtherboneRecord()
+                record.reads = EtherboneReads(base_ret_addr=self._tag, addrs=addrs[i:i + self.buffer_depth])
+                record.rcount = len(record.reads)
+                records.append((record, self._record_size(record.rcount)))
+                tags.append(self._tag)
+                self._tag = (self._tag + 1) & 0xffffffff
+        datagrams = self._pack(records)
 
-        datas, dummy = self.socket.recvfrom(8192)
-        packet = EtherbonePacket(datas)
-        packet.decode()
-        datas = packet.records.pop().writes.get_datas()
+        # Send datagrams (up to window in flight) and collect responses.
+        responses = {}
+        pending   = {} # Datagram index -> tags.
+        retries   = 0
+        next_datagram = 0
+        while (next_datagram < len(datagrams)) or pending:
+            while (next_datagram < len(datagrams)) and (len(pending) < self.window):
+                pending[next_datagram] = [r.reads.base_ret_addr for r in datagrams[next_datagram]]
+                datagrams[next_datagram] = self._encode(datagrams[next_datagram])
+                self._send(datagrams[next_datagram])
+                next_datagram += 1
+            try:
+                datas, _ = self.socket.recvfrom(65536)
+            except socket.timeout:
+                # Retry the datagrams with missing responses.
+                retries += 1
+                if retries > self.retries:
+                    raise IOError("CommUDP: no response after {} retries".format(self.retries))
+                for index in pending.keys():
+                    self._send(datagrams[index])
+                continue
+            packet = EtherbonePacket(datas)
+            packet.decode()
+            for record in packet.records:
+                if record.writes is not None:
+                    responses[record.writes.base_addr] = record.writes.get_datas()
+            for index in [i for i, t in pending.items() if all(tag in responses for tag in t)]:
+                del pending[index]
+                retries = 0
+
+        datas = [data for tag in tags for data in responses[tag]]
         if self.debug:
-            for i, value in enumerate(datas):
-                print("read {:08x} @ {:08x}".format(value, addr + 4*i))
+            i = 0
+            for addr, length, burst in bursts:
+                for j in range(length):
+                    print("read {:08x} @ {:08x}".format(datas[i], addr + 4*(burst == "incr")*j))
+                    i += 1
+        return datas
+
+    def read(self, addr, length=None, burst="incr"):
+        length_int = 1 if length is None else length
+        datas = self.read_bursts([(addr, length_int, burst)])
         return datas[0] if length is None else datas
 
+    # Writes ---------------------------------------------------------------------------------------
+
     def write(self, addr, datas):
         datas = datas if isinstance(datas, list) else [datas]
-        length = len(datas)
-        record = EtherboneRecord()
-        record.writes = EtherboneWrites(base_addr=addr, datas=iter(datas))
-        record.wcount = len(record.writes)
-
-        packet = EtherbonePacket()
-        packet.records = [record]
-        packet.encode()
-        self.socket.sendto(bytes(packet), (self.server, self.port))
+        # Split writes in records of up to 255 words (and fitting in a datagram).
+        max_length = min(255, (self.max_records_bytes - self._record_size(0))//4)
+        records = []
+        for i in range(0, len(datas), max_length):
+            record = EtherboneRecord()
+            record.writes = EtherboneWrites(base_addr=addr + 4*i, datas=datas[i:i + max_length])
+            record.wcount = len(record.writes)
+            records.append((record, self._record_size(record.wcount)))
+        for datagram in self._pack(records):
+            self._send(self._encode(datagram))
 
         if self.debug:
             for i, value in enumerate(datas):
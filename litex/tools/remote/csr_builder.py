@@ -24,8 +24,139 @@ class CSRElements:
         raise AttributeError("No such element " + attr)
 
 
+class CSRBatchRead:
+    """Deferred read of a CSR batch, value is available once the batch has been flushed."""
+    def __init__(self, decode):
+        self.decode = decode
+        self.done   = False
+
+    def set(self, datas):
+        self._value = self.decode(datas)
+        self.done   = True
+
+    @property
+    def value(self):
+        if not self.done:
+            raise ValueError("CSR batch read not yet done, value only available after the batch")
+        return self._value
+
+    def __int__(self):
+        return self.value
+
+    def __index__(self):
+        return self.value
+
+    def __repr__(self):
+        return "CSRBatchRead({})".format(hex(self._value) if self.done else "pending")
+
+
+class CSRBatch:
+    """Collect CSR accesses and issue them as merged bus requests.
+
+    Accesses done in the batch context are queued and issued when the (outermost) context exits:
+    program order is preserved by splitting the accesses in segments of writes followed by reads.
+    Contiguous writes of a segment are merged in a single write and its reads are issued in a
+    single request (comm's read_many when available, otherwise merged in contiguous bursts), so a
+    segment costs a single roundtrip.
+    """
+    def __init__(self, readfn, writefn, readmanyfn=None, max_length=255):
+        self.readfn     = readfn
+        self.writefn    = writefn
+        self.readmanyfn = readmanyfn
+        self.max_length = max_length
+        self.ops        = None
+        self.registers  = None # Registers written in the batch (shadow values).
+        self.depth      = 0
+
+    @property
+    def active(self):
+        return self.ops is not None
+
+    def __enter__(self):
+        if self.depth == 0:
+            self.ops       = []
+            self.registers = []
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.depth -= 1
+        if self.depth == 0:
+            ops, self.ops = self.ops, None
+            registers, self.registers = self.registers, None
+            # Don't issue accesses of a batch that raised: invalidate the shadow values of the
+            # dropped writes (also when the accesses failed).
+            try:
+                if exc_type is None:
+                    self.flush(ops)
+                    return
+            except:
+                for register in registers:
+                    register.invalidate()
+                raise
+            for register in registers:
+                register.invalidate()
+
+    def read(self, addr, length, decode):
+        result = CSRBatchRead(decode)
+        self.ops.append(("r", addr, length, result))
+        return result
+
+    def write(self, addr, datas, register=None):
+        self.ops.append(("w", addr, datas))
+        if register is not None:
+            self.registers.append(register)
+
+    def get_segments(self, ops):
+        segments = []
+        writes, reads = [], []
+        for op in ops:
+            if op[0] == "w" and len(reads):
+                segments.append((writes, reads))
+                writes, reads = [], []
+            (writes if op[0] == "w" else reads).append(op)
+        if len(writes) or len(reads):
+            segments.append((writes, reads))
+        return segments
+
+    def flush(self, ops):
+        for writes, reads in self.get_segments(ops):
+            # Merge contiguous writes.
+            merged = []
+            for _, addr, datas in writes:
+                if len(merged):
+                    base, base_datas = merged[-1]
+                    if ((addr == base + 4*len(base_datas)) and
+                        (len(base_datas) + len(datas) <= self.max_length)):
+                        base_datas += datas
+                        continue
+                merged.append((addr, list(datas)))
+            for addr, datas in merged:
+                self.writefn(addr, datas)
+
+            # Issue reads.
+            if not len(reads):
+                continue
+            addrs = [addr + 4*i for _, addr, length, _ in reads for i in range(length)]
+            if self.readmanyfn is not None:
+                datas = list(self.readmanyfn(addrs))
+            else:
+                datas = []
+                base, length = addrs[0], 1
+                for addr in addrs[1:]:
+                    if (addr == base + 4*length) and (length < self.max_length):
+                        length += 1
+                    else:
+                        datas += self.readfn(base, length=length)
+                        base, length = addr, 1
+                datas += self.readfn(base, length=length)
+            for _, addr, length, result in reads:
+                result.set(datas[:length])
+                datas = datas[length:]
+
+
 class CSRRegister:
-    def __init__(self, readfn, writefn, name, addr, length, data_width, mode):
+    def __init__(self, readfn, writefn, name, addr, length, data_width, mode, batch=None, shadow=False):
         self.readfn = readfn
         self.writefn = writefn
         self.name = name
@@ -33,11 +164,13 @@ class CSRRegister:
         self.length = length
         self.data_width = data_width
         self.mode = mode
+        self.batch = batch
+        # Write-through shadow cache, only valid for registers not modified by the hardware
+        # (CSRStorage without write_from_dev).
+        self.shadow = shadow
+        self.shadow_value = None
 
-    def read(self):
-        if self.mode not in ["rw", "ro"]:
-            raise KeyError(self.name + "register not readable")
-        datas = self.readfn(self.addr, length=self.length)
+    def decode(self, datas):
         if isinstance(datas, int):
             return datas
         else:
@@ -47,13 +180,66 @@ class CSRRegister:
                 data |= datas[i]
             return data
 
+    def read(self, cached=None):
+        cached = self.shadow if cached is None else cached
+        if cached and self.shadow_value is not None:
+            if self.batch is not None and self.batch.active:
+                result = CSRBatchRead(self.decode)
+                result.set(self.shadow_value)
+                return result
+            return self.shadow_value
+        if self.mode not in ["rw", "ro"]:
+            raise KeyError(self.name + "register not readable")
+        if self.batch is not None and self.batch.active:
+            return self.batch.read(self.addr, self.length, self.decode)
+        value = self.decode(self.readfn(self.addr, length=self.length))
+        if self.shadow and self.mode == "rw":
+            self.shadow_value = value
+        return value
+
     def write(self, value):
         if self.mode not in ["rw", "wo"]:
             raise KeyError(self.name + "register not writable")
         datas = []
         for i in range(self.length):
             datas.append((value >> ((self.length-1-i)*self.data_width)) & (2**self.data_width-1))
-        self.writefn(self.addr, datas)
+        if self.shadow:
+            self.shadow_value = value
+        if self.batch is not None and self.batch.active:
+            self.batch.write(self.addr, datas, register=self if self.shadow else None)
+        else:
+            self.writefn(self.addr, datas)
+
+    def update(self, value, mask):
+        """Read-modify-write of the bits set in mask (read served by the shadow cache if valid)."""
+        if self.shadow and self.shadow_value is not None:
+            current = self.shadow_value
+        elif self.batch is not None and self.batch.active:
+            raise ValueError(self.name + " register read-modify-write requires a valid shadow value in a batch")
+        else:
+            current = self.read(cached=False)
+        self.write((current & ~mask) | (value & mask))
+
+    def invalidate(self):
+        self.shadow_value = None
+
+
+class CSRRegisters(CSRElements):
+    __slots__ = ["_batch"] # Keep batch out of __dict__ (registers only).
+
+    def __init__(self, d, batch):
+        CSRElements.__init__(self, d)
+        self._batch = batch
+
+    def batch(self):
+        """Batch context: ``with regs.batch(): ...`` issues the accesses as merged bus requests."""
+        return self._batch
+
+    def invalidate(self):
+        """Invalidate shadow values (ex: after a reset of the SoC)."""
+        for reg in self.d.values():
+            if isinstance(reg, CSRRegister):
+                reg.invalidate()
 
 
 class CSRMemoryRegion:
@@ -63,7 +249,7 @@ class CSRMemoryRegion:
         self.type = type
 
 class CSRBuilder:
-    def __init__(self, comm, csr_csv, csr_data_width=None):
+    def __init__(self, comm, csr_csv, csr_data_width=None, csr_shadow=False):
         self.items = self.get_csr_items(csr_csv)
         self.constants = self.build_constants()
 
@@ -79,7 +265,8 @@ class CSRBuilder:
 
         self.csr_data_width = csr_data_width
         self.bases = self.build_bases()
-        self.regs = self.build_registers(comm.read, comm.write)
+        self.csr_batch = CSRBatch(comm.read, comm.write, getattr(comm, "read_many", None))
+        self.regs = self.build_registers(comm.read, comm.write, self.csr_batch, csr_shadow)
         self.mems = self.build_memories()
 
     @staticmethod
@@ -94,15 +281,17 @@ class CSRBuilder:
                 d[name] = int(addr.replace("0x", ""), 16)
         return CSRElements(d)
 
-    def build_registers(self, readfn, writefn):
+    def build_registers(self, readfn, writefn, batch=None, shadow=False):
         d = {}
         for item in self.items:
             group, name, addr, length, mode = item
             if group == "csr_register":
                 addr = int(addr.replace("0x", ""), 16)
                 length = int(length)
-                d[name] = CSRRegister(readfn, writefn, name, addr, length, self.csr_data_width, mode)
-        return CSRElements(d)
+                d[name] = CSRRegister(readfn, writefn, name, addr, length, self.csr_data_width, mode,
+                    batch  = batch,
+                    shadow = shadow)
+        return CSRRegisters(d, batch)
 
     def build_constants(self):
         d = {}
@@ -5,8 +5,10 @@
 # Copyright (c) 2017 Tim Ansell <mithro@mithis.com>
 # SPDX-License-Identifier: BSD-2-Clause
 
+import sys
 import math
 import struct
+from array import array
 
 from litex.soc.interconnect.packet import HeaderField, Header
 
@@ -65,12 +67,58 @@ def get_field_data(field, datas):
     return (v >> field.offset) & (2**field.width-1)
 
 
-class Packet(list):
+# Codec helpers ------------------------------------------------------------------------------------
+
+# Etherbone datas/addresses are 32-bit big endian words: use an array of 32-bit unsigned integers
+# and swap them on little endian hosts.
+_word_typecode = "I" if array("I").itemsize == 4 else "L"
+_word_swap     = (sys.byteorder == "little")
+
+def words_to_bytes(words):
+    """Encode a list/array of 32-bit words to big endian bytes."""
+    if not isinstance(words, array) or words.typecode != _word_typecode:
+        words = array(_word_typecode, words)
+    if _word_swap:
+        words = array(_word_typecode, words)
+        words.byteswap()
+    return words.tobytes()
+
+def bytes_to_words(buf, offset=0, count=None):
+    """Decode big endian bytes (from offset, count words) to an array of 32-bit words."""
+    buf = memoryview(buf)
+    if count is None:
+        count = (len(buf) - offset)//4
+    words = array(_word_typecode)
+    words.frombytes(buf[offset:offset + 4*count])
+    if _word_swap:
+        words.byteswap()
+    return words
+
+def _field_shift(header, field):
+    return 8*(header.length - field.byte - math.ceil(field.width/8)) + field.offset
+
+def _encode_header(header, obj):
+    value = 0
+    for k, v in header.fields.items():
+        value |= (getattr(obj, k) & (2**v.width - 1)) << _field_shift(header, v)
+    return value.to_bytes(header.length, "big")
+
+def _decode_header(header, obj, buf, offset=0):
+    value = int.from_bytes(buf[offset:offset + header.length], "big")
+    for k, v in header.fields.items():
+        setattr(obj, k, (value >> _field_shift(header, v)) & (2**v.width - 1))
+
+# Etherbone Packets --------------------------------------------------------------------------------
+
+class Packet(bytearray):
+    """Encoded packet bytes (a bytearray: can be sent/sliced/iterated as before)."""
     def __init__(self, init=[]):
+        bytearray.__init__(self, init)
         self.ongoing = False
         self.done = False
-        for data in init:
-            self.append(data)
+
+    def __str__(self):
+        return self.__repr__()
 
 
 class EtherboneWrite:
@@ -90,46 +138,47 @@ class EtherboneRead:
 
 
 class EtherboneWrites(Packet):
+    """Etherbone writes (base address + datas); datas are stored in an array of 32-bit words."""
     def __init__(self, init=[], base_addr=0, datas=[]):
         Packet.__init__(self, init)
         self.base_addr = base_addr
-        self.writes = []
-        self.encoded = init != []
-        for data in datas:
-            self.add(EtherboneWrite(data))
+        self.datas = array(_word_typecode, datas)
+        self.encoded = len(init) != 0
+
+    @property
+    def writes(self):
+        # Read-only view (tuple): use add() or assign a list of EtherboneWrite to modify.
+        return tuple(EtherboneWrite(data) for data in self.datas)
+
+    @writes.setter
+    def writes(self, writes):
+        self.datas = array(_word_typecode, [write.data for write in writes])
 
     def add(self, write):
-        self.writes.append(write)
+        self.datas.append(write.data)
 
     def get_datas(self):
-        datas = []
-        for write in self.writes:
-            datas.append(write.data)
-        return datas
+        return self.datas.tolist()
+
+    def __len__(self):
+        """Number of words, encoded or not (the encoded size in bytes is 4*(len + 1))."""
+        return bytearray.__len__(self)//4 - 1 if self.encoded else len(self.datas)
 
     def encode(self):
         if self.encoded:
             raise ValueError
-        for byte in split_bytes(self.base_addr, 4):
-            self.append(byte)
-        for write in self.writes:
-            for byte in split_bytes(write.data, 4):
-                self.append(byte)
+        self[:] = self.base_addr.to_bytes(4, "big") + words_to_bytes(self.datas)
         self.encoded = True
 
-    def decode(self):
-        if not self.encoded:
-            raise ValueError
-        base_addr = []
-        for i in range(4):
-            base_addr.append(self.pop(0))
-        self.base_addr = merge_bytes(base_addr)
-        self.writes = []
-        while len(self) != 0:
-            write = []
-            for i in range(4):
-                write.append(self.pop(0))
-            self.writes.append(EtherboneWrite(merge_bytes(write)))
+    def decode(self, buf=None, offset=0, count=None):
+        if buf is None:
+            if not self.encoded:
+                raise ValueError
+            buf = self
+        self.base_addr, = struct.unpack_from(">I", buf, offset)
+        self.datas = bytes_to_words(buf, offset + 4, count)
+        if buf is self:
+            del self[:]
         self.encoded = False
 
     def __repr__(self):
@@ -142,46 +191,48 @@ class EtherboneWrites(Packet):
 
 
 class EtherboneReads(Packet):
+    """Etherbone reads (base return address + addresses); addresses are stored in an array of
+    32-bit words."""
     def __init__(self, init=[], base_ret_addr=0, addrs=[]):
         Packet.__init__(self, init)
         self.base_ret_addr = base_ret_addr
-        self.reads = []
-        self.encoded = init != []
-        for addr in addrs:
-            self.add(EtherboneRead(addr))
+        self.addrs = array(_word_typecode, addrs)
+        self.encoded = len(init) != 0
+
+    @property
+    def reads(self):
+        # Read-only view (tuple): use add() or assign a list of EtherboneRead to modify.
+        return tuple(EtherboneRead(addr) for addr in self.addrs)
+
+    @reads.setter
+    def reads(self, reads):
+        self.addrs = array(_word_typecode, [read.addr for read in reads])
 
     def add(self, read):
-        self.reads.append(read)
+        self.addrs.append(read.addr)
 
     def get_addrs(self):
-        addrs = []
-        for read in self.reads:
-            addrs.append(read.addr)
-        return addrs
+        return self.addrs.tolist()
+
+    def __len__(self):
+        """Number of addresses, encoded or not (the encoded size in bytes is 4*(len + 1))."""
+        return bytearray.__len__(self)//4 - 1 if self.encoded else len(self.addrs)
 
     def encode(self):
         if self.encoded:
             raise ValueError
-        for byte in split_bytes(self.base_ret_addr, 4):
-            self.append(byte)
-        for read in self.reads:
-            for byte in split_bytes(read.addr, 4):
-                self.append(byte)
+        self[:] = self.base_ret_addr.to_bytes(4, "big") + words_to_bytes(self.addrs)
         self.encoded = True
 
-    def decode(self):
-        if not self.encoded:
-            raise ValueError
-        base_ret_addr = []
-        for i in range(4):
-            base_ret_addr.append(self.pop(0))
-        self.base_ret_addr = merge_bytes(base_ret_addr)
-        self.reads = []
-        while len(self) != 0:
-            read = []
-            for i in range(4):
-                read.append(self.pop(0))
-            self.reads.append(EtherboneRead(merge_bytes(read)))
+    def decode(self, buf=None, offset=0, count=None):
+        if buf is None:
+            if not self.encoded:
+                raise ValueError
+            buf = self
+        self.base_ret_addr, = struct.unpack_from(">I", buf, offset)
+        self.addrs = bytes_to_words(buf, offset + 4, count)
+        if buf is self:
+            del self[:]
         self.encoded = False
 
     def __repr__(self):
@@ -207,78 +258,58 @@ class EtherboneRecord(Packet):
         self.byte_enable = 0xf
         self.wcount = 0
         self.rcount = 0
-        self.encoded = init != []
-
+        self.encoded = len(init) != 0
 
-    def get_writes(self):
-        if self.wcount == 0:
-            return None
-        else:
-            writes = []
-            for i in range((self.wcount+1)*4):
-                writes.append(self.pop(0))
-            return EtherboneWrites(writes)
-
-    def get_reads(self):
-        if self.rcount == 0:
-            return None
-        else:
-            reads = []
-            for i in range((self.rcount+1)*4):
-                reads.append(self.pop(0))
-            return EtherboneReads(reads)
+    def decode_from(self, buf, offset=0):
+        """Decode record from buf at offset (without copy), return offset of the next record."""
+        _decode_header(etherbone_record_header, self, buf, offset)
+        offset += etherbone_record_header.length
+        self.writes = None
+        if self.wcount != 0:
+            self.writes = EtherboneWrites()
+            self.writes.decode(buf, offset, self.wcount)
+            offset += 4*(self.wcount + 1)
+        self.reads = None
+        if self.rcount != 0:
+            self.reads = EtherboneReads()
+            self.reads.decode(buf, offset, self.rcount)
+            offset += 4*(self.rcount + 1)
+        self.encoded = False
+        return offset
 
     def decode(self):
         if not self.encoded:
             raise ValueError
-        header = []
-        for byte in self[:etherbone_record_header.length]:
-            header.append(self.pop(0))
-        for k, v in sorted(etherbone_record_header.fields.items()):
-            setattr(self, k, get_field_data(v, header))
-        self.writes = self.get_writes()
-        if self.writes is not None:
-            self.writes.decode()
-        self.reads = self.get_reads()
-        if self.reads is not None:
-            self.reads.decode()
-        self.encoded = False
+        offset = self.decode_from(self)
+        # Keep remaining bytes (next records).
+        del self[:offset]
 
     def set_writes(self, writes):
-        self.wcount = len(writes.writes)
+        self.wcount = len(writes.datas)
         writes.encode()
-        for byte in writes:
-            self.append(byte)
+        self += writes
 
     def set_reads(self, reads):
-        self.rcount = len(reads.reads)
+        self.rcount = len(reads.addrs)
         reads.encode()
-        for byte in reads:
-            self.append(byte)
+        self += reads
 
     def encode(self):
         if self.encoded:
             raise ValueError
+        del self[:]
         if self.writes is not None:
             self.set_writes(self.writes)
         if self.reads is not None:
             self.set_reads(self.reads)
-        header = 0
-        for k, v in sorted(etherbone_record_header.fields.items()):
-            value = merge_bytes(split_bytes(getattr(self, k),
-                                            math.ceil(v.width/8)),
-                                            "little")
-            header += (value << v.offset+(v.byte*8))
-        for d in split_bytes(header, etherbone_record_header.length):
-            self.insert(0, d)
+        self[:0] = _encode_header(etherbone_record_header, self)
         self.encoded = True
 
     def __repr__(self, n=0):
         r = "Record {}\n".format(n)
         r += "--------\n"
         if self.encoded:
-            for d in self:
-                r += "{:02x}".format(d)
+            r += self.hex()
         else:
             for k in sorted(etherbone_record_header.fields.keys()):
                 r += k + " : 0x{:0x}\n".format(getattr(self, k))
@@ -292,7 +323,7 @@ class EtherboneRecord(Packet):
 class EtherbonePacket(Packet):
     def __init__(self, init=[]):
         Packet.__init__(self, init)
-        self.encoded = init != []
+        self.encoded = len(init) != 0
         self.records = []
 
         self.magic = etherbone_magic
@@ -303,52 +334,42 @@ class EtherbonePacket(Packet):
         self.pr = 0
         self.pf = 0
 
-    def get_records(self):
+    def get_records(self, offset=etherbone_packet_header_length):
         records = []
-        done = False
-        payload = self
-        while len(payload) != 0:
-            record = EtherboneRecord(payload)
-            record.decode()
+        buf = memoryview(self)
+        while offset < len(buf):
+            record = EtherboneRecord()
+            offset = record.decode_from(buf, offset)
             records.append(record)
-            payload = record[:]
+        buf.release()
         return records
 
     def decode(self):
         if not self.encoded:
             raise ValueError
-        header = []
-        for byte in self[:etherbone_packet_header.length]:
-            header.append(self.pop(0))
-        for k, v in sorted(etherbone_packet_header.fields.items()):
-            setattr(self, k, get_field_data(v, header))
+        _decode_header(etherbone_packet_header, self, self)
         self.records = self.get_records()
+        del self[:]
         self.encoded = False
 
     def set_records(self, records):
         for record in records:
             record.encode()
-            for byte in record:
-                self.append(byte)
+            self += record
 
     def encode(self):
         if self.encoded:
             raise ValueError
+        del self[:]
+        self += _encode_header(etherbone_packet_header, self)
         self.set_records(self.records)
-        header = 0
-        for k, v in sorted(etherbone_packet_header.fields.items()):
-            value = merge_bytes(split_bytes(getattr(self, k), math.ceil(v.width/8)), "little")
-            header += (value << v.offset+(v.byte*8))
-        for d in split_bytes(header, etherbone_packet_header.length):
-            self.insert(0, d)
         self.encoded = True
 
     def __repr__(self):
         r = "Packet\n"
         r += "--------\n"
         if self.encoded:
-            for d in self:
-                r += "{:02x}".format(d)
+            r += self.hex()
         else:
             for k in sorted(etherbone_packet_header.fields.keys()):
                 r += k + " : 0x{:0x}\n".format(getattr(self, k))
@@ -359,24 +380,26 @@ class EtherbonePacket(Packet):
 
 class EtherboneIPC:
     def send_packet(self, socket, packet):
-        socket.sendall(bytes(packet))
+        socket.sendall(packet)
+
+    def _receive_into(self, socket, buf):
+        view = memoryview(buf)
+        while len(view):
+            n = socket.recv_into(view)
+            if n == 0:
+                return False
+            view = view[n:]
+        return True
 
     def receive_packet(self, socket):
         header_length = etherbone_packet_header_length + etherbone_record_header_length
-        packet = bytes()
-        while len(packet) < header_length:
-            chunk = socket.recv(header_length - len(packet))
-            if len(chunk) == 0:
-                return 0
-            else:
-                packet += chunk
-        wcount, rcount = struct.unpack(">BB", packet[header_length-2:])
+        header = bytearray(header_length)
+        if not self._receive_into(socket, header):
+            return 0
+        wcount, rcount = struct.unpack_from(">BB", header, header_length-2)
         counts = wcount + rcount
-        packet_size = header_length + 4*(counts + 1)
-        while len(packet) < packet_size:
-            chunk = socket.recv(packet_size - len(packet))
-            if len(chunk) == 0:
-                return 0
-            else:
-                packet += chunk
+        packet = bytearray(header_length + 4*(counts + 1))
+        packet[:header_length] = header
+        if not self._receive_into(socket, memoryview(packet)[header_length:]):
+            return 0
         return packet
@@ -10,6 +10,7 @@ from migen import *
 
 from litex.soc.interconnect import csr
 from litex.soc.interconnect import csr_bus
+from litex.soc.interconnect import wishbone
 
 
 def csr32_write(dut, adr, dat):
@@ -60,6 +61,69 @@ class CSRDUT(Module):
         self.submodules.csrcon = csr_bus.Interconnect(
             self.csr, self.csrbankarray.get_buses())
 
+class Wishbone2CSRDUT(Module):
+    def address_map(self, name, memory):
+            return {"csrmodule": 0}[name]
+
+    def __init__(self, bridge="registered", csr_data_width=8):
+        self.wb = wishbone.Interface()
+        bus_csr = csr_bus.Interface(data_width=csr_data_width)
+        self.submodules.csrmodule = CSRModule()
+        self.submodules.csrbankarray = csr_bus.CSRBankArray(
+            self, self.address_map, data_width=csr_data_width)
+        self.submodules.csrcon = csr_bus.Interconnect(
+            bus_csr, self.csrbankarray.get_buses())
+        self.submodules.bridge = {
+            "registered":    lambda: wishbone.Wishbone2CSR(self.wb, bus_csr, register=True),
+            "combinatorial": lambda: wishbone.Wishbone2CSR(self.wb, bus_csr, register=False),
+            "pipelined":     lambda: wishbone.Wishbone2CSRPipelined(self.wb, bus_csr),
+        }[bridge]()
+        self.cycles = Signal(32)
+        self.sync += self.cycles.eq(self.cycles + 1)
+
+
+class CSRTreeDUT(Module):
+    def __init__(self, n=8, depth=0, bridge="registered"):
+        self.wb = wishbone.Interface()
+        bus_csr = csr_bus.Interface()
+        for i in range(n):
+            setattr(self.submodules, "csrmodule{}".format(i), CSRModule())
+        self.submodules.csrbankarray = csr_bus.CSRBankArray(
+            self, lambda name, memory: int(name[len("csrmodule"):]), decode=(depth == 0))
+        if depth:
+            self.submodules.csrcon = csr_bus.InterconnectTree(
+                bus_csr, self.csrbankarray.get_slaves(), depth=depth)
+            latency = self.csrcon.latency
+        else:
+            self.submodules.csrcon = csr_bus.Interconnect(
+                bus_csr, self.csrbankarray.get_buses())
+            latency = 1
+        self.submodules.bridge = {
+            "registered": lambda: wishbone.Wishbone2CSR(self.wb, bus_csr, register=True, latency=latency),
+            "pipelined":  lambda: wishbone.Wishbone2CSRPipelined(self.wb, bus_csr, latency=latency),
+        }[bridge]()
+        self.cycles = Signal(32)
+        self.sync += self.cycles.eq(self.cycles + 1)
+
+
+def wb_burst_read(bus, adr, n):
+    datas = []
+    yield bus.cyc.eq(1)
+    yield bus.stb.eq(1)
+    yield bus.we.eq(0)
+    for i in range(n):
+        yield bus.adr.eq(adr + i)
+        yield bus.cti.eq(0b111 if i == (n - 1) else 0b010)
+        yield
+        while not (yield bus.ack):
+            yield
+        datas.append((yield bus.dat_r))
+    yield bus.cyc.eq(0)
+    yield bus.stb.eq(0)
+    yield bus.cti.eq(0)
+    return datas
+
+
 class TestCSR(unittest.TestCase):
     def test_csr_storage(self):
         def generator(dut):
@@ -125,3 +189,166 @@ class TestCSR(unittest.TestCase):
                 ]
         dut = DUT()
         run_simulation(dut, generator(dut))
+
+    def test_wishbone2csr(self):
+        def generator(dut):
+            # check init values
+            for adr in [1, 5]:
+                dat = 0
+                for i in range(4):
+                    dat |= (yield from dut.wb.read(adr + 3 - i)) << 8*i
+                self.assertEqual(dat, 0x12345678)
+
+            # check writes
+            for i in range(4):
+                yield from dut.wb.write(1 + 3 - i, (0x5a5a5a5a >> 8*i) & 0xff)
+            datas = yield from wb_burst_read(dut.wb, 1, 4)
+            self.assertEqual(datas, [0x5a]*4)
+
+            # check update from dev
+            yield from dut.wb.write(0, 1)
+            yield from dut.wb.write(0, 1)
+            datas = yield from wb_burst_read(dut.wb, 5, 4)
+            self.assertEqual(datas, [0xde, 0xad, 0xbe, 0xef])
+
+        for bridge in ["registered", "combinatorial", "pipelined"]:
+            with self.subTest(bridge=bridge):
+                dut = Wishbone2CSRDUT(bridge)
+                run_simulation(dut, generator(dut))
+
+    def test_wishbone2csr_cycles(self):
+        # Benchmark: cycles per CSR read (single accesses and 4-word CSR burst read).
+        def generator(dut, results, n=16):
+            start = (yield dut.cycles)
+            for i in range(n):
+                yield from dut.wb.read(5 + i%4)
+            single = ((yield dut.cycles) - start)/n
+            start = (yield dut.cycles)
+            for i in range(n//4):
+                yield from wb_burst_read(dut.wb, 5, 4)
+            burst = ((yield dut.cycles) - start)/n
+            results[dut.bridge_name] = (single, burst)
+
+        results = {}
+        for bridge in ["registered", "combinatorial", "pipelined"]:
+            dut = Wishbone2CSRDUT(bridge)
+            dut.bridge_name = bridge
+            run_simulation(dut, generator(dut, results))
+        self.assertLess(results["pipelined"][0], results["registered"][0])
+        self.assertLessEqual(results["pipelined"][0], results["combinatorial"][0])
+        self.assertLess(results["pipelined"][1], results["combinatorial"][1])
+        # Bursts should be sustained at ~1 cycle per CSR word.
+        self.assertLess(results["pipelined"][1], 1.5)
+
+    def test_csr_interconnect_tree(self):
+        # Banks are 0x200 words apart (0x800 bytes paging, 32-bit SoC bus).
+        def generator(dut, results, n=8):
+            # check init values
+            for bank in range(n):
+                datas = yield from wb_burst_read(dut.wb, bank*0x200 + 1, 4)
+                self.assertEqual(datas, [0x12, 0x34, 0x56, 0x78])
+
+            # check writes: each bank gets a different value, others are not affected
+            for bank in range(n):
+                yield from dut.wb.write(bank*0x200 + 4, bank)
+            for bank in range(n):
+                self.assertEqual((yield from dut.wb.read(bank*0x200 + 4)), bank)
+
+            # check update from dev
+            yield from dut.wb.write(3*0x200, 1)
+            yield from dut.wb.write(3*0x200, 1)
+            datas = yield from wb_burst_read(dut.wb, 3*0x200 + 5, 4)
+            self.assertEqual(datas, [0xde, 0xad, 0xbe, 0xef])
+            datas = yield from wb_burst_read(dut.wb, 2*0x200 + 5, 4)
+            self.assertEqual(datas, [0x12, 0x34, 0x56, 0x78])
+
+            # cycles per CSR read
+            start = (yield dut.cycles)
+            for bank in range(n):
+                yield from dut.wb.read(bank*0x200 + 4)
+            results[(dut.depth, dut.bridge_name)] = ((yield dut.cycles) - start)/n
+
+        results = {}
+        for depth in [0, 1, 2]:
+            for bridge in ["registered", "pipelined"]:
+                with self.subTest(depth=depth, bridge=bridge):
+                    dut = CSRTreeDUT(n=16, depth=depth, bridge=bridge)
+                    dut.depth       = depth
+                    dut.bridge_name = bridge
+                    run_simulation(dut, generator(dut, results, n=16))
+
+        # Each tree node drives a fraction of the banks, at the cost of 2 cycles per level.
+        for depth in [1, 2]:
+            dut = CSRTreeDUT(n=16, depth=depth)
+            self.assertLess(dut.csrcon.fanout, 16)
+            for bridge in ["registered", "pipelined"]:
+                self.assertEqual(results[(depth, bridge)] - results[(0, bridge)], 2*depth)
+
+    def test_csr_status_atomic_read(self):
+        def generator(dut, atomic_read):
+            # All bytes of the counter are equal on a coherent snapshot.
+            for i in range(4):
+                dat = 0
+                for i in range(8):
+                    dat <<= 8
+                    dat |= (yield from dut.wb.read(0x200 + i))
+                coherent = (len(set(dat.to_bytes(8, "little"))) == 1)
+                if atomic_read:
+                    self.assertTrue(coherent)
+                else:
+                    self.assertFalse(coherent)
+
+        class CounterModule(Module, csr.AutoCSR):
+            def __init__(self, atomic_read):
+                self._counter = csr.CSRStatus(64, atomic_read=atomic_read)
+                self.sync += self._counter.status.eq(self._counter.status + 0x0101010101010101)
+
+        class DUT(Module):
+            def address_map(self, name, memory):
+                return {"countermodule": 1}[name]
+
+            def __init__(self, atomic_read):
+                self.wb  = wishbone.Interface()
+                self.csr = csr_bus.Interface()
+                self.submodules.countermodule = CounterModule(atomic_read)
+                self.submodules.csrbankarray = csr_bus.CSRBankArray(
+                    self, self.address_map)
+                self.submodules.csrcon = csr_bus.Interconnect(
+                    self.csr, self.csrbankarray.get_buses())
+                self.submodules.bridge = wishbone.Wishbone2CSR(self.wb, self.csr)
+
+        for atomic_read in [False, True]:
+            with self.subTest(atomic_read=atomic_read):
+                dut = DUT(atomic_read)
+                run_simulation(dut, generator(dut, atomic_read))
+
+    def test_csr_64bit(self):
+        def generator(dut):
+            # Full-width registers are accessed in a single access.
+            self.assertEqual((yield from dut.csr.read(0)), 0x0123456789abcdef)
+            yield from dut.csr.write(0, 0xfedcba9876543210)
+            self.assertEqual((yield from dut.csr.read(0)), 0xfedcba9876543210)
+            yield
+            self.assertEqual((yield from dut.csr.read(1)), 0xfedcba9876543210)
+
+        class CSR64Module(Module, csr.AutoCSR):
+            def __init__(self):
+                self._storage = csr.CSRStorage(64, reset=0x0123456789abcdef)
+                self._status  = csr.CSRStatus(64)
+                self.comb += self._status.status.eq(self._storage.storage)
+
+        class DUT(Module):
+            def address_map(self, name, memory):
+                return {"csrmodule": 0}[name]
+
+            def __init__(self):
+                self.csr = csr_bus.Interface(data_width=64)
+                self.submodules.csrmodule = CSR64Module()
+                self.submodules.csrbankarray = csr_bus.CSRBankArray(
+                    self, self.address_map, data_width=64, soc_bus_data_width=64)
+                self.submodules.csrcon = csr_bus.Interconnect(
+                    self.csr, self.csrbankarray.get_buses())
+
+        dut = DUT()
+        self.assertEqual(len(dut.csrbankarray.get_rmaps()[0].simple_csrs), 2)
+        run_simulation(dut, generator(dut))
@@ -0,0 +1,135 @@
+#
+# This file is part of LiteX.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import tempfile
+import unittest
+
+from litex.tools.remote.csr_builder import CSRBuilder
+
+
+csr_csv = """\
+csr_base,ctrl,0x82000000,,
+csr_register,ctrl_reset,0x82000000,1,rw
+csr_register,ctrl_scratch,0x82000004,4,rw
+csr_register,ctrl_bus_errors,0x82000014,4,ro
+csr_register,leds_out,0x82000800,1,wo
+constant,config_csr_data_width,8,,
+"""
+
+
+class CommDummy:
+    def __init__(self, with_read_many=False):
+        self.mem      = {}
+        self.requests = []
+        if with_read_many:
+            self.read_many = self._read_many
+
+    def read(self, addr, length=None, burst="incr"):
+        self.requests.append(("read", addr, length))
+        datas = [self.mem.get(addr + 4*i, 0) for i in range(1 if length is None else length)]
+        return datas[0] if length is None else datas
+
+    def _read_many(self, addrs):
+        self.requests.append(("read_many", addrs))
+        return [self.mem.get(addr, 0) for addr in addrs]
+
+    def write(self, addr, datas):
+        self.requests.append(("write", addr, len(datas)))
+        for i, data in enumerate(datas):
+            self.mem[addr + 4*i] = data
+
+
+class TestCSRBuilder(unittest.TestCase):
+    def setUp(self):
+        f = tempfile.NamedTemporaryFile(mode="w", suffix=".csv", delete=False)
+        f.write(csr_csv)
+        f.close()
+        self.csr_csv = f.name
+
+    def tearDown(self):
+        os.remove(self.csr_csv)
+
+    def test_register_access(self):
+        comm = CommDummy()
+        csrs = CSRBuilder(comm, self.csr_csv)
+        csrs.regs.ctrl_scratch.write(0x12345678)
+        self.assertEqual(csrs.regs.ctrl_scratch.read(), 0x12345678)
+        self.assertEqual(len(comm.requests), 2)
+        with self.assertRaises(KeyError):
+            csrs.regs.leds_out.read()
+
+    def test_batch(self):
+        for with_read_many in [False, True]:
+            with self.subTest(with_read_many=with_read_many):
+                comm = CommDummy(with_read_many)
+                csrs = CSRBuilder(comm, self.csr_csv)
+                comm.mem.update({0x82000014 + 4*i: i + 1 for i in range(4)})
+                with csrs.regs.batch():
+                    csrs.regs.ctrl_reset.write(1)
+                    csrs.regs.ctrl_scratch.write(0xdeadbeef)
+                    scratch = csrs.regs.ctrl_scratch.read()
+                    errors  = csrs.regs.ctrl_bus_errors.read()
+                    self.assertEqual(len(comm.requests), 0)
+                    with self.assertRaises(ValueError):
+                        scratch.value
+                # Writes merged in a single write, reads in a single request.
+                self.assertEqual(comm.requests[0], ("write", 0x82000000, 5))
+                self.assertEqual(len(comm.requests), 2)
+                self.assertEqual(scratch.value, 0xdeadbeef)
+                self.assertEqual(int(errors), 0x01020304)
+
+    def test_batch_ordering(self):
+        comm = CommDummy(with_read_many=True)
+        csrs = CSRBuilder(comm, self.csr_csv)
+        with csrs.regs.batch():
+            csrs.regs.ctrl_scratch.write(1)
+            first  = csrs.regs.ctrl_scratch.read()
+            csrs.regs.ctrl_scratch.write(2)
+            second = csrs.regs.ctrl_scratch.read()
+        self.assertEqual(first.value, 1)
+        self.assertEqual(second.value, 2)
+        self.assertEqual(len(comm.requests), 4)
+
+    def test_batch_error(self):
+        comm = CommDummy()
+        csrs = CSRBuilder(comm, self.csr_csv)
+        with self.assertRaises(RuntimeError):
+            with csrs.regs.batch():
+                csrs.regs.ctrl_scratch.write(1)
+                raise RuntimeError
+        self.assertEqual(len(comm.requests), 0)
+
+    def test_batch_error_shadow(self):
+        comm = CommDummy()
+        csrs = CSRBuilder(comm, self.csr_csv, csr_shadow=True)
+        csrs.regs.leds_out.write(0x0f)
+        with self.assertRaises(RuntimeError):
+            with csrs.regs.batch():
+                csrs.regs.leds_out.update(0xa0, mask=0xf0)
+                raise RuntimeError
+        # Dropped write: shadow value invalidated.
+        self.assertEqual(comm.mem[0x82000800], 0x0f)
+        self.assertIsNone(csrs.regs.leds_out.shadow_value)
+        self.assertEqual(len(comm.requests), 1)
+
+    def test_shadow(self):
+        comm = CommDummy()
+        csrs = CSRBuilder(comm, self.csr_csv, csr_shadow=True)
+        csrs.regs.leds_out.write(0x0f)
+        csrs.regs.leds_out.update(0xa0, mask=0xf0)
+        self.assertEqual(comm.mem[0x82000800], 0xaf)
+        self.assertEqual(csrs.regs.leds_out.read(), 0xaf)
+        # Read-modify-write without read.
+        self.assertEqual([r[0] for r in comm.requests], ["write", "write"])
+        # Invalidated shadow: read from hardware.
+        csrs.regs.invalidate()
+        csrs.regs.ctrl_scratch.update(0x5a, mask=0xff)
+        self.assertEqual([r[0] for r in comm.requests], ["write", "write", "read", "write"])
+        self.assertEqual(csrs.regs.ctrl_scratch.read(cached=False), 0x5a)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,394 @@
+#
+# This file is part of LiteX.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import unittest
+import random
+
+from migen import *
+
+from litex.soc.interconnect import wishbone
+from litex.soc.interconnect import axi
+from litex.soc.cores.dma import *
+
+
+def desc_generator(desc, segments):
+    for address, length in segments:
+        yield desc.valid.eq(1)
+        yield desc.address.eq(address)
+        yield desc.length.eq(length)
+        yield desc.last.eq(1)
+        yield
+        while not (yield desc.ready):
+            yield
+        yield desc.valid.eq(0)
+
+
+def source_checker(source, datas, ready_rand=0, timeout=10000):
+    received = []
+    cycles   = 0
+    yield source.ready.eq(1)
+    while len(received) < len(datas):
+        if ready_rand:
+            yield source.ready.eq(random.randrange(100) >= ready_rand)
+        yield
+        cycles += 1
+        if (yield source.valid) and (yield source.ready):
+            received.append((yield source.data))
+        assert cycles < timeout
+    return received, cycles
+
+
+def sink_generator(sink, datas):
+    for data in datas:
+        yield sink.valid.eq(1)
+        yield sink.data.eq(data)
+        yield
+        while not (yield sink.ready):
+            yield
+    yield sink.valid.eq(0)
+
+
+class WishboneDMADUT(Module):
+    def __init__(self, dma_cls, mem_init=[], **kwargs):
+        self.submodules.sram = wishbone.SRAM(4*1024, init=mem_init)
+        self.submodules.dma  = dma_cls(self.sram.bus, endianness="big", **kwargs)
+
+
+class DescriptorRingDUT(Module):
+    def __init__(self, dma_cls, mem_init=[], **kwargs):
+        self.submodules.sram = wishbone.SRAM(4*1024, init=mem_init)
+        self.submodules.dma  = dma_cls(wishbone.Interface(), endianness="big", **kwargs)
+        self.submodules.ring = WishboneDMADescriptorRing(wishbone.Interface(), self.dma)
+        self.submodules.arbiter = wishbone.Arbiter([self.ring.bus, self.dma.bus], self.sram.bus)
+
+
+class AXIRAMModel:
+    """AXI slave model with a fixed read/write latency and multiple outstanding bursts."""
+    def __init__(self, bus, mem, latency=8):
+        self.bus     = bus
+        self.mem     = mem
+        self.latency = latency
+
+    @passive
+    def read_generator(self):
+        pending = []
+        beats   = []
+        cycle   = 0
+        yield self.bus.ar.ready.eq(1)
+        while True:
+            if (yield self.bus.ar.valid):
+                addr = (yield self.bus.ar.addr)
+                n    = (yield self.bus.ar.len) + 1
+                pending.append((cycle + self.latency, [(addr//4 + i, i == n - 1) for i in range(n)]))
+            while pending and pending[0][0] <= cycle:
+                beats += pending.pop(0)[1]
+            if (yield self.bus.r.valid) and (yield self.bus.r.ready):
+                beats.pop(0)
+            if beats:
+                yield self.bus.r.valid.eq(1)
+                yield self.bus.r.data.eq(self.mem.get(beats[0][0], 0))
+                yield self.bus.r.last.eq(beats[0][1])
+            else:
+                yield self.bus.r.valid.eq(0)
+            yield
+            cycle += 1
+
+    @passive
+    def write_generator(self):
+        bursts    = []
+        responses = []
+        cycle     = 0
+        yield self.bus.aw.ready.eq(1)
+        yield self.bus.w.ready.eq(1)
+        yield self.bus.b.ready.eq(0)
+        while True:
+            if (yield self.bus.aw.valid):
+                bursts.append([(yield self.bus.aw.addr)//4, (yield self.bus.aw.len) + 1])
+            if (yield self.bus.w.valid):
+                burst = bursts[0]
+                self.mem[burst[0]] = (yield self.bus.w.data)
+                burst[0] += 1
+                burst[1] -= 1
+                if (yield self.bus.w.last):
+                    assert burst[1] == 0
+                    bursts.pop(0)
+                    responses.append(cycle + self.latency)
+            if (yield self.bus.b.valid) and (yield self.bus.b.ready):
+                responses.pop(0)
+            yield self.bus.b.valid.eq(len(responses) > 0 and responses[0] <= cycle)
+            yield
+            cycle += 1
+
+
+class TestDMA(unittest.TestCase):
+    def test_wishbone_burst_reader_throughput(self):
+        length = 256
+        mem    = [random.randrange(2**32) for _ in range(1024)]
+
+        # Single accesses (WishboneDMAReader).
+        dut = WishboneDMADUT(WishboneDMAReader, mem_init=mem)
+        def address_generator(sink):
+            for i in range(length):
+                yield sink.valid.eq(1)
+                yield sink.address.eq(i)
+                yield
+                while not (yield sink.ready):
+                    yield
+            yield sink.valid.eq(0)
+        results = {}
+        def checker(name, source):
+            results[name] = yield from source_checker(source, mem[:length])
+        run_simulation(dut, [address_generator(dut.dma.sink), checker("single", dut.dma.source)])
+
+        # Bursts (WishboneDMABurstReader).
+        dut = WishboneDMADUT(WishboneDMABurstReader, mem_init=mem, burst_length=16)
+        run_simulation(dut, [
+            desc_generator(dut.dma.desc, [(0, length)]),
+            checker("burst", dut.dma.source)
+        ])
+
+        self.assertEqual(results["single"][0], mem[:length])
+        self.assertEqual(results["burst"][0],  mem[:length])
+        single_throughput = length/results["single"][1]
+        burst_throughput  = length/results["burst"][1]
+        self.assertLess(single_throughput, 0.5)
+        self.assertGreater(burst_throughput, 0.85)
+
+    def test_wishbone_burst_reader_segments(self):
+        mem      = [random.randrange(2**32) for _ in range(1024)]
+        segments = [(0x10, 5), (0x100, 40), (0x3, 1), (0x200, 17)]
+        datas    = sum([mem[a:a + l] for a, l in segments], [])
+        dut = WishboneDMADUT(WishboneDMABurstReader, mem_init=mem, burst_length=8)
+        results = []
+        def checker(source):
+            received, _ = yield from source_checker(source, datas, ready_rand=50)
+            results.extend(received)
+        run_simulation(dut, [desc_generator(dut.dma.desc, segments), checker(dut.dma.source)])
+        self.assertEqual(results, datas)
+
+    def test_wishbone_burst_writer(self):
+        datas    = [random.randrange(2**32) for _ in range(100)]
+        segments = [(0x20, 37), (0x180, 63)]
+        dut = WishboneDMADUT(WishboneDMABurstWriter, burst_length=16)
+        def check():
+            for _ in range(64):
+                yield
+            assert (yield dut.dma.idle)
+            mem = []
+            for address, length in segments:
+                for i in range(length):
+                    mem.append((yield dut.sram.mem[address + i]))
+            self.assertEqual(mem, datas)
+            self.assertEqual((yield dut.dma.words), len(datas))
+        def generator():
+            yield from sink_generator(dut.dma.sink, datas)
+            yield from check()
+        run_simulation(dut, [desc_generator(dut.dma.desc, segments), generator()])
+
+    def test_wishbone_burst_reader_csr(self):
+        mem = [random.randrange(2**32) for _ in range(1024)]
+        dut = WishboneDMADUT(WishboneDMABurstReader, mem_init=mem, with_csr=True)
+        def generator():
+            yield dut.dma._base.storage.eq(0x100*4)
+            yield dut.dma._length.storage.eq(64*4)
+            yield dut.dma._enable.storage.eq(1)
+            yield
+            received, _ = yield from source_checker(dut.dma.source, mem[0x100:0x100 + 64])
+            self.assertEqual(received, mem[0x100:0x100 + 64])
+            for _ in range(8):
+                yield
+            self.assertEqual((yield dut.dma._done.status), 1)
+            self.assertEqual((yield dut.dma._words.status), 64)
+        run_simulation(dut, generator())
+
+    def axi_reader_test(self, max_outstanding, latency=16, length=512):
+        bus = axi.AXIInterface(data_width=32, address_width=32, id_width=1)
+        mem = {i: random.randrange(2**32) for i in range(2048)}
+        dut = AXIDMABurstReader(bus, endianness="big", burst_length=16, max_outstanding=max_outstanding)
+        model   = AXIRAMModel(bus, mem, latency=latency)
+        results = {}
+        address = 4096 - 64*4 # Crosses a 4KB boundary.
+        datas   = [mem[address//4 + i] for i in range(length)]
+        def checker():
+            results["datas"], results["cycles"] = yield from source_checker(dut.source, datas)
+        @passive
+        def check_boundary():
+            while True:
+                if (yield bus.ar.valid) & (yield bus.ar.ready):
+                    start = (yield bus.ar.addr)
+                    end   = start + 4*((yield bus.ar.len) + 1) - 1
+                    self.assertEqual(start//4096, end//4096)
+                yield
+        run_simulation(dut, [
+            desc_generator(dut.desc, [(address, length)]),
+            checker(),
+            model.read_generator(),
+            check_boundary(),
+        ])
+        self.assertEqual(results["datas"], datas)
+        return length/results["cycles"]
+
+    def test_axi_burst_reader(self):
+        single_outstanding_throughput = self.axi_reader_test(max_outstanding=1)
+        multi_outstanding_throughput  = self.axi_reader_test(max_outstanding=4)
+        self.assertLess(single_outstanding_throughput, 0.6)
+        self.assertGreater(multi_outstanding_throughput, 0.9)
+
+    def test_axi_burst_writer(self):
+        bus   = axi.AXIInterface(data_width=32, address_width=32, id_width=1)
+        mem   = {}
+        dut   = AXIDMABurstWriter(bus, endianness="big", burst_length=16, max_outstanding=4)
+        model = AXIRAMModel(bus, mem, latency=16)
+        segments = [(0x1000 - 10*4, 50), (0x4000, 30)]
+        datas    = [random.randrange(2**32) for _ in range(80)]
+        def generator():
+            yield from sink_generator(dut.sink, datas)
+            for _ in range(128):
+                yield
+            self.assertEqual((yield dut.idle), 1)
+            written = []
+            for address, length in segments:
+                written += [mem.get(address//4 + i) for i in range(length)]
+            self.assertEqual(written, datas)
+        run_simulation(dut, [
+            desc_generator(dut.desc, segments),
+            generator(),
+            model.write_generator(),
+        ])
+
+    def test_descriptor_ring(self):
+        # 3 descriptors at 0x100/0x110/0x120 (ring), capture buffers at 0x400/0x800/0xc00.
+        mem = [0]*1024
+        buffers = [(0x400, 24), (0x800, 8), (0xc00, 40)]
+        for i, (address, length) in enumerate(buffers):
+            flags = DESC_FLAG_OWN | DESC_FLAG_IRQ | (DESC_FLAG_LAST if i == 2 else 0)
+            mem[0x40 + 4*i:0x40 + 4*i + 4] = [address, 4*length, flags, 0x100 + 0x10*((i + 1)%3)]
+        datas = [random.randrange(2**32) for _ in range(sum(l for _, l in buffers))]
+        dut   = DescriptorRingDUT(WishboneDMABurstWriter, mem_init=mem, burst_length=8)
+        irqs  = []
+
+        @passive
+        def irq_monitor():
+            while True:
+                if (yield dut.ring.ev.done.trigger):
+                    irqs.append((yield dut.ring._completed.status))
+                yield
+
+        def generator():
+            yield dut.ring._base.storage.eq(0x100)
+            yield dut.ring._coalesce.storage.eq(2)
+            yield dut.ring._enable.storage.eq(1)
+            yield
+            yield from sink_generator(dut.dma.sink, datas)
+            for _ in range(128):
+                yield
+            # Datas scattered in buffers.
+            written = []
+            for address, length in buffers:
+                for i in range(length):
+                    written.append((yield dut.sram.mem[address//4 + i]))
+            self.assertEqual(written, datas)
+            # Descriptors written back, ring waiting for software on first (not owned) descriptor.
+            for i in range(3):
+                flags = (yield dut.sram.mem[0x40 + 4*i + 2])
+                self.assertEqual(flags & DESC_FLAG_OWN, 0)
+                self.assertNotEqual(flags & DESC_FLAG_DONE, 0)
+            self.assertEqual((yield dut.ring._completed.status), 3)
+            self.assertEqual((yield dut.ring._current.status), 0x100)
+            self.assertEqual((yield dut.ring._running.status), 1)
+            # Interrupts coalesced: after 2nd descriptor, then flushed when the ring is empty.
+            self.assertEqual(irqs, [2, 3])
+            # Re-arm first descriptor and kick.
+            yield dut.sram.mem[0x40 + 2].eq(DESC_FLAG_OWN)
+            yield dut.ring._kick.re.eq(1)
+            yield
+            yield dut.ring._kick.re.eq(0)
+            yield from sink_generator(dut.dma.sink, datas[:24])
+            for _ in range(64):
+                yield
+            self.assertEqual((yield dut.ring._completed.status), 4)
+            self.assertEqual((yield dut.ring._current.status), 0x110)
+
+        run_simulation(dut, [generator(), irq_monitor()])
+
+    def test_descriptor_ring_axi_reader(self):
+        # 2 chained descriptors read by an AXIDMABurstReader with a slow R channel: descriptors
+        # must only be completed (DONE written back, interrupt) once all their datas are read.
+        mem = [0]*1024
+        mem[0x40:0x44] = [0x400, 4*32, DESC_FLAG_OWN | DESC_FLAG_IRQ, 0x110]
+        mem[0x44:0x48] = [0x800, 4*16, DESC_FLAG_OWN | DESC_FLAG_IRQ | DESC_FLAG_LAST, 0]
+        axi_mem = {i: random.randrange(2**32) for i in range(1024)}
+        datas   = [axi_mem[0x400//4 + i] for i in range(32)] + [axi_mem[0x800//4 + i] for i in range(16)]
+
+        class DUT(Module):
+            def __init__(self):
+                self.submodules.sram = wishbone.SRAM(4*1024, init=mem)
+                self.submodules.dma  = AXIDMABurstReader(axi.AXIInterface(data_width=32, address_width=32, id_width=1),
+                    endianness="big", burst_length=16, max_outstanding=4)
+                self.submodules.ring = WishboneDMADescriptorRing(self.sram.bus, self.dma)
+        dut   = DUT()
+        model = AXIRAMModel(dut.dma.bus, axi_mem, latency=64)
+        beats = {"count": 0}
+        completions = []
+
+        @passive
+        def monitor():
+            while True:
+                if (yield dut.dma.bus.r.valid) & (yield dut.dma.bus.r.ready):
+                    beats["count"] += 1
+                if (yield dut.ring.ev.done.trigger):
+                    completions.append(((yield dut.ring._completed.status), beats["count"]))
+                yield
+
+        def generator():
+            yield dut.ring._base.storage.eq(0x100)
+            yield dut.ring._enable.storage.eq(1)
+            yield
+            results = yield from source_checker(dut.dma.source, datas)
+            self.assertEqual(results[0], datas)
+            for _ in range(64):
+                yield
+            self.assertEqual((yield dut.ring._completed.status), 2)
+
+        run_simulation(dut, [generator(), monitor(), model.read_generator()])
+        self.assertEqual(completions, [(1, 32), (2, 48)])
+
+    def test_descriptor_ring_irq_collision(self):
+        # 2 chained descriptors, interrupts on timeout: sweep the timeout to get a timeout trigger
+        # in the same cycle as the completion of the last descriptor.
+        mem = [0]*1024
+        mem[0x40:0x44] = [0x400, 4*8, DESC_FLAG_OWN | DESC_FLAG_IRQ, 0x110]
+        mem[0x44:0x48] = [0x800, 4*8, DESC_FLAG_OWN | DESC_FLAG_IRQ, 0]
+        collisions = 0
+        for timeout in range(1, 48):
+            dut     = DescriptorRingDUT(WishboneDMABurstWriter, mem_init=mem, burst_length=8)
+            history = []
+
+            @passive
+            def monitor():
+                while True:
+                    history.append(((yield dut.ring.ev.done.trigger), (yield dut.ring._completed.status)))
+                    yield
+
+            def generator():
+                yield dut.ring._base.storage.eq(0x100)
+                yield dut.ring._coalesce.storage.eq(16)
+                yield dut.ring._timeout.storage.eq(timeout)
+                yield dut.ring._enable.storage.eq(1)
+                yield
+                yield from sink_generator(dut.dma.sink, list(range(16)))
+                for _ in range(128):
+                    yield
+
+            run_simulation(dut, [generator(), monitor()])
+            triggers = [i for i, (trigger, completed) in enumerate(history) if trigger]
+            collisions += any(history[i + 1][1] != history[i][1] for i in triggers)
+            # Last interrupt always signals the last completion.
+            self.assertEqual(history[triggers[-1]][1], 2)
+        self.assertNotEqual(collisions, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+#
+# This file is part of LiteX.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import time
+import random
+import unittest
+
+from litex.tools.remote.etherbone import *
+
+
+def etherbone_reads_writes_packet(base_addr, datas, base_ret_addr, addrs):
+    record = EtherboneRecord()
+    record.writes = EtherboneWrites(base_addr=base_addr, datas=datas)
+    record.wcount = len(record.writes)
+    record.reads  = EtherboneReads(base_ret_addr=base_ret_addr, addrs=addrs)
+    record.rcount = len(record.reads)
+    record.cyc    = 1
+    packet = EtherbonePacket()
+    packet.records = [record]
+    packet.pf      = 1
+    return packet
+
+
+def benchmark(n_words=255, n_packets=1000):
+    """Etherbone codec micro-benchmark, returns encode/decode throughputs in MB/s."""
+    datas = [random.randrange(2**32) for _ in range(n_words)]
+    size  = 0
+    start = time.perf_counter()
+    for i in range(n_packets):
+        record = EtherboneRecord()
+        record.writes = EtherboneWrites(base_addr=0, datas=datas)
+        packet = EtherbonePacket()
+        packet.records = [record]
+        packet.encode()
+        size += len(packet)
+    encode_duration = time.perf_counter() - start
+    encoded = bytes(packet)
+    start = time.perf_counter()
+    for i in range(n_packets):
+        packet = EtherbonePacket(encoded)
+        packet.decode()
+        packet.records[0].writes.get_datas()
+    decode_duration = time.perf_counter() - start
+    return size/encode_duration/1e6, size/decode_duration/1e6
+
+
+class TestEtherbone(unittest.TestCase):
+    def test_encode(self):
+        packet = etherbone_reads_writes_packet(0x12345678, [0x1, 0xdeadbeef], 0x1000, [0x4, 0x8, 0xc])
+        packet.encode()
+        self.assertEqual(bytes(packet).hex(),
+            "4e6f114400000000" +                         # Packet header.
+            "100f0203" +                                 # Record header.
+            "12345678" + "00000001deadbeef" +            # Writes.
+            "00001000" + "00000004000000080000000c")    # Reads.
+
+    def test_decode(self):
+        packet = etherbone_reads_writes_packet(0x12345678, [0x1, 0xdeadbeef], 0x1000, [0x4, 0x8, 0xc])
+        packet.encode()
+        packet = EtherbonePacket(bytes(packet))
+        packet.decode()
+        self.assertEqual(packet.magic, etherbone_magic)
+        self.assertEqual(packet.pf, 1)
+        record = packet.records.pop()
+        self.assertEqual(record.cyc, 1)
+        self.assertEqual(record.byte_enable, 0xf)
+        self.assertEqual(record.writes.base_addr, 0x12345678)
+        self.assertEqual(record.writes.get_datas(), [0x1, 0xdeadbeef])
+        self.assertEqual(record.reads.base_ret_addr, 0x1000)
+        self.assertEqual(record.reads.get_addrs(), [0x4, 0x8, 0xc])
+
+    def test_multiple_records(self):
+        packet = EtherbonePacket()
+        for i in range(4):
+            record = EtherboneRecord()
+            record.reads = EtherboneReads(base_ret_addr=i, addrs=[4*j for j in range(i + 1)])
+            packet.records.append(record)
+        packet.encode()
+        packet = EtherbonePacket(packet)
+        packet.decode()
+        self.assertEqual([r.reads.base_ret_addr for r in packet.records], list(range(4)))
+        self.assertEqual([r.rcount for r in packet.records], [1, 2, 3, 4])
+
+    def test_compatibility(self):
+        # Objects API (writes/reads lists, add) and list-like encoded packets.
+        writes = EtherboneWrites(base_addr=0x100)
+        for data in [1, 2, 3]:
+            writes.add(EtherboneWrite(data))
+        self.assertEqual([w.data for w in writes.writes], [1, 2, 3])
+        # writes is a read-only view, modifiable through add()/assignment.
+        with self.assertRaises(AttributeError):
+            writes.writes.append(EtherboneWrite(4))
+        reads = EtherboneReads()
+        reads.reads = [EtherboneRead(0x10), EtherboneRead(0x20)]
+        self.assertEqual(reads.get_addrs(), [0x10, 0x20])
+        # len: number of words, encoded or not.
+        reads.encode()
+        self.assertEqual(len(reads), 2)
+        record = EtherboneRecord()
+        record.writes = writes
+        packet = EtherbonePacket()
+        packet.records = [record]
+        packet.encode()
+        self.assertEqual(list(packet[:4]), [0x4e, 0x6f, 0x10, 0x44])
+        decoded = EtherbonePacket(list(packet))
+        decoded.decode()
+        self.assertIn("WR32 0x00000003", str(decoded))
+        # Record decoding leaves next records.
+        record = EtherboneRecord(packet[etherbone_packet_header_length:] + packet[etherbone_packet_header_length:])
+        record.decode()
+        self.assertEqual(record.writes.get_datas(), [1, 2, 3])
+        self.assertEqual(len(record), 4 + 4*4)
+
+    def test_benchmark(self):
+        encode_throughput, decode_throughput = benchmark(n_packets=100)
+        self.assertGreater(encode_throughput, 0)
+        self.assertGreater(decode_throughput, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,7 +9,7 @@ import random
 
 from migen import *
 
-from litex.soc.interconnect.stream import Gearbox
+from litex.soc.interconnect.stream import Gearbox, RAMGearbox, lcm
 
 
 def data_generator(dut, gearbox, datas):
@@ -42,9 +42,9 @@ def data_checker(dut, gearbox, datas):
 
 
 class GearboxDUT(Module):
-    def __init__(self):
-        self.submodules.gearbox0 = Gearbox(20, 32)
-        self.submodules.gearbox1 = Gearbox(32, 20)
+    def __init__(self, cls=Gearbox, i_dw=20, o_dw=32, msb_first=True):
+        self.submodules.gearbox0 = cls(i_dw, o_dw, msb_first=msb_first)
+        self.submodules.gearbox1 = cls(o_dw, i_dw, msb_first=msb_first)
         self.comb += self.gearbox0.source.connect(self.gearbox1.sink)
 
 
@@ -59,3 +59,63 @@ class TestGearbox(unittest.TestCase):
         ]
         run_simulation(dut, generators)
         self.assertEqual(dut.errors, 0)
+
+    def test_ram_gearbox(self):
+        prng = random.Random(42)
+        for i_dw, o_dw in [(20, 32), (66, 64), (10, 32), (8, 32)]:
+            for msb_first in [True, False]:
+                with self.subTest(i_dw=i_dw, o_dw=o_dw, msb_first=msb_first):
+                    dut = GearboxDUT(RAMGearbox, i_dw, o_dw, msb_first)
+                    datas = [prng.randrange(2**i_dw) for i in range(128)]
+                    generators = [
+                        data_generator(dut, dut.gearbox0, datas),
+                        data_checker(dut, dut.gearbox1, datas)
+                    ]
+                    run_simulation(dut, generators)
+                    self.assertEqual(dut.errors, 0)
+
+    def test_ram_gearbox_bit_ordering(self):
+        # Same output bit ordering than Gearbox.
+        def model(datas, i_dw, o_dw, msb_first):
+            bits = []
+            for data in datas:
+                word = [(data >> i) & 1 for i in range(i_dw)]
+                bits += word[::-1] if msb_first else word
+            results = []
+            for i in range(0, len(bits) - o_dw + 1, o_dw):
+                word = bits[i:i + o_dw]
+                word = word[::-1] if msb_first else word
+                results.append(sum(b << n for n, b in enumerate(word)))
+            return results
+
+        prng = random.Random(42)
+        for i_dw, o_dw in [(20, 32), (66, 64), (32, 10), (8, 32), (32, 8)]:
+            for msb_first in [True, False]:
+                with self.subTest(i_dw=i_dw, o_dw=o_dw, msb_first=msb_first):
+                    datas = [prng.randrange(2**i_dw) for i in range(64)]
+                    reference = model(datas, i_dw, o_dw, msb_first)
+                    if lcm(i_dw, o_dw) not in [i_dw, o_dw]:
+                        dut = Gearbox(i_dw, o_dw, msb_first)
+                        results = []
+                        run_simulation(dut, [data_generator(dut, dut, datas),
+                            self.collect(dut, results, len(reference))])
+                        self.assertEqual(results, reference)
+                    dut = RAMGearbox(i_dw, o_dw, msb_first)
+                    results = []
+                    run_simulation(dut, [data_generator(dut, dut, datas),
+                        self.collect(dut, results, len(reference))])
+                    self.assertEqual(results, reference)
+
+    def collect(self, gearbox, results, n):
+        yield gearbox.source.ready.eq(1)
+        while len(results) < n:
+            yield
+            if (yield gearbox.source.valid):
+                results.append((yield gearbox.source.data))
+
+    def test_ram_gearbox_resources(self):
+        # Storage: circular buffer vs lcm shift register.
+        for i_dw, o_dw in [(66, 64), (64, 66), (130, 128), (40, 66)]:
+            self.assertLess(RAMGearbox(i_dw, o_dw).buffer_bits, lcm(i_dw, o_dw))
+        # Power-of-two ratios are bypassed.
+        self.assertEqual(RAMGearbox(8, 32).buffer_bits, 0)
@@ -6,11 +6,13 @@
 
 import unittest
 import random
+import math
 
 from migen import *
 
 from litex.soc.interconnect.stream import *
 from litex.soc.interconnect.packet import *
+from litex.soc.interconnect import stream_sim
 
 packet_header_length = 31
 packet_header_fields = {
@@ -127,3 +129,95 @@ class TestPacket(unittest.TestCase):
 
     def test_128bit_loopback(self):
         self.loopback_test(dw=128)
+
+    def min_size_frames_test(self, dw, n):
+        # Back to back minimum size frames: one beat per cycle on the packetizer's source.
+        npackets = 16
+        packets  = [[(16*i + j + 1) for j in range(n)] for i in range(npackets)]
+
+        def generator(dut):
+            for packet in packets:
+                dut.streamer.send(packet)
+            for packet in packets:
+                received = yield from dut.logger.receive()
+                self.assertEqual(list(received), packet)
+
+        class DUT(Module):
+            def __init__(self):
+                self.submodules.streamer     = stream_sim.BufferedPacketStreamer(packet_description(dw))
+                self.submodules.packetizer   = Packetizer(packet_description(dw), raw_description(dw), packet_header)
+                self.submodules.depacketizer = Depacketizer(raw_description(dw), packet_description(dw), packet_header)
+                self.submodules.logger       = stream_sim.BufferedPacketLogger(packet_description(dw))
+                self.comb += [
+                    self.streamer.source.connect(self.packetizer.sink),
+                    self.packetizer.source.connect(self.depacketizer.sink),
+                    self.depacketizer.source.connect(self.logger.sink),
+                ]
+
+        dut   = DUT()
+        probe = stream_sim.StreamProbe(dut.packetizer.source)
+        run_simulation(dut, [generator(dut),
+            dut.streamer.generator(), dut.logger.generator(), probe.generator()])
+        cycles_per_packet = (probe.ends[-1] - probe.starts[0] + 1)/npackets
+        beats_per_packet  = math.ceil((packet_header_length*8 + n*dw)/dw)
+        self.assertEqual(cycles_per_packet, beats_per_packet)
+        self.assertEqual(probe.get_stats()["bubbles"], 0)
+
+    def test_min_size_frames(self):
+        for dw in [8, 32, 64, 128]:
+            for n in [1, 2]:
+                with self.subTest(dw=dw, n=n):
+                    self.min_size_frames_test(dw, n)
+
+    def scheduler_test(self, weights=None, priorities=None, lengths=[4, 4, 4], npackets=24):
+        def generator(dut):
+            for i, streamer in enumerate(dut.streamers):
+                for n in range(npackets):
+                    streamer.send([(i << 16) | (n << 8) | k for k in range(lengths[i])])
+            for i in range(sum(lengths)*npackets + 16):
+                yield
+
+        class DUT(Module):
+            def __init__(self):
+                self.streamers = [stream_sim.BufferedPacketStreamer([("data", 32)]) for i in range(3)]
+                self.submodules += self.streamers
+                self.submodules.logger    = stream_sim.BufferedPacketLogger([("data", 32)])
+                self.submodules.scheduler = Scheduler(
+                    masters    = [streamer.source for streamer in self.streamers],
+                    slave      = self.logger.sink,
+                    weights    = weights,
+                    priorities = priorities,
+                    with_csr   = True)
+
+        dut   = DUT()
+        probe = stream_sim.StreamProbe(dut.logger.sink)
+        run_simulation(dut, [generator(dut), dut.logger.generator(), probe.generator()] +
+            [streamer.generator() for streamer in dut.streamers])
+
+        # Packets are never interleaved.
+        sources = []
+        for packet in dut.logger.packets:
+            self.assertEqual(len(set(data >> 8 for data in packet)), 1)
+            sources.append(packet[0] >> 16)
+        self.assertEqual(len(sources), 3*npackets)
+        return dut, probe, sources
+
+    def test_scheduler_weights(self):
+        dut, probe, sources = self.scheduler_test(weights=[1, 2, 3])
+        # Bandwidth shared according to weights while all sources are active.
+        window = sources[:24]
+        self.assertEqual([window.count(i) for i in range(3)], [4, 8, 12])
+        # Full throughput: no bubble between packets.
+        self.assertEqual(probe.ends[-1] - probe.starts[0] + 1, 3*24*4)
+        self.assertEqual(len(dut.scheduler.get_csrs()), 3)
+
+    def test_scheduler_fairness(self):
+        # Round-robin is fair in packets, whatever the packet lengths.
+        dut, probe, sources = self.scheduler_test(lengths=[1, 4, 8])
+        self.assertEqual(sources[:30], [0, 1, 2]*10)
+
+    def test_scheduler_priorities(self):
+        dut, probe, sources = self.scheduler_test(priorities=[0, 0, 1])
+        # Source 2 is served first, then 0/1 in round-robin.
+        self.assertEqual(sources[:24], [2]*24)
+        self.assertEqual(sources[24:28], [0, 1, 0, 1])
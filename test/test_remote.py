@@ -0,0 +1,672 @@
+#
+# This file is part of LiteX.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import time
+import json
+import socket
+import tempfile
+import unittest
+import asyncio
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from migen import *
+
+from litex.soc.interconnect import wishbone
+
+from litex.tools.litex_server import RemoteServer, _RemoteClient
+from litex.tools.litex_client import RemoteClient, RemoteStream, pool
+from litex.tools.remote.comm_pcie import CommPCIe
+from litex.tools.remote.comm_udp import CommUDP
+from litex.tools.remote.comm_sim import CommSim
+from litex.tools.remote.etherbone import EtherbonePacket
+from litex.tools.remote.etherbone import EtherboneRecord, EtherboneReads, EtherboneWrites
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class CommMemory:
+    """Memory backed comm for remote tests."""
+    def __init__(self, delay=0):
+        self.mem   = {}
+        self.reads = 0
+        self.log   = []
+        self.delay = delay
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def read(self, addr, length=None, burst="incr"):
+        self.reads += 1
+        self.log.append(("read", addr, length))
+        time.sleep(self.delay)
+        incr  = (burst == "incr")
+        datas = [self.mem.get(addr + 4*incr*i, 0) for i in range(1 if length is None else length)]
+        return datas[0] if length is None else datas
+
+    def write(self, addr, datas):
+        datas = datas if isinstance(datas, list) else [datas]
+        self.log.append(("write", addr, len(datas)))
+        for i, data in enumerate(datas):
+            self.mem[addr + 4*i] = data
+
+
+def get_free_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(("localhost", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class TestRemote(unittest.TestCase):
+    def setUp(self, delay=0):
+        self.comm   = CommMemory(delay)
+        self.port   = get_free_port()
+        self.status_port = get_free_port()
+        self.server = RemoteServer(self.comm, "localhost", self.port, status_port=self.status_port)
+        self.server.open()
+        self.server.start()
+
+    def tearDown(self):
+        self.server.close()
+
+    def get_client(self, **kwargs):
+        client = RemoteClient(port=self.port, csr_csv=None, **kwargs)
+        client.open()
+        self.addCleanup(client.close)
+        return client
+
+    def test_read_write(self):
+        client = self.get_client()
+        client.write(0x100, [1, 2, 3])
+        client.write(0x200, 4)
+        self.assertEqual(client.read(0x100, 3), [1, 2, 3])
+        self.assertEqual(client.read(0x200), 4)
+        self.assertEqual(client.read(0x200, 2, burst="fixed"), [4, 4])
+
+    def test_pipelined_reads(self):
+        for window in [1, 4, 32]:
+            with self.subTest(window=window):
+                client = self.get_client(window=window)
+                datas  = list(range(1000))
+                client.write_many([(0x1000, datas), (0x0, 0x5a)])
+                self.assertEqual(client.big_read(0x1000, 1000, chunk_size=64), datas)
+                addrs = [0x1000 + 4*i for i in reversed(range(1000))] + [0x0]
+                self.assertEqual(client.read_many(addrs, chunk_size=100), datas[::-1] + [0x5a])
+                client.close()
+
+    def test_pipelined_reads_no_tags(self):
+        # Server not echoing the reads tags (always answering 0): reads still returned in order,
+        # without pipelining once detected.
+        class NoTagsServer(RemoteServer):
+            async def _receive_record(self, reader):
+                record = await RemoteServer._receive_record(self, reader)
+                if record.reads is not None:
+                    record.reads.base_ret_addr = 0
+                return record
+        self.server.close()
+        self.server = NoTagsServer(self.comm, "localhost", self.port)
+        self.server.open()
+        self.server.start()
+        client = self.get_client(window=4)
+        datas  = list(range(1000))
+        client.write_many([(0x1000, datas)])
+        self.assertEqual(client.big_read(0x1000, 1000, chunk_size=64), datas)
+        self.assertEqual(client._echo_tags, False)
+        addrs = [0x1000 + 4*i for i in reversed(range(1000))]
+        self.assertEqual(client.read_many(addrs, chunk_size=100), datas[::-1])
+
+    @unittest.skipIf(np is None, "NumPy not available")
+    def test_numpy_reads(self):
+        client = self.get_client()
+        datas  = np.arange(600, dtype=np.uint32)
+        client.write_many([(0x0, datas.tolist())])
+        result = client.big_read(0x0, 600, numpy=True)
+        self.assertEqual(result.dtype, np.uint32)
+        self.assertTrue((result == datas).all())
+
+    def test_context_manager(self):
+        with RemoteClient(port=self.port, csr_csv=None) as client:
+            client.write(0x0, 0x5a)
+            self.assertEqual(client.read(0x0), 0x5a)
+            self.assertEqual(client.socket.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY), 1)
+        self.assertIsNone(client.connection)
+
+    def test_pooled(self):
+        self.addCleanup(pool.close_all)
+        with RemoteClient(port=self.port, csr_csv=None, pooled=True) as client0:
+            with RemoteClient(port=self.port, csr_csv=None, pooled=True) as client1:
+                self.assertIs(client0.connection, client1.connection)
+                client0.write(0x0, 0x5a)
+                self.assertEqual(client1.read(0x0), 0x5a)
+            connection = client0.connection
+        # Connection kept open in the pool and reused by the next clients.
+        self.assertIsNotNone(connection.socket)
+        with RemoteClient(port=self.port, csr_csv=None, pooled=True) as client:
+            self.assertIs(client.connection, connection)
+            self.assertEqual(client.read(0x0), 0x5a)
+        pool.close_all()
+        self.assertIsNone(connection.socket)
+
+    def test_reconnect(self):
+        client = self.get_client(retry_delay=0.1)
+        client.write(0x0, [1, 2, 3])
+        self.assertEqual(client.read(0x0), 1)
+        # Restart the server: connection lost, reads replayed on a new connection.
+        self.server.close()
+        self.server = RemoteServer(self.comm, "localhost", self.port)
+        self.server.open()
+        self.server.start()
+        self.assertEqual(client.big_read(0x0, 3), [1, 2, 3])
+        self.assertEqual(client.connection.reconnects, 1)
+        # Server down: error after retries.
+        self.server.close()
+        client.retries = 1
+        with self.assertRaises(OSError):
+            client.read(0x0)
+
+    def test_write_combining(self):
+        client = self.get_client(write_combining=True, write_fifo=True, flush_window=None)
+        # CSR-like init sequence: adjacent writes and repeated writes (ex FIFO).
+        for i in range(128):
+            client.write(0x100 + 4*i, i)
+        for i in range(64):
+            client.write(0x0, i)
+        client.write(0x100, [0x55, 0xaa])
+        self.assertEqual(self.server.get_stats()["write_words"], 0)
+        # Reads are ordered after the buffered writes.
+        self.assertEqual(client.read(0x0), 63)
+        self.assertEqual(client.big_read(0x100, 4), [0x55, 0xaa, 2, 3])
+        stats = self.server.get_stats()
+        self.assertEqual(stats["write_words"], 128 + 64 + 2)
+        self.assertEqual(stats["comm_writes"], 3) # 3 records instead of 194.
+        # Fixed burst: one comm write per word (CommMemory has no fixed bursts).
+        writes = [l for l in self.comm.log if l[0] == "write"]
+        self.assertEqual(writes, [("write", 0x100, 128)] + [("write", 0x0, 1)]*64 + [("write", 0x100, 2)])
+
+    def test_write_combining_no_write_fifo(self):
+        # Server ignoring the wff flag (write FIFO records written to consecutive addresses).
+        class NoWriteFIFOServer(RemoteServer):
+            def _execute(self, requests):
+                for client, (record, future, timestamp) in requests:
+                    record.wff = 0
+                return RemoteServer._execute(self, requests)
+        self.server.close()
+        self.server = NoWriteFIFOServer(self.comm, "localhost", self.port)
+        self.server.open()
+        self.server.start()
+        client = self.get_client(write_combining=True, flush_window=None)
+        for i in range(4):
+            self.comm.mem[0x104 + 4*i] = 0x5a5a5a5a
+        for i in range(4):
+            client.write(0x100, i)
+        client.write(0x114, 0xa5)
+        client.flush()
+        # Repeated writes not merged by default: the neighbouring registers are not touched.
+        self.assertEqual(client.read(0x100), 3)
+        self.assertEqual(client.big_read(0x104, 5), [0x5a5a5a5a]*4 + [0xa5])
+        self.assertEqual(self.server.get_stats()["comm_writes"], 5)
+
+    def wait_mem(self, addr, value, timeout=1.0):
+        for i in range(int(timeout/0.01)):
+            if self.comm.mem.get(addr, None) == value:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.comm.mem.get(addr, None), value)
+
+    def test_write_combining_flush(self):
+        client = self.get_client(write_combining=True, flush_window=0.01)
+        client.write_many([(0x0, [1, 2]), (0x8, 3)])
+        # Flushed after flush_window (without read).
+        self.wait_mem(0x8, 3)
+        self.assertEqual([self.comm.mem[4*i] for i in range(3)], [1, 2, 3])
+        self.assertEqual(self.server.get_stats()["comm_writes"], 1)
+        # Flushed on close.
+        client.flush_window = None
+        client.write(0x0, 4)
+        client.close()
+        self.wait_mem(0x0, 4)
+
+    def test_write_combining_flush_error(self):
+        client = self.get_client(write_combining=True, flush_window=0.01, retries=0)
+        client.write(0x0, 1)
+        self.assertEqual(client.read(0x0), 1)
+        # Server down: the timer flush fails, the error is raised on the next access.
+        self.server.close()
+        client.connection.disconnect()
+        client.write(0x0, 2)
+        for i in range(100):
+            if client._writes_error is not None:
+                break
+            time.sleep(0.01)
+        self.assertIsInstance(client._writes_error, ConnectionRefusedError)
+        self.server = RemoteServer(self.comm, "localhost", self.port)
+        self.server.open()
+        self.server.start()
+        with self.assertRaises(OSError):
+            client.read(0x0)
+        self.assertEqual(client.read(0x0), 1)
+
+    def run_clients(self, n, target):
+        errors  = []
+        def run(i):
+            try:
+                target(i, self.get_client())
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_clients(self):
+        def client_access(i, client):
+            datas = [1000*i + j for j in range(300)]
+            for _ in range(4):
+                client.write(0x10000*i, datas[:200])
+                client.write(0x10000*i + 4*200, datas[200:])
+                self.assertEqual(client.big_read(0x10000*i, 300, chunk_size=32), datas)
+        self.run_clients(8, client_access)
+        stats = self.server.get_stats()
+        self.assertEqual(stats["read_words"],  8*4*300)
+        self.assertEqual(stats["write_words"], 8*4*300)
+
+    def test_cross_client_merging(self):
+        # A round of requests from 4 clients reading adjacent addresses (in any order).
+        requests = []
+        for i in [2, 0, 3, 1]:
+            record = EtherboneRecord()
+            record.reads  = EtherboneReads(addrs=[0x100 + 4*i])
+            record.rcount = 1
+            requests.append((None, (record, None, 0)))
+        self.comm.mem.update({0x100 + 4*i: i for i in range(4)})
+        self.server.max_length = 256
+        results = self.server._execute(requests)
+        self.assertEqual(results, [[2], [0], [3], [1]])
+        self.assertEqual(self.comm.log, [("read", 0x100, 4)])
+        # Writes are executed in order with the reads of the round.
+        record = EtherboneRecord()
+        record.writes = EtherboneWrites(base_addr=0x104, datas=[5])
+        record.wcount = 1
+        requests.insert(2, (None, (record, None, 0)))
+        results = self.server._execute(requests)
+        self.assertEqual(results, [[2], [0], None, [3], [5]])
+
+    def test_fairness(self):
+        # Scheduler driven with pre-filled queues: flooding client 0 (8 records), light client 1
+        # (2 records).
+        server   = RemoteServer(self.comm, "localhost", get_free_port())
+        server.loop     = asyncio.new_event_loop()
+        server.executor = ThreadPoolExecutor(max_workers=1)
+        done = []
+        async def run():
+            server._wakeup = asyncio.Event()
+            server.clients = [_RemoteClient(str(i), 16) for i in range(2)]
+            futures = []
+            for i, n in enumerate([8, 2]):
+                for j in range(n):
+                    record = EtherboneRecord()
+                    record.reads  = EtherboneReads(addrs=[4*i])
+                    record.rcount = 1
+                    future = server.loop.create_future()
+                    future.add_done_callback(lambda f, i=i: done.append(i))
+                    server.clients[i].queue.put_nowait((record, future, 0))
+                    futures.append(future)
+            scheduler = asyncio.ensure_future(server._schedule())
+            server._wakeup.set()
+            await asyncio.gather(*futures)
+            scheduler.cancel()
+            await asyncio.gather(scheduler, return_exceptions=True)
+        server.loop.run_until_complete(run())
+        server.loop.close()
+        server.executor.shutdown()
+        # One record per client per round: light client served in the first 2 rounds.
+        self.assertEqual(server.stats["rounds"], 8)
+        self.assertEqual(done, [0, 1, 1, 0] + [0]*6)
+
+    def test_status_endpoint(self):
+        client = self.get_client()
+        client.write(0x0, [1, 2])
+        client.read(0x0, 2)
+        url   = "http://localhost:{}/".format(self.status_port)
+        stats = json.loads(urllib.request.urlopen(url, timeout=5).read())
+        self.assertEqual(stats["read_words"], 2)
+        self.assertEqual(stats["write_words"], 2)
+        client_stats = list(stats["clients"].values())[0]
+        self.assertEqual(client_stats["requests"], 2)
+        self.assertGreater(client_stats["latency_max"], 0)
+
+
+class TestStream(unittest.TestCase):
+    def setUp(self):
+        self.comm   = CommMemory()
+        self.port   = get_free_port()
+        self.stream_port = get_free_port()
+        self.server = RemoteServer(self.comm, "localhost", self.port, stream_port=self.stream_port)
+        self.server.add_stream("adc",  base=0x1000, size=64, wptr=0x0, rptr=0x4, poll_interval=1e-3)
+        self.server.add_stream("slow", base=0x1000, size=64, wptr=0x0, max_buffer=0)
+        self.server.open()
+        self.server.start()
+        self.addCleanup(self.server.close)
+        self.count = 0
+
+    def subscribe(self, name):
+        stream = RemoteStream(name, port=self.stream_port)
+        stream.open()
+        self.addCleanup(stream.close)
+        # Wait for the subscription to be polled.
+        for i in range(100):
+            if self.server.streams[name].position is not None:
+                break
+            time.sleep(0.01)
+        return stream
+
+    def produce(self, n):
+        # Device model: fill the ring buffer, then update the write pointer.
+        for i in range(n):
+            self.comm.mem[0x1000 + 4*((self.count + i)%64)] = self.count + i
+        self.count += n
+        self.comm.mem[0x0] = self.count
+
+    def receive(self, stream, n):
+        chunks = []
+        while sum(len(datas) for offset, datas in chunks) < n:
+            chunks.append(stream.read())
+        return chunks
+
+    def test_stream(self):
+        stream = self.subscribe("adc")
+        # New datas, ring buffer wrapping.
+        for n in [40, 50, 64]:
+            start  = self.count
+            self.produce(n)
+            chunks = self.receive(stream, n)
+            self.assertEqual(chunks[0][0], start)
+            self.assertEqual([d for offset, datas in chunks for d in datas], list(range(start, start + n)))
+        self.assertEqual(self.comm.mem[0x4], self.count)
+        # Overrun: only the last 64 words are available.
+        self.produce(200)
+        offset, datas = stream.read()
+        self.assertEqual(offset, self.count - 64)
+        self.assertEqual(datas, list(range(self.count - 64, self.count)))
+        stats = self.server.get_stats()["streams"]["adc"]
+        self.assertEqual(stats["device_drops"], 200 - 64)
+        self.assertEqual(stats["words"], 40 + 50 + 64 + 64)
+        self.assertEqual(stats["subscribers"], 1)
+
+    def test_slow_subscriber(self):
+        stream = self.subscribe("slow")
+        self.produce(16)
+        for i in range(100):
+            if self.server.streams["slow"].stats["client_drops"] == 16:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.server.streams["slow"].stats["client_drops"], 16)
+        self.assertEqual(self.server.streams["slow"].subscribers[0].drops, 16)
+
+    def test_unknown_stream(self):
+        with RemoteStream("unknown", port=self.stream_port) as stream:
+            with self.assertRaises(ConnectionResetError):
+                stream.read()
+
+
+class TestCommPCIe(unittest.TestCase):
+    def setUp(self):
+        # Regular file as BAR.
+        f = tempfile.NamedTemporaryFile(delete=False)
+        f.write(bytes(64*1024))
+        f.close()
+        self.bar = f.name
+        self.comm = CommPCIe(self.bar)
+        self.comm.open()
+
+    def tearDown(self):
+        self.comm.close()
+        os.remove(self.bar)
+
+    def test_read_write(self):
+        self.comm.write(0x10, [0x12345678, 0x9abcdef0])
+        self.assertEqual(self.comm.read(0x10), 0x12345678)
+        self.assertEqual(self.comm.read(0x10, 2), [0x12345678, 0x9abcdef0])
+
+    def test_blocks(self):
+        datas = list(range(1024))
+        self.comm.write_block(0x1000, datas)
+        self.assertEqual(self.comm.read(0x1000, 1024), datas)
+        self.assertEqual(self.comm.read_block(0x1000, 1024).tolist(), datas)
+        out = bytearray(4*1024)
+        self.comm.read_block(0x1000, 1024, out=out)
+        self.assertEqual(bytes(out), bytes(self.comm.mmap[0x1000:0x2000]))
+        with self.assertRaises(ValueError):
+            self.comm.read_block(0x1002, 2)
+
+    @unittest.skipIf(np is None, "NumPy not available")
+    def test_numpy_blocks(self):
+        datas = np.arange(4096, dtype=np.uint32)
+        self.comm.write_block(0x0, datas)
+        out = np.zeros(4096, dtype=np.uint32)
+        self.comm.read_block(0x0, 4096, out=out)
+        self.assertTrue((out == datas).all())
+
+    def test_server_blocks(self):
+        blocks = []
+        read_block = self.comm.read_block
+        def read_block_log(addr, length, *args, **kwargs):
+            blocks.append((addr, length))
+            return read_block(addr, length, *args, **kwargs)
+        self.comm.read_block = read_block_log
+        port   = get_free_port()
+        server = RemoteServer(self.comm, "localhost", port)
+        server.open()
+        server.start()
+        client = RemoteClient(port=port, csr_csv=None)
+        client.open()
+        datas = list(range(2000))
+        client.write(0x0, datas[:255])
+        client.write_many([(4*255, datas[255:])])
+        self.assertEqual(client.big_read(0x0, 2000), datas)
+        # Merged bursts of 255 words, copied as blocks.
+        self.assertLess(server.get_stats()["comm_reads"], 10)
+        self.assertEqual(sum(length for addr, length in blocks), 2000)
+        # Short bursts (ex adjacent CSRs): word accesses.
+        self.assertEqual(client.read_many([0x0, 0x4, 0x8]), [0, 1, 2])
+        self.assertEqual(len(blocks), 8)
+        client.close()
+        server.close()
+        self.comm.open()
+
+
+class EtherboneUDPDevice:
+    """Etherbone UDP device model (one response datagram per record, optional datagrams loss)."""
+    def __init__(self, port, drop_every=0):
+        self.mem        = {}
+        self.datagrams  = 0
+        self.drop_every = drop_every
+        self.socket     = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("localhost", port))
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        while True:
+            try:
+                datas, addr = self.socket.recvfrom(65536)
+            except OSError:
+                break
+            self.datagrams += 1
+            if self.drop_every and (self.datagrams % self.drop_every) == 0:
+                continue
+            packet = EtherbonePacket(datas)
+            packet.decode()
+            for record in packet.records:
+                if record.writes is not None:
+                    for i, data in enumerate(record.writes.get_datas()):
+                        self.mem[record.writes.base_addr + 4*i] = data
+                if record.reads is not None:
+                    response = EtherboneRecord()
+                    response.writes = EtherboneWrites(base_addr=record.reads.base_ret_addr,
+                        datas=[self.mem.get(a, 0) for a in record.reads.get_addrs()])
+                    response.wcount = len(response.writes)
+                    packet = EtherbonePacket()
+                    packet.records = [response]
+                    packet.encode()
+                    self.socket.sendto(packet, addr)
+
+    def close(self):
+        self.socket.close()
+
+
+class TestCommUDP(unittest.TestCase):
+    def get_comm(self, drop_every=0, **kwargs):
+        port   = get_free_port()
+        device = EtherboneUDPDevice(port, drop_every)
+        self.addCleanup(device.close)
+        comm = CommUDP("localhost", port, local_port=get_free_port(), **kwargs)
+        comm.open()
+        self.addCleanup(comm.close)
+        return comm, device
+
+    def test_read_write(self):
+        comm, device = self.get_comm()
+        datas = list(range(1000))
+        comm.write(0x0, datas)
+        self.assertEqual(comm.read(0x0, 1000), datas)
+        # Writes: 4 records of 255 words (fitting in the MTU), one per datagram.
+        # Reads: 250 records of 4 words, packed in 5 datagrams.
+        self.assertEqual(device.datagrams, 4 + 5)
+        self.assertEqual(comm.read(0x10), 4)
+        self.assertEqual(comm.read_bursts([(0x10, 2, "incr"), (0x20, 2, "fixed")]), [4, 5, 8, 8])
+
+    def test_mtu(self):
+        comm, device = self.get_comm(mtu=576, buffer_depth=16)
+        datas = list(range(1000))
+        comm.write(0x0, datas)
+        self.assertEqual(comm.read(0x0, 1000), datas)
+
+    def test_retries(self):
+        comm, device = self.get_comm(drop_every=3, timeout=0.02, mtu=256)
+        datas = list(range(500))
+        comm.write(0x0, datas)
+        device.mem.update({4*i: i for i in range(500)}) # Writes can't be retried.
+        self.assertEqual(comm.read(0x0, 500), datas)
+        comm, device = self.get_comm(drop_every=1, timeout=0.01, retries=2)
+        with self.assertRaises(IOError):
+            comm.read(0x0)
+
+
+class TestCommSim(unittest.TestCase):
+    def get_comm(self, **kwargs):
+        sram = wishbone.SRAM(4*1024)
+        comm = CommSim(sram, sram.bus, **kwargs)
+        comm.open()
+        self.addCleanup(comm.close)
+        return comm
+
+    def test_read_write(self):
+        comm = self.get_comm()
+        comm.write(0x100, [1, 2, 3])
+        comm.write(0x200, 4)
+        self.assertEqual(comm.read(0x100, 3), [1, 2, 3])
+        self.assertEqual(comm.read(0x200), 4)
+        self.assertEqual(comm.read_bursts([(0x100, 2, "incr"), (0x200, 2, "fixed")]), [1, 2, 4, 4])
+        self.assertEqual(comm.requests, 5)
+
+    def test_timeout(self):
+        bus  = wishbone.Interface() # No slave: never acked.
+        comm = CommSim(Module(), bus, timeout=16)
+        comm.open()
+        self.addCleanup(comm.close)
+        with self.assertRaises(IOError):
+            comm.read(0x0)
+
+    def test_error_recovery(self):
+        class DUT(Module):
+            def __init__(self):
+                self.bus = wishbone.Interface()
+                self.submodules.sram = wishbone.SRAM(64)
+                # Errors on accesses above the SRAM.
+                error = Signal()
+                self.comb += [
+                    error.eq(self.bus.adr >= 16),
+                    self.bus.connect(self.sram.bus, omit={"stb", "err"}),
+                    self.sram.bus.stb.eq(self.bus.stb & ~error),
+                    self.bus.err.eq(self.bus.cyc & self.bus.stb & error),
+                ]
+        dut  = DUT()
+        comm = CommSim(dut, dut.bus)
+        comm.open()
+        self.addCleanup(comm.close)
+        comm.write(0x0, [1, 2])
+        for addr in [0x40, 0x0, 0x44, 0x4]:
+            if addr >= 0x40:
+                with self.assertRaises(IOError):
+                    comm.read(addr)
+            else:
+                self.assertEqual(comm.read(addr), addr//4 + 1)
+        self.assertEqual(comm.read(0x0, 2), [1, 2])
+
+    def test_timeout_recovery(self):
+        class DUT(Module):
+            def __init__(self):
+                self.bus = bus = wishbone.Interface()
+                # Slow slave: address latched at the start of the cycle, acked after 8 cycles.
+                count   = Signal(4)
+                latched = Signal(30)
+                self.sync += [
+                    If(bus.cyc & bus.stb & ~bus.ack,
+                        If(count == 0, latched.eq(bus.adr)),
+                        count.eq(count + 1)
+                    ).Else(
+                        count.eq(0)
+                    )
+                ]
+                self.comb += [
+                    bus.ack.eq(bus.cyc & bus.stb & (count == 8)),
+                    bus.dat_r.eq(latched + 100),
+                ]
+        dut  = DUT()
+        comm = CommSim(dut, dut.bus, timeout=4)
+        comm.open()
+        self.addCleanup(comm.close)
+        with self.assertRaises(IOError):
+            comm.read(0x0)
+        # Timed out cycle ended: no stale ack for the next access.
+        comm.timeout = 64
+        self.assertEqual(comm.read(0x14), 105)
+
+    def test_server(self):
+        comm   = self.get_comm(latency=64)
+        port   = get_free_port()
+        server = RemoteServer(comm, "localhost", port)
+        server.open()
+        server.start()
+        self.addCleanup(server.close)
+        with RemoteClient(port=port, csr_csv=None) as client:
+            datas = list(range(512))
+            client.write_many([(0x0, datas)])
+            requests, cycles = comm.requests, comm.cycles
+            for i in range(16):
+                self.assertEqual(client.read(4*i), i)
+            single_cycles = (comm.cycles - cycles)/16
+            requests, cycles = comm.requests, comm.cycles
+            self.assertEqual(client.big_read(0x0, 512, chunk_size=32), datas)
+            # Reads executed as bursts: link latency paid once per chunk instead of once per word.
+            self.assertLessEqual(comm.requests - requests, 512//32)
+            self.assertLess((comm.cycles - cycles)/512, single_cycles/8)
+
+
+if __name__ == "__main__":
+    unittest.main()
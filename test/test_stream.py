@@ -1,12 +1,21 @@
 # Copyright (c) 2020 Florent Kermarrec <florent@enjoy-digital.fr>
 # SPDX-License-Identifier: BSD-2-Clause
 
+import os
+import json
+import tempfile
 import unittest
 import random
 
 from migen import *
 
 from litex.soc.interconnect.stream import *
+from litex.soc.interconnect import stream_sim
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class TestStream(unittest.TestCase):
@@ -47,3 +56,269 @@ class TestStream(unittest.TestCase):
     def test_pipe_ready(self):
         dut = PipeReady([("data", 8)])
         self.pipe_test(dut)
+
+    def test_buffered_packet_streamer_logger(self):
+        prng = random.Random(42)
+        packets = [bytes(prng.randrange(256) for _ in range(prng.randrange(1, 256)))
+            for _ in range(32)]
+
+        def generator(dut):
+            for packet in packets:
+                dut.streamer.send(packet)
+            for packet in packets:
+                received = yield from dut.logger.receive()
+                self.assertEqual(stream_sim.check_fast(packet, received), (0, len(packet), 0))
+                self.assertTrue(stream_sim.comp_fast(packet, received))
+
+        class DUT(Module):
+            def __init__(self):
+                self.submodules.streamer = stream_sim.BufferedPacketStreamer([("data", 8)])
+                self.submodules.fifo     = SyncFIFO([("data", 8)], 4, buffered=True)
+                self.submodules.logger   = stream_sim.BufferedPacketLogger([("data", 8)])
+                self.comb += [
+                    self.streamer.source.connect(self.fifo.sink),
+                    self.fifo.source.connect(self.logger.sink),
+                ]
+
+        dut = DUT()
+        run_simulation(dut, [generator(dut), dut.streamer.generator(), dut.logger.generator()])
+        self.assertEqual(dut.streamer.n_packets, len(packets))
+        self.assertEqual(dut.logger.n_words, sum(len(p) for p in packets))
+        # Packets are streamed back to back.
+        self.assertEqual(dut.streamer.throughput(), 1.0)
+        self.assertEqual(dut.logger.throughput(), 1.0)
+
+    def test_check_fast(self):
+        for p1, p2 in [
+            ([1, 2, 3, 4], [1, 2, 3, 4]),
+            ([1, 2, 3, 4], [0, 0, 1, 2, 3, 5]),
+            ([1, 2, 3, 4], [5]),
+            ([1, 2],       [3, 1, 2, 3])]:
+            self.assertEqual(stream_sim.check_fast(p1, p2), stream_sim.check(p1, p2))
+            self.assertEqual(stream_sim.comp_fast(p1, p2), stream_sim.comp(p1, p2))
+
+    @unittest.skipIf(np is None, "NumPy not available")
+    def test_comp_fast_numpy(self):
+        p1 = np.arange(16, dtype=np.uint32)
+        p2 = p1.copy()
+        self.assertTrue(stream_sim.comp_fast(p1, p2))
+        self.assertTrue(stream_sim.comp_fast(p1, list(range(8))))
+        p2[3] = 0
+        self.assertFalse(stream_sim.comp_fast(p1, p2))
+
+    def test_stream_probe(self):
+        packets = [list(range(16)) for _ in range(8)]
+
+        def generator(dut):
+            for packet in packets:
+                yield from dut.streamer.send_blocking(packet)
+            for i in range(8):
+                yield
+
+        class DUT(Module):
+            def __init__(self):
+                self.submodules.streamer   = stream_sim.BufferedPacketStreamer([("data", 8)])
+                self.submodules.randomizer = stream_sim.Randomizer([("data", 8)], level=50)
+                self.submodules.pipe       = PipeValid([("data", 8)])
+                self.submodules.logger     = stream_sim.BufferedPacketLogger([("data", 8)])
+                self.comb += [
+                    self.streamer.source.connect(self.randomizer.sink),
+                    self.randomizer.source.connect(self.pipe.sink),
+                    self.pipe.source.connect(self.logger.sink),
+                ]
+
+        dut = DUT()
+        probe_in  = stream_sim.StreamProbe(dut.pipe.sink,   name="in")
+        probe_out = stream_sim.StreamProbe(dut.pipe.source, name="out")
+        run_simulation(dut, [generator(dut),
+            dut.streamer.generator(), dut.randomizer.generator(), dut.logger.generator(),
+            probe_in.generator(), probe_out.generator()])
+
+        stats_in  = probe_in.get_stats()
+        stats_out = probe_out.get_stats()
+        for stats in [stats_in, stats_out]:
+            self.assertEqual(stats["transfers"], 8*16)
+            self.assertEqual(stats["packets"], 8)
+            self.assertLess(stats["utilization"], 1.0)
+        # Randomizer introduces bubbles in packets, PipeValid a cycle of latency.
+        self.assertGreater(stats_in["bubbles"], 0)
+        self.assertEqual(stats_out["backpressure"], 0.0)
+        self.assertEqual(probe_in.get_latency_histogram(probe_out), {1: 8})
+        self.assertEqual(probe_in.get_latencies(probe_out, edge="end"), [1]*8)
+
+        with tempfile.TemporaryDirectory() as d:
+            probe_in.to_csv(os.path.join(d, "probe.csv"))
+            with open(os.path.join(d, "probe.csv")) as f:
+                self.assertEqual(len(f.readlines()), len(probe_in.samples) + 1)
+            probe_in.to_json(os.path.join(d, "probe.json"), probes=[probe_out])
+            with open(os.path.join(d, "probe.json")) as f:
+                self.assertEqual(json.load(f)["latencies"], {"out": {"1": 8}})
+
+    def packet_fifo_test(self, mode, drop_on_error):
+        prng = random.Random(42)
+        packets = [([prng.randrange(256) for _ in range(prng.randrange(1, 16))], n in [2, 5])
+            for n in range(8)]
+
+        def generator(dut):
+            for datas, error in packets:
+                for i, data in enumerate(datas):
+                    yield dut.sink.valid.eq(1)
+                    yield dut.sink.data.eq(data)
+                    yield dut.sink.last.eq(i == len(datas) - 1)
+                    yield dut.sink.error.eq(error & (i == len(datas)//2))
+                    yield
+                    while not (yield dut.sink.ready):
+                        yield
+                    yield dut.sink.valid.eq(0)
+                    while prng.randrange(100) < 50:
+                        yield
+            for i in range(32):
+                yield
+
+        dut    = PacketFIFO([("data", 8), ("error", 1)], depth=16, packets=4, mode=mode,
+            drop_on_error=drop_on_error, with_csr=True)
+        logger = stream_sim.BufferedPacketLogger([("data", 8)])
+        probe  = stream_sim.StreamProbe(dut.source)
+        dut.submodules += logger
+        dut.comb += dut.source.connect(logger.sink, omit={"error"})
+        run_simulation(dut, [generator(dut), logger.generator(), probe.generator()])
+        expected = [datas for datas, error in packets if not (error and drop_on_error)]
+        self.assertEqual([list(p) for p in logger.packets], expected)
+        return dut, probe
+
+    def test_packet_fifo_store_and_forward(self):
+        # Complete packets only: no bubble mid-packet.
+        dut, probe = self.packet_fifo_test("store-and-forward", drop_on_error=False)
+        self.assertEqual(probe.bubbles, 0)
+
+    def test_packet_fifo_drop_on_error(self):
+        dut, probe = self.packet_fifo_test("store-and-forward", drop_on_error=True)
+        self.assertEqual(probe.bubbles, 0)
+        self.assertEqual(probe.get_stats()["packets"], 6)
+        self.assertEqual([c.name for c in dut.get_csrs()], ["level", "packets", "dropped"])
+
+    def test_packet_fifo_cut_through(self):
+        # Words forwarded as received: bubbles of the writer are seen on source.
+        dut, probe = self.packet_fifo_test("cut-through", drop_on_error=False)
+        self.assertGreater(probe.bubbles, 0)
+
+    def test_packet_fifo_buffered_full(self):
+        # Buffered FIFOs hold depth + 1 words / packets + 1 packets: level/packets must not wrap.
+        def generator(dut, words, last_every, counter, expected):
+            for i in range(words):
+                yield dut.sink.valid.eq(1)
+                yield dut.sink.data.eq(i)
+                yield dut.sink.last.eq((i % last_every) == (last_every - 1))
+                yield
+            yield dut.sink.valid.eq(0)
+            for i in range(4):
+                yield
+            self.assertEqual((yield counter), expected)
+
+        dut = PacketFIFO([("data", 8)], depth=15, packets=4, buffered=True)
+        run_simulation(dut, generator(dut, 32, 32, dut.level, 16))
+        dut = PacketFIFO([("data", 8)], depth=15, packets=4, buffered=True)
+        run_simulation(dut, generator(dut, 8, 1, dut.packets, 5))
+
+    def last_be_test(self, dw_from, dw_to, stride=False):
+        prng = random.Random(42)
+        packets = [bytes(prng.randrange(256) for _ in range(prng.randrange(1, 32)))
+            for _ in range(16)]
+
+        def to_words(packet, dw):
+            # Split packet in little-endian words with last_be on the last byte.
+            n = dw//8
+            words = []
+            for i in range(0, len(packet), n):
+                chunk = packet[i:i + n]
+                last_be = (1 << (len(chunk) - 1)) if (i + n) >= len(packet) else 0
+                words.append((int.from_bytes(chunk, "little"), last_be))
+            return words
+
+        def generator(dut):
+            for packet in packets:
+                words = to_words(packet, dw_from)
+                for i, (data, last_be) in enumerate(words):
+                    yield dut.sink.valid.eq(1)
+                    yield dut.sink.data.eq(data)
+                    yield dut.sink.last.eq(i == len(words) - 1)
+                    yield dut.sink.last_be.eq(last_be)
+                    yield
+                    while not (yield dut.sink.ready):
+                        yield
+                yield dut.sink.valid.eq(0)
+
+        def checker(dut):
+            yield dut.source.ready.eq(1)
+            for packet in packets:
+                datas = bytes()
+                while True:
+                    yield
+                    if (yield dut.source.valid):
+                        data    = (yield dut.source.data)
+                        last_be = (yield dut.source.last_be)
+                        n = dw_to//8 if not (yield dut.source.last) else bits_for(last_be)
+                        self.assertNotEqual(n, 0)
+                        datas += data.to_bytes(dw_to//8, "little")[:n]
+                        if (yield dut.source.last):
+                            break
+                self.assertEqual(datas, packet)
+
+        if stride:
+            dut = StrideConverter(
+                [("data", dw_from), ("last_be", dw_from//8)],
+                [("data", dw_to),   ("last_be", dw_to//8)])
+        else:
+            dut = Converter(dw_from, dw_to, with_last_be=True)
+        run_simulation(dut, [generator(dut), checker(dut)])
+
+    def test_converter_last_be(self):
+        for dw_from, dw_to in [(64, 8), (64, 16), (8, 32), (16, 64), (32, 32)]:
+            for stride in [False, True]:
+                with self.subTest(dw_from=dw_from, dw_to=dw_to, stride=stride):
+                    self.last_be_test(dw_from, dw_to, stride)
+
+    def test_pipeline_skid_buffers(self):
+        class Increment(Module):
+            def __init__(self, timing_critical=False):
+                self.timing_critical = timing_critical
+                self.sink   = Endpoint([("data", 16)])
+                self.source = Endpoint([("data", 16)])
+                self.comb += [
+                    self.sink.connect(self.source, omit={"data"}),
+                    self.source.data.eq(self.sink.data + 1),
+                ]
+
+        def run(skid_every, critical, ready_level):
+            packets = [list(range(16*i, 16*i + 16)) for i in range(8)]
+
+            def generator(dut):
+                for packet in packets:
+                    dut.streamer.send(packet)
+                for packet in packets:
+                    received = yield from dut.logger.receive()
+                    self.assertEqual(list(received), [data + 8 for data in packet])
+
+            class DUT(Module):
+                def __init__(self):
+                    self.submodules.streamer   = stream_sim.BufferedPacketStreamer([("data", 16)])
+                    self.submodules.randomizer = stream_sim.Randomizer([("data", 16)], level=ready_level)
+                    self.submodules.logger     = stream_sim.BufferedPacketLogger([("data", 16)])
+                    stages = [Increment(timing_critical=(i in critical)) for i in range(8)]
+                    self.submodules += stages
+                    self.submodules.pipeline = Pipeline(self.streamer, *stages, self.randomizer,
+                        self.logger, skid_every=skid_every)
+
+            dut   = DUT()
+            probe = stream_sim.StreamProbe(dut.logger.sink)
+            run_simulation(dut, [generator(dut), dut.streamer.generator(),
+                dut.randomizer.generator(), dut.logger.generator(), probe.generator()])
+            return dut.pipeline.added_latency, probe.get_stats()
+
+        # No bubble at full rate and datas preserved with backpressure.
+        for skid_every, critical, latency in [(None, [], 0), (3, [], 3), (None, [1, 5], 2), (4, [0], 3)]:
+            with self.subTest(skid_every=skid_every, critical=critical):
+                added_latency, stats = run(skid_every, critical, ready_level=0)
+                self.assertEqual(added_latency, latency)
+                self.assertEqual(stats["bubbles"], 0)
+                run(skid_every, critical, ready_level=50)
@@ -0,0 +1,185 @@
+#
+# This file is part of LiteX.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import time
+import unittest
+import threading
+from collections import deque
+
+from migen import *
+
+from litex.soc.interconnect import wishbone
+from litex.soc.cores.uart import Stream2Wishbone
+from litex.tools.remote.comm_uart import CommUART
+
+
+class UARTBoneDUT(Module):
+    def __init__(self, rx_fifo_depth=0):
+        self.submodules.bridge = Stream2Wishbone(clk_freq=1e6, rx_fifo_depth=rx_fifo_depth)
+        self.submodules.sram   = wishbone.SRAM(4096)
+        self.comb += self.bridge.wishbone.connect(self.sram.bus)
+
+
+class SimSerial:
+    """Serial port connected to a simulated UARTBone.
+
+    The simulation only advances while the host has bytes to send or waits for bytes (the host is
+    considered infinitely fast), so simulated cycles measure the link utilization.
+    """
+    def __init__(self):
+        self.tx      = deque() # Host -> FPGA.
+        self.rx      = deque() # FPGA -> Host.
+        self.cond    = threading.Condition()
+        self.waiting = False
+        self.done    = False
+        self.is_open = True
+
+    # Host side.
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def inWaiting(self):
+        return len(self.rx)
+
+    def write(self, data):
+        with self.cond:
+            self.tx.extend(data)
+            self.cond.notify_all()
+        return len(data)
+
+    def read(self, length):
+        with self.cond:
+            self.waiting = True
+            self.cond.notify_all()
+            while not self.rx:
+                self.cond.wait()
+            r = bytes(self.rx.popleft() for _ in range(min(length, len(self.rx))))
+            self.waiting = False
+            return r
+
+    # Simulation side.
+    def wait_host(self):
+        with self.cond:
+            while not (self.tx or self.waiting or self.done):
+                self.cond.wait()
+            return self.done and not self.tx
+
+    def push(self, byte):
+        with self.cond:
+            self.rx.append(byte)
+            self.cond.notify_all()
+
+
+def run_uartbone(rx_fifo_depth, host, byte_cycles=10, latency=0, timeout=1000000):
+    """Run host(serial) against a simulated UARTBone, return (cycles, dropped bytes).
+
+    latency models the FPGA -> Host latency (USB-UART bridges buffering) in cycles.
+    """
+    dut    = UARTBoneDUT(rx_fifo_depth)
+    serial = SimSerial()
+    stats  = {"cycles": 0, "dropped": 0}
+    tx     = deque()
+    errors = []
+
+    def host_thread():
+        try:
+            host(serial)
+        except Exception as e:
+            errors.append(e)
+        with serial.cond:
+            serial.done = True
+            serial.cond.notify_all()
+
+    def rx_generator():
+        sink = dut.bridge.sink
+        while True:
+            if serial.wait_host():
+                break
+            if serial.tx:
+                yield sink.valid.eq(1)
+                yield sink.data.eq(serial.tx.popleft())
+                yield
+                stats["dropped"] += not (yield sink.ready) # UART PHY has no backpressure.
+                yield sink.valid.eq(0)
+                for _ in range(byte_cycles - 1):
+                    yield
+            else:
+                yield
+            assert stats["cycles"] < timeout
+
+    @passive
+    def tx_generator():
+        source = dut.bridge.source
+        while True:
+            if (yield source.valid):
+                yield source.ready.eq(1)
+                yield
+                tx.append((stats["cycles"] + latency, (yield source.data)))
+                yield source.ready.eq(0)
+                for _ in range(byte_cycles - 1):
+                    yield
+            else:
+                yield
+
+    @passive
+    def cycles_counter():
+        while True:
+            yield
+            stats["cycles"] += 1
+            while tx and tx[0][0] <= stats["cycles"]:
+                serial.push(tx.popleft()[1])
+
+    thread = threading.Thread(target=host_thread)
+    thread.start()
+    run_simulation(dut, [rx_generator(), tx_generator(), cycles_counter()])
+    thread.join()
+    if errors:
+        raise errors[0]
+    return stats["cycles"], stats["dropped"]
+
+
+class TestUARTBone(unittest.TestCase):
+    def check_access(self, fifo_depth, **kwargs):
+        results = {}
+        def host(serial):
+            comm  = CommUART(serial, **kwargs)
+            comm.open()
+            datas = list(range(1, 301))
+            comm.write(0x0, datas)
+            comm.write(0x800, [0x5a], burst="fixed")
+            results["incr"]   = comm.read(0x0, 300)
+            results["bursts"] = comm.read_bursts([(0x10, 2, "incr"), (0x800, 3, "fixed"), (0x0, 1, "incr")])
+        cycles, dropped = run_uartbone(fifo_depth, host)
+        self.assertEqual(dropped, 0)
+        self.assertEqual(results["incr"], list(range(1, 301)))
+        self.assertEqual(results["bursts"], [5, 6, 0x5a, 0x5a, 0x5a, 1])
+        return cycles
+
+    def test_access(self):
+        self.check_access(fifo_depth=0)
+        self.check_access(fifo_depth=0, max_burst_length=8)
+        self.check_access(fifo_depth=32, rx_fifo_depth=32)
+
+    def test_throughput(self, byte_cycles=10, latency=200):
+        # CSR-like scattered reads bursts and a bulk write.
+        bursts = [(0x40*i, 4, "incr") for i in range(32)]
+        datas  = list(range(512))
+        def host(serial, **kwargs):
+            comm = CommUART(serial, **kwargs)
+            comm.open()
+            comm.write(0x0, datas)
+            comm.read_bursts(bursts)
+        payload = 4*(len(datas) + sum(length for _, length, _ in bursts))
+        # 8 words writes, reads waiting for responses (previous CommUART).
+        cycles, dropped = run_uartbone(0, lambda s: host(s, max_burst_length=8), byte_cycles, latency)
+        legacy_efficiency = payload/(cycles/byte_cycles)
+        # 255 words writes, pipelined reads.
+        cycles, dropped = run_uartbone(64, lambda s: host(s, rx_fifo_depth=64), byte_cycles, latency)
+        pipelined_efficiency = payload/(cycles/byte_cycles)
+        self.assertEqual(dropped, 0)
+        self.assertGreater(pipelined_efficiency, legacy_efficiency)
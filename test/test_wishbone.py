@@ -56,3 +56,156 @@ class TestWishbone(unittest.TestCase):
 
         dut = DUT()
         run_simulation(dut, generator(dut))
+
+    def test_crossbar_concurrent_accesses(self):
+        def generator(dut, bus, n, adr_base, cycles):
+            for i in range(n):
+                yield from bus.write(adr_base + i, adr_base + i)
+            for i in range(n):
+                self.assertEqual((yield from bus.read(adr_base + i)), adr_base + i)
+            cycles.append((yield dut.cycle))
+
+        class DUT(Module):
+            def __init__(self, interconnect_cls):
+                self.masters = [wishbone.Interface() for _ in range(2)]
+                slaves = []
+                for i in range(2):
+                    sram = wishbone.SRAM(256)
+                    self.submodules += sram
+                    slaves.append((lambda a, i=i: a[6:] == i, sram.bus))
+                self.submodules.interconnect = interconnect_cls(self.masters, slaves)
+                self.cycle = Signal(32)
+                self.sync += self.cycle.eq(self.cycle + 1)
+
+        results = {}
+        for interconnect_cls in [wishbone.InterconnectShared, wishbone.Crossbar]:
+            dut    = DUT(interconnect_cls)
+            cycles = []
+            run_simulation(dut, [
+                generator(dut, dut.masters[0], 16, 0x00, cycles),
+                generator(dut, dut.masters[1], 16, 0x40, cycles)])
+            results[interconnect_cls] = max(cycles)
+        # Masters target different slaves and should not be serialized by the Crossbar.
+        self.assertLess(results[wishbone.Crossbar], 0.75*results[wishbone.InterconnectShared])
+
+    def test_arbiter_weights(self):
+        def generator(bus, n):
+            for i in range(n):
+                yield from bus.write(i, i)
+                yield # Release the bus (drop cyc) between accesses.
+
+        def checker(dut, grants, n):
+            while len(grants) < n:
+                if (yield dut.slave.ack):
+                    grants.append((yield dut.arbiter.rr.grant))
+                yield
+
+        class DUT(Module):
+            def __init__(self, weights):
+                self.masters = [wishbone.Interface() for _ in range(2)]
+                self.submodules.sram    = wishbone.SRAM(256)
+                self.slave              = self.sram.bus
+                self.submodules.arbiter = wishbone.Arbiter(self.masters, self.slave, weights)
+
+        for weights in [[1, 1], [3, 1], [1, 2]]:
+            with self.subTest(weights=weights):
+                dut    = DUT(weights)
+                grants = []
+                run_simulation(dut, [
+                    generator(dut.masters[0], 64),
+                    generator(dut.masters[1], 64),
+                    checker(dut, grants, 24)])
+                # Each master gets its share of accesses when both are requesting.
+                self.assertEqual(grants.count(0)*weights[1], grants.count(1)*weights[0])
+
+    def test_arbiter_weights_locked(self):
+        # Master 0 holds cyc between accesses (locked read-modify-writes): it must never lose
+        # the grant while cyc is asserted, even with master 1 constantly requesting.
+        def locked_generator(bus, n):
+            for i in range(n):
+                yield bus.cyc.eq(1)
+                for we in [0, 1]:
+                    yield bus.adr.eq(i)
+                    yield bus.we.eq(we)
+                    yield bus.dat_w.eq(i + 1)
+                    yield bus.sel.eq(0xf)
+                    yield bus.stb.eq(1)
+                    yield
+                    while not (yield bus.ack):
+                        yield
+                    yield bus.stb.eq(0)
+                    yield
+                yield bus.cyc.eq(0)
+                yield
+
+        def generator(bus, n):
+            for i in range(n):
+                yield from bus.write(0x80 + i, i)
+                yield
+
+        @passive
+        def checker(dut, violations):
+            locked = False
+            while True:
+                granted = (yield dut.arbiter.rr.grant) == 0
+                if locked:
+                    violations.append(not granted)
+                locked = (yield dut.masters[0].cyc) & granted
+                yield
+
+        dut = Module()
+        dut.masters = [wishbone.Interface() for _ in range(2)]
+        dut.submodules.sram    = wishbone.SRAM(1024)
+        dut.slave              = dut.sram.bus
+        dut.submodules.arbiter = wishbone.Arbiter(dut.masters, dut.slave, [1, 3])
+        checks = []
+        run_simulation(dut, [
+            locked_generator(dut.masters[0], 8),
+            generator(dut.masters[1], 32),
+            checker(dut, checks)])
+        self.assertGreater(checks.count(False), 0)
+        self.assertEqual(checks.count(True), 0)
+
+    def test_sram_burst_wait_states(self):
+        stbs = [1, 1, 0, 1, 0, 0, 1, 1, 1, 0, 1]
+        def generator(bus, datas, we):
+            n = 0
+            i = 0
+            while n < 8:
+                stb = stbs[i%len(stbs)]
+                i  += 1
+                yield bus.cyc.eq(1)
+                yield bus.stb.eq(stb)
+                yield bus.we.eq(we)
+                yield bus.sel.eq(0b1111)
+                yield bus.adr.eq(n)
+                yield bus.dat_w.eq(0x100 + n)
+                yield bus.cti.eq(0b111 if n == 7 else 0b010)
+                yield bus.bte.eq(0b00)
+                yield
+                ack = (yield bus.ack)
+                if not stb:
+                    # No ack on wait states.
+                    self.assertEqual(ack, 0)
+                elif ack:
+                    datas.append((yield bus.dat_r))
+                    n += 1
+            yield bus.cyc.eq(0)
+            yield bus.stb.eq(0)
+            yield
+
+        # Reads.
+        sram  = wishbone.SRAM(64, init=list(range(16, 32)))
+        datas = []
+        run_simulation(sram, generator(sram.bus, datas, we=0))
+        self.assertEqual(datas, list(range(16, 24)))
+
+        # Writes.
+        sram = wishbone.SRAM(64)
+        def check():
+            yield from generator(sram.bus, [], we=1)
+            mem = []
+            for i in range(9):
+                mem.append((yield sram.mem[i]))
+            self.assertEqual(mem, [0x100 + i for i in range(8)] + [0])
+        run_simulation(sram, check())